@@ -0,0 +1,182 @@
+"""product cards
+
+Revision ID: a81f3c9d2e64
+Revises: 5c2d7a41e0b3
+Create Date: 2026-10-17 11:03:27.904112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import fastapi_users_db_sqlalchemy
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "a81f3c9d2e64"
+down_revision = "5c2d7a41e0b3"
+branch_labels = None
+depends_on = None
+
+
+# sql/product_card.sql as of this revision
+PRODUCT_CARD_SQL = """
+-- Rebuild the listing row of a single product
+CREATE OR REPLACE FUNCTION refresh_product_card(target UUID)
+RETURNS VOID AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM only products WHERE id = target AND deleted_at IS NULL) THEN
+        DELETE FROM product_cards WHERE id = target;
+        RETURN;
+    END IF;
+
+    INSERT INTO product_cards (id, title, brand, product_detail, price, condition, category_id, images, created_at, updated_at)
+    SELECT products.id, products.title, products.brand, products.product_detail, products.price,
+    products.condition, products.category_id,
+    array_agg(COALESCE(images.image_url, 'image-not-available.webp') ORDER BY product_images.created_at),
+    products.created_at, now()
+    FROM only products
+    LEFT JOIN only product_images ON products.id = product_images.product_id
+    LEFT JOIN images ON product_images.image_id = images.id
+    WHERE products.id = target
+    GROUP BY products.id
+    ON CONFLICT (id) DO UPDATE SET
+        title = EXCLUDED.title,
+        brand = EXCLUDED.brand,
+        product_detail = EXCLUDED.product_detail,
+        price = EXCLUDED.price,
+        condition = EXCLUDED.condition,
+        category_id = EXCLUDED.category_id,
+        images = EXCLUDED.images,
+        created_at = EXCLUDED.created_at,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+-- WHEN PRODUCT CHANGED
+CREATE OR REPLACE FUNCTION product_card_products()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'DELETE') THEN
+        PERFORM refresh_product_card(OLD.id);
+    ELSE
+        PERFORM refresh_product_card(NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_product_card ON products;
+CREATE TRIGGER trigger_product_card
+AFTER INSERT OR UPDATE OR DELETE ON products
+FOR EACH ROW EXECUTE PROCEDURE product_card_products();
+
+-- WHEN PRODUCT IMAGE CHANGED
+CREATE OR REPLACE FUNCTION product_card_product_images()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP <> 'INSERT') THEN
+        PERFORM refresh_product_card(OLD.product_id);
+    END IF;
+    IF (TG_OP <> 'DELETE') THEN
+        PERFORM refresh_product_card(NEW.product_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_product_card ON product_images;
+CREATE TRIGGER trigger_product_card
+AFTER INSERT OR UPDATE OR DELETE ON product_images
+FOR EACH ROW EXECUTE PROCEDURE product_card_product_images();
+
+-- WHEN IMAGE CHANGED
+CREATE OR REPLACE FUNCTION product_card_images()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_product_card(product_images.product_id)
+    FROM only product_images WHERE product_images.image_id = OLD.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_product_card ON images;
+CREATE TRIGGER trigger_product_card
+AFTER UPDATE OF image_url OR DELETE ON images
+FOR EACH ROW EXECUTE PROCEDURE product_card_images();
+"""
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table(
+        "product_cards",
+        sa.Column(
+            "id",
+            fastapi_users_db_sqlalchemy.generics.GUID(),
+            server_default=sa.text("uuid_generate_v4()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=True,
+        ),
+        sa.Column("deleted_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("title", sa.String(length=128), nullable=False),
+        sa.Column("brand", sa.String(length=128), nullable=False),
+        sa.Column("product_detail", sa.String(length=256), nullable=False),
+        sa.Column("price", sa.Integer(), nullable=False),
+        sa.Column("condition", sa.String(length=32), nullable=False),
+        sa.Column(
+            "category_id", fastapi_users_db_sqlalchemy.generics.GUID(), nullable=False
+        ),
+        sa.Column("images", postgresql.ARRAY(sa.String(length=128)), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_product_cards_category_id", "product_cards", ["category_id"], unique=False
+    )
+    op.create_index(
+        "ix_product_cards_created_at_id",
+        "product_cards",
+        ["created_at", "id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_product_cards_price_id", "product_cards", ["price", "id"], unique=False
+    )
+    op.create_index(
+        "ix_product_cards_title_id", "product_cards", ["title", "id"], unique=False
+    )
+    op.drop_index("ix_products_created_at_id", table_name="products")
+    op.drop_index("ix_products_price_id", table_name="products")
+    # ### end Alembic commands ###
+
+    op.execute(PRODUCT_CARD_SQL)
+
+    # backfill existing products
+    op.execute("SELECT refresh_product_card(id) FROM only products")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trigger_product_card ON images")
+    op.execute("DROP TRIGGER IF EXISTS trigger_product_card ON product_images")
+    op.execute("DROP TRIGGER IF EXISTS trigger_product_card ON products")
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_index("ix_products_price_id", "products", ["price", "id"], unique=False)
+    op.create_index(
+        "ix_products_created_at_id", "products", ["created_at", "id"], unique=False
+    )
+    op.drop_index("ix_product_cards_title_id", table_name="product_cards")
+    op.drop_index("ix_product_cards_price_id", table_name="product_cards")
+    op.drop_index("ix_product_cards_created_at_id", table_name="product_cards")
+    op.drop_index("ix_product_cards_category_id", table_name="product_cards")
+    op.drop_table("product_cards")
+    # ### end Alembic commands ###
@@ -0,0 +1,197 @@
+"""image variants
+
+Revision ID: b62f0d8e4a17
+Revises: 7d3a9e61c2f8
+Create Date: 2026-10-17 18:40:12.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "b62f0d8e4a17"
+down_revision = "7d3a9e61c2f8"
+branch_labels = None
+depends_on = None
+
+# refresh_product_card and the images trigger before this revision
+PREVIOUS_PRODUCT_CARD_SQL = """
+CREATE OR REPLACE FUNCTION refresh_product_card(target UUID)
+RETURNS VOID AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM only products WHERE id = target AND deleted_at IS NULL) THEN
+        DELETE FROM product_cards WHERE id = target;
+        RETURN;
+    END IF;
+
+    INSERT INTO product_cards (id, title, brand, product_detail, price, condition, category_id, images, created_at, updated_at)
+    SELECT products.id, products.title, products.brand, products.product_detail, products.price,
+    products.condition, products.category_id,
+    array_agg(COALESCE(images.image_url, 'image-not-available.webp') ORDER BY product_images.created_at),
+    products.created_at, now()
+    FROM only products
+    LEFT JOIN only product_images ON products.id = product_images.product_id
+    LEFT JOIN images ON product_images.image_id = images.id
+    WHERE products.id = target
+    GROUP BY products.id
+    ON CONFLICT (id) DO UPDATE SET
+        title = EXCLUDED.title,
+        brand = EXCLUDED.brand,
+        product_detail = EXCLUDED.product_detail,
+        price = EXCLUDED.price,
+        condition = EXCLUDED.condition,
+        category_id = EXCLUDED.category_id,
+        images = EXCLUDED.images,
+        created_at = EXCLUDED.created_at,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_product_card ON images;
+CREATE TRIGGER trigger_product_card
+AFTER UPDATE OF image_url OR DELETE ON images
+FOR EACH ROW EXECUTE PROCEDURE product_card_images();
+"""
+
+
+# sql/product_card.sql as of this revision
+PRODUCT_CARD_SQL = """
+-- Rebuild the listing row of a single product
+CREATE OR REPLACE FUNCTION refresh_product_card(target UUID)
+RETURNS VOID AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM only products WHERE id = target AND deleted_at IS NULL) THEN
+        DELETE FROM product_cards WHERE id = target;
+        RETURN;
+    END IF;
+
+    INSERT INTO product_cards (id, title, brand, product_detail, price, condition, category_id, images, thumbnails, created_at, updated_at)
+    SELECT products.id, products.title, products.brand, products.product_detail, products.price,
+    products.condition, products.category_id,
+    array_agg(COALESCE(images.card_url, images.image_url, 'image-not-available.webp') ORDER BY product_images.created_at),
+    array_agg(COALESCE(images.thumb_url, images.image_url, 'image-not-available.webp') ORDER BY product_images.created_at),
+    products.created_at, now()
+    FROM only products
+    LEFT JOIN only product_images ON products.id = product_images.product_id
+    LEFT JOIN images ON product_images.image_id = images.id
+    WHERE products.id = target
+    GROUP BY products.id
+    ON CONFLICT (id) DO UPDATE SET
+        title = EXCLUDED.title,
+        brand = EXCLUDED.brand,
+        product_detail = EXCLUDED.product_detail,
+        price = EXCLUDED.price,
+        condition = EXCLUDED.condition,
+        category_id = EXCLUDED.category_id,
+        images = EXCLUDED.images,
+        thumbnails = EXCLUDED.thumbnails,
+        created_at = EXCLUDED.created_at,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+-- WHEN PRODUCT CHANGED
+CREATE OR REPLACE FUNCTION product_card_products()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'DELETE') THEN
+        PERFORM refresh_product_card(OLD.id);
+    ELSE
+        PERFORM refresh_product_card(NEW.id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_product_card ON products;
+CREATE TRIGGER trigger_product_card
+AFTER INSERT OR UPDATE OR DELETE ON products
+FOR EACH ROW EXECUTE PROCEDURE product_card_products();
+
+-- WHEN PRODUCT IMAGE CHANGED
+CREATE OR REPLACE FUNCTION product_card_product_images()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP <> 'INSERT') THEN
+        PERFORM refresh_product_card(OLD.product_id);
+    END IF;
+    IF (TG_OP <> 'DELETE') THEN
+        PERFORM refresh_product_card(NEW.product_id);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_product_card ON product_images;
+CREATE TRIGGER trigger_product_card
+AFTER INSERT OR UPDATE OR DELETE ON product_images
+FOR EACH ROW EXECUTE PROCEDURE product_card_product_images();
+
+-- WHEN IMAGE CHANGED
+CREATE OR REPLACE FUNCTION product_card_images()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_product_card(product_images.product_id)
+    FROM only product_images WHERE product_images.image_id = OLD.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_product_card ON images;
+CREATE TRIGGER trigger_product_card
+AFTER UPDATE OF image_url, thumb_url, card_url OR DELETE ON images
+FOR EACH ROW EXECUTE PROCEDURE product_card_images();
+"""
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.add_column(
+        "images", sa.Column("thumb_url", sa.String(length=160), nullable=True)
+    )
+    op.add_column("images", sa.Column("card_url", sa.String(length=160), nullable=True))
+    op.add_column(
+        "images", sa.Column("detail_url", sa.String(length=160), nullable=True)
+    )
+    op.add_column(
+        "product_cards",
+        sa.Column(
+            "thumbnails",
+            postgresql.ARRAY(sa.String(length=160)),
+            server_default="{}",
+            nullable=False,
+        ),
+    )
+    op.alter_column(
+        "product_cards",
+        "images",
+        existing_type=postgresql.ARRAY(sa.String(length=128)),
+        type_=postgresql.ARRAY(sa.String(length=160)),
+        existing_nullable=False,
+    )
+    # ### end Alembic commands ###
+    op.alter_column("product_cards", "thumbnails", server_default=None)
+
+    # refresh_product_card fills thumbnails and reads the card variants
+    op.execute(PRODUCT_CARD_SQL)
+    op.execute("SELECT refresh_product_card(id) FROM only products")
+
+
+def downgrade():
+    op.execute(PREVIOUS_PRODUCT_CARD_SQL)
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.alter_column(
+        "product_cards",
+        "images",
+        existing_type=postgresql.ARRAY(sa.String(length=160)),
+        type_=postgresql.ARRAY(sa.String(length=128)),
+        existing_nullable=False,
+    )
+    op.drop_column("product_cards", "thumbnails")
+    op.drop_column("images", "detail_url")
+    op.drop_column("images", "card_url")
+    op.drop_column("images", "thumb_url")
+    # ### end Alembic commands ###
+    op.execute("SELECT refresh_product_card(id) FROM only products")
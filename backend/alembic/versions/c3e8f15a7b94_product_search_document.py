@@ -0,0 +1,132 @@
+"""product search document
+
+Revision ID: c3e8f15a7b94
+Revises: b62f0d8e4a17
+Create Date: 2026-10-17 21:05:38.117240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c3e8f15a7b94"
+down_revision = "b62f0d8e4a17"
+branch_labels = None
+depends_on = None
+
+# search_products before this revision, from sql/soft_delete.sql
+PREVIOUS_SEARCH_PRODUCTS_SQL = """
+CREATE OR REPLACE FUNCTION search_products(term TEXT)
+returns table(
+  id UUID,
+  title TEXT
+)
+as
+$$
+
+SELECT p.id, p.title
+FROM products p
+JOIN categories c ON p.category_id = c.id
+WHERE term <% (p.title || ' ' || p.brand || ' ' || SPLIT_PART(c.title, '-', 1) || ' ' || SPLIT_PART(c.title, '-', 2))
+ORDER BY term <<-> (p.title || ' ' || p.brand || ' ' || SPLIT_PART(c.title, '-', 1) || ' ' || SPLIT_PART(c.title, '-', 2)) LIMIT 10;
+$$ language SQL;
+"""
+
+
+# sql/search_document.sql as of this revision
+SEARCH_DOCUMENT_SQL = """
+-- products.search_document is what search_products() matches, a plain column
+-- so that the ix_products_search_document trigram GiST index serves <% and <<->.
+CREATE OR REPLACE FUNCTION product_search_document(title TEXT, brand TEXT, category_title TEXT)
+RETURNS TEXT AS $$
+    SELECT title || ' ' || brand || ' ' || SPLIT_PART(category_title, '-', 1) || ' ' || SPLIT_PART(category_title, '-', 2);
+$$ LANGUAGE SQL IMMUTABLE;
+
+-- WHEN PRODUCT INSERTED OR ITS TITLE, BRAND OR CATEGORY CHANGED
+CREATE OR REPLACE FUNCTION search_document_products()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_document := product_search_document(
+        NEW.title, NEW.brand, (SELECT title FROM categories WHERE id = NEW.category_id)
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_search_document ON products;
+CREATE TRIGGER trigger_search_document
+BEFORE INSERT OR UPDATE OF title, brand, category_id ON products
+FOR EACH ROW EXECUTE PROCEDURE search_document_products();
+
+-- WHEN CATEGORY RENAMED
+CREATE OR REPLACE FUNCTION search_document_categories()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE only products SET search_document = product_search_document(title, brand, NEW.title)
+    WHERE category_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_search_document ON categories;
+CREATE TRIGGER trigger_search_document
+AFTER UPDATE OF title ON categories
+FOR EACH ROW WHEN (OLD.title IS DISTINCT FROM NEW.title)
+EXECUTE PROCEDURE search_document_categories();
+
+CREATE OR REPLACE FUNCTION search_products(term TEXT)
+returns table(
+  id UUID,
+  title TEXT
+)
+as
+$$
+
+SELECT p.id, p.title
+FROM only products p
+WHERE term <% p.search_document
+ORDER BY term <<-> p.search_document LIMIT 10;
+$$ language SQL;
+"""
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.add_column(
+        "products",
+        sa.Column("search_document", sa.Text(), server_default="", nullable=False),
+    )
+    # ### end Alembic commands ###
+
+    # triggers keeping search_document and the search_products over it
+    op.execute(SEARCH_DOCUMENT_SQL)
+    # archived products get theirs when restored, the insert trigger sets it
+    op.execute(
+        """
+        UPDATE only products
+        SET search_document = product_search_document(products.title, products.brand, categories.title)
+        FROM categories WHERE categories.id = products.category_id
+        """
+    )
+    op.create_index(
+        "ix_products_search_document",
+        "products",
+        ["search_document"],
+        unique=False,
+        postgresql_using="gist",
+        postgresql_ops={"search_document": "gist_trgm_ops(siglen=256)"},
+    )
+
+
+def downgrade():
+    op.execute(PREVIOUS_SEARCH_PRODUCTS_SQL)
+    op.execute("DROP TRIGGER IF EXISTS trigger_search_document ON categories")
+    op.execute("DROP TRIGGER IF EXISTS trigger_search_document ON products")
+    op.execute("DROP FUNCTION IF EXISTS search_document_categories()")
+    op.execute("DROP FUNCTION IF EXISTS search_document_products()")
+    op.execute("DROP FUNCTION IF EXISTS product_search_document(TEXT, TEXT, TEXT)")
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index("ix_products_search_document", table_name="products")
+    op.drop_column("products", "search_document")
+    # ### end Alembic commands ###
@@ -0,0 +1,143 @@
+"""product search vector
+
+Revision ID: f2a6d4c81e35
+Revises: c3e8f15a7b94
+Create Date: 2026-10-17 23:12:09.441826
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "f2a6d4c81e35"
+down_revision = "c3e8f15a7b94"
+branch_labels = None
+depends_on = None
+
+# the search_document triggers before this revision
+PREVIOUS_SEARCH_DOCUMENT_SQL = """
+CREATE OR REPLACE FUNCTION search_document_products()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_document := product_search_document(
+        NEW.title, NEW.brand, (SELECT title FROM categories WHERE id = NEW.category_id)
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION search_document_categories()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE only products SET search_document = product_search_document(title, brand, NEW.title)
+    WHERE category_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+
+# sql/search_document.sql as of this revision
+SEARCH_DOCUMENT_SQL = """
+-- products.search_document is what search_products() matches, a plain column
+-- so that the ix_products_search_document trigram GiST index serves <% and <<->.
+-- products.search_vector has the same words weighted (title A, brand B,
+-- category C) for the ranked search, GIN indexed.
+CREATE OR REPLACE FUNCTION product_search_document(title TEXT, brand TEXT, category_title TEXT)
+RETURNS TEXT AS $$
+    SELECT title || ' ' || brand || ' ' || SPLIT_PART(category_title, '-', 1) || ' ' || SPLIT_PART(category_title, '-', 2);
+$$ LANGUAGE SQL IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION product_search_vector(title TEXT, brand TEXT, category_title TEXT)
+RETURNS TSVECTOR AS $$
+    SELECT setweight(to_tsvector('simple', title), 'A') ||
+    setweight(to_tsvector('simple', brand), 'B') ||
+    setweight(to_tsvector('simple', REPLACE(COALESCE(category_title, ''), '-', ' ')), 'C');
+$$ LANGUAGE SQL IMMUTABLE;
+
+-- WHEN PRODUCT INSERTED OR ITS TITLE, BRAND OR CATEGORY CHANGED
+CREATE OR REPLACE FUNCTION search_document_products()
+RETURNS TRIGGER AS $$
+DECLARE
+    category_title TEXT := (SELECT title FROM categories WHERE id = NEW.category_id);
+BEGIN
+    NEW.search_document := product_search_document(NEW.title, NEW.brand, category_title);
+    NEW.search_vector := product_search_vector(NEW.title, NEW.brand, category_title);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_search_document ON products;
+CREATE TRIGGER trigger_search_document
+BEFORE INSERT OR UPDATE OF title, brand, category_id ON products
+FOR EACH ROW EXECUTE PROCEDURE search_document_products();
+
+-- WHEN CATEGORY RENAMED
+CREATE OR REPLACE FUNCTION search_document_categories()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE only products SET
+        search_document = product_search_document(title, brand, NEW.title),
+        search_vector = product_search_vector(title, brand, NEW.title)
+    WHERE category_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_search_document ON categories;
+CREATE TRIGGER trigger_search_document
+AFTER UPDATE OF title ON categories
+FOR EACH ROW WHEN (OLD.title IS DISTINCT FROM NEW.title)
+EXECUTE PROCEDURE search_document_categories();
+
+CREATE OR REPLACE FUNCTION search_products(term TEXT)
+returns table(
+  id UUID,
+  title TEXT
+)
+as
+$$
+
+SELECT p.id, p.title
+FROM only products p
+WHERE term <% p.search_document
+ORDER BY term <<-> p.search_document LIMIT 10;
+$$ language SQL;
+"""
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.add_column(
+        "products",
+        sa.Column("search_vector", postgresql.TSVECTOR(), nullable=True),
+    )
+    # ### end Alembic commands ###
+
+    # the triggers set search_vector along with search_document
+    op.execute(SEARCH_DOCUMENT_SQL)
+    op.execute(
+        """
+        UPDATE only products
+        SET search_vector = product_search_vector(products.title, products.brand, categories.title)
+        FROM categories WHERE categories.id = products.category_id
+        """
+    )
+    op.create_index(
+        "ix_products_search_vector",
+        "products",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade():
+    op.execute(PREVIOUS_SEARCH_DOCUMENT_SQL)
+    op.execute("DROP FUNCTION IF EXISTS product_search_vector(TEXT, TEXT, TEXT)")
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index("ix_products_search_vector", table_name="products")
+    op.drop_column("products", "search_vector")
+    # ### end Alembic commands ###
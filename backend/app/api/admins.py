@@ -7,12 +7,18 @@ from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
 
 from app.core.logger import logger
+from app.core.metrics import metrics
+from app.core.profiling import route_profiles
+from app.db import pool_status
 from app.deps.authentication import get_current_active_admin
+from app.deps.cache import Cache, get_cache
 from app.deps.db import get_db
 from app.models.user import User
 from app.schemas.admin import (
+    GetCacheStats,
     GetCustomers,
     GetDashboard,
+    GetMetrics,
     GetOrders,
     GetSales,
     Pagination,
@@ -205,3 +211,24 @@ def get_order(
             total_page=math.ceil(orders[0].totalrow_count / page_size) if orders else 1,
         ),
     )
+
+
+@router.get("/cache", response_model=GetCacheStats, status_code=status.HTTP_200_OK)
+def get_cache_stats(
+    cache: Cache = Depends(get_cache),
+    current_user: User = Depends(get_current_active_admin),
+) -> JSONResponse:
+    return GetCacheStats(data=cache.stats())
+
+
+@router.get("/metrics", response_model=GetMetrics, status_code=status.HTTP_200_OK)
+def get_metrics(
+    current_user: User = Depends(get_current_active_admin),
+) -> JSONResponse:
+    return GetMetrics(
+        data={
+            "pools": pool_status(),
+            "routes": route_profiles.snapshot(),
+            **metrics.snapshot(),
+        }
+    )
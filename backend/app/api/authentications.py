@@ -132,7 +132,7 @@ def sign_up(
     status_code=status.HTTP_200_OK,
     response_model=DefaultResponse,
 )
-async def forgot_password(
+def forgot_password(
     email: str,
     background_task: BackgroundTasks,
     session: Generator = Depends(get_db),
@@ -1,7 +1,7 @@
 from typing import Generator
 from uuid import UUID
 
-from fastapi import HTTPException, Query, status
+from fastapi import File, Form, HTTPException, Query, UploadFile, status
 from fastapi.params import Depends
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
@@ -9,10 +9,13 @@ from fastapi.routing import APIRouter
 from app.core.config import settings
 from app.core.logger import logger
 from app.deps.authentication import get_current_active_admin
+from app.deps.cache import Cache, get_cache
+from app.deps.conditional import ConditionalGet
 from app.deps.db import get_db
-from app.deps.google_cloud import upload_image
 from app.deps.image_base64 import base64_to_image
 from app.deps.sql_error import format_error
+from app.deps.storage import upload_image, upload_image_file
+from app.deps.upload import check_image_upload
 from app.models.banner import Banner
 from app.models.image import Image
 from app.models.user import User
@@ -22,25 +25,36 @@ from app.schemas.default_model import DefaultResponse
 
 router = APIRouter()
 
+banners_versions = ConditionalGet(tables=["banners", "images"])
 
-@router.get("", response_model=GetBanners, status_code=status.HTTP_200_OK)
+
+@router.get(
+    "",
+    response_model=GetBanners,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(banners_versions)],
+)
 def get_banners(
     session: Generator = Depends(get_db),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
-    banners = session.execute(
-        f"""
-            SELECT banners.id, title, CONCAT('{settings.CLOUD_STORAGE}/', COALESCE(image_url, 'image-not-available.webp')) AS image,
-            COALESCE(url_path, '/products') AS url_path, text_position
-            FROM only banners
-            LEFT JOIN images ON banners.image_id = images.id
-            """
-    ).fetchall()
-    if not banners:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="There are no banners",
-        )
-    return GetBanners(data=banners)
+    def load_banners():
+        banners = session.execute(
+            f"""
+                SELECT banners.id, title, CONCAT('{settings.CLOUD_STORAGE}/', COALESCE(image_url, 'image-not-available.webp')) AS image,
+                COALESCE(url_path, '/products') AS url_path, text_position
+                FROM only banners
+                LEFT JOIN images ON banners.image_id = images.id
+                """
+        ).fetchall()
+        if not banners:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="There are no banners",
+            )
+        return GetBanners(data=banners)
+
+    return cache.get_or_set("banners", None, load_banners)
 
 
 @router.get("/{banner_id}", response_model=BaseBanner, status_code=status.HTTP_200_OK)
@@ -70,6 +84,7 @@ def create_banner(
     request: CreateBanner,
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_admin),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
     if not request.image.startswith("data:image"):
         raise HTTPException(
@@ -114,6 +129,58 @@ def create_banner(
             status_code=status.HTTP_400_BAD_REQUEST, detail=format_error(e)
         )
 
+    cache.invalidate("banners")
+
+    return DefaultResponse(message="Banner created successfully")
+
+
+@router.post(
+    "/upload", response_model=DefaultResponse, status_code=status.HTTP_201_CREATED
+)
+def create_banner_upload(
+    image: UploadFile = File(...),
+    title: str = Form(...),
+    url_path: str = Form("products"),
+    text_position: str = Form("left", regex="^(left|right)$"),
+    session: Generator = Depends(get_db),
+    current_user: User = Depends(get_current_active_admin),
+    cache: Cache = Depends(get_cache),
+) -> JSONResponse:
+    """Same as POST /banners, with the image as a multipart file."""
+    size, media_type = check_image_upload(image)
+    title_slug = title.lower().replace(" ", "-")
+    image_url = upload_image_file(image.file, size, media_type, title_slug, "banners")
+    if image_url is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Image upload failed, because of cloud storage error",
+        )
+
+    name = image_url.split("/")[-1].split(".")[0]
+    image = Image(name=name, image_url=image_url)
+
+    session.add(image)
+    session.commit()
+    session.refresh(image)
+
+    try:
+        banner = Banner(
+            title=title,
+            image_id=image.id,
+            url_path=url_path,
+            text_position=text_position,
+        )
+        session.add(banner)
+        session.commit()
+    except Exception as e:
+        logger.error(e)
+        session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=format_error(e)
+        )
+
+    cache.invalidate("banners")
+
     return DefaultResponse(message="Banner created successfully")
 
 
@@ -122,6 +189,7 @@ def update_banner(
     request: UpdateBanner,
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_admin),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
     banner = session.query(Banner).filter(Banner.id == request.id).first()
     if not banner:
@@ -166,6 +234,7 @@ def update_banner(
     banner.text_position = request.text_position
 
     session.commit()
+    cache.invalidate("banners")
 
     return DefaultResponse(message="Banner updated successfully")
 
@@ -175,6 +244,7 @@ def delete_banner(
     id: UUID,
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_admin),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
     banner = session.query(Banner).filter(Banner.id == id).first()
     if not banner:
@@ -184,5 +254,6 @@ def delete_banner(
 
     session.delete(banner)
     session.commit()
+    cache.invalidate("banners")
 
     return DefaultResponse(message="Banner deleted successfully")
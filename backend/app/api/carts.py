@@ -1,7 +1,7 @@
-from typing import Generator
+from typing import Generator, Optional
 from uuid import UUID
 
-from fastapi import HTTPException, status
+from fastapi import Header, HTTPException, status
 from fastapi.params import Depends
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
@@ -10,6 +10,11 @@ from app.core.config import settings
 from app.core.logger import logger
 from app.deps.authentication import get_current_active_user
 from app.deps.db import get_db
+from app.deps.idempotency import (
+    claim_idempotency_key,
+    request_fingerprint,
+    store_idempotent_response,
+)
 from app.deps.sql_error import format_error
 from app.models.cart import Cart
 from app.models.user import User
@@ -26,20 +31,14 @@ def get_cart(
 ) -> JSONResponse:
     carts = session.execute(
         f"""
-        SELECT DISTINCT ON (carts.id) products.id as product_id, carts.id,
+        SELECT product_cards.id as product_id, carts.id,
         (json_build_object('size', sizes.size, 'quantity', carts.quantity)) as details,
-        products.price, CONCAT('{settings.CLOUD_STORAGE}/', COALESCE(image_url, 'image-not-available.webp')) AS image,
-        products.title as name FROM only carts
+        product_cards.price, CONCAT('{settings.CLOUD_STORAGE}/', product_cards.thumbnails[1]) AS image,
+        product_cards.title as name FROM only carts
         JOIN product_size_quantities ON product_size_quantities.id = product_size_quantity_id
         JOIN sizes ON sizes.id  = product_size_quantities.size_id
-        JOIN products ON products.id = product_size_quantities.product_id
-        LEFT JOIN product_images ON products.id = product_images.product_id
-        AND product_images.id = (
-            SELECT id FROM product_images WHERE product_id = products.id LIMIT 1
-        )
-        LEFT JOIN images ON images.id = product_images.image_id
+        JOIN product_cards ON product_cards.id = product_size_quantities.product_id
         WHERE user_id = :user_id
-        GROUP BY products.id, products.price, image, name, carts.id, sizes.size, carts.quantity
         """,
         {"user_id": current_user.id},
     ).fetchall()
@@ -58,7 +57,16 @@ def create_cart(
     request: CreateCart,
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    idempotency_key: Optional[str] = Header(None),
 ) -> JSONResponse:
+    replay = claim_idempotency_key(
+        session,
+        current_user.id,
+        idempotency_key,
+        request_fingerprint("POST /cart", request),
+    )
+    if replay:
+        return replay
 
     product_size_quantity = session.execute(
         """
@@ -96,7 +104,6 @@ def create_cart(
                 detail=f"Out of stock, please reduce quantity, current stock is {existed_cart.quantity}",
             )
         cart.quantity += request.quantity
-        session.commit()
     else:
         if product_size_quantity.quantity < request.quantity:
             raise HTTPException(
@@ -109,11 +116,16 @@ def create_cart(
             quantity=request.quantity,
         )
         session.add(cart)
-        session.commit()
+
+    response = DefaultResponse(message="Added to cart")
+    store_idempotent_response(
+        session, current_user.id, idempotency_key, status.HTTP_201_CREATED, response
+    )
+    session.commit()
 
     logger.info(f"User {current_user.name} added product {request.product_id} to cart")
 
-    return DefaultResponse(message="Added to cart")
+    return response
 
 
 @router.put("", response_model=DefaultResponse, status_code=status.HTTP_200_OK)
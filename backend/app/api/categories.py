@@ -8,6 +8,8 @@ from fastapi.routing import APIRouter
 
 from app.core.logger import logger
 from app.deps.authentication import get_current_active_admin, get_current_active_user
+from app.deps.cache import Cache, get_cache
+from app.deps.conditional import ConditionalGet
 from app.deps.db import get_db
 from app.deps.sql_error import format_error
 from app.models.category import Category
@@ -24,20 +26,31 @@ from app.schemas.default_model import DefaultResponse
 
 router = APIRouter()
 
+categories_versions = ConditionalGet(tables=["categories"])
 
-@router.get("", response_model=GetCategory, status_code=status.HTTP_200_OK)
+
+@router.get(
+    "",
+    response_model=GetCategory,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(categories_versions)],
+)
 def get_category(
     session: Generator = Depends(get_db),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
-    categories = session.query(Category).all()
+    def load_categories():
+        categories = session.query(Category).all()
 
-    if len(categories) == 0:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="There are no categories",
-        )
+        if len(categories) == 0:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="There are no categories",
+            )
+
+        return GetCategory(data=categories)
 
-    return GetCategory(data=categories)
+    return cache.get_or_set("categories", None, load_categories)
 
 
 @router.get("/detail", response_model=DetailCategory, status_code=status.HTTP_200_OK)
@@ -60,6 +73,7 @@ def create_category(
     request: CreateCategory,
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_admin),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
     try:
         session.add(Category(**request.dict()))
@@ -70,6 +84,7 @@ def create_category(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=format_error(e),
         )
+    cache.invalidate("categories", "home", "products")
     logger.info(f"Category {request.title} created by {current_user.name}")
 
     return DefaultResponse(message="Category added")
@@ -81,6 +96,7 @@ def update_category(
     request: UpdateCategory,
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_admin),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
     category = session.query(Category).filter(Category.id == id).first()
     if not category:
@@ -92,6 +108,7 @@ def update_category(
     category.type = request.type
 
     session.commit()
+    cache.invalidate("categories", "home", "products")
 
     logger.info(f"Category {request.title} updated by {current_user.name}")
 
@@ -103,6 +120,7 @@ def delete_category(
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_admin),
     category_id: DeleteCategory = Depends(DeleteCategory),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
     try:
         session.query(Category).filter(Category.id == category_id.id).delete()
@@ -114,6 +132,7 @@ def delete_category(
             detail=format_error(e),
         )
 
+    cache.invalidate("categories", "home", "products")
     logger.info(f"Category {Category.title} deleted by {current_user.name}")
 
     return DefaultResponse(message="Category deleted")
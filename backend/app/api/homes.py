@@ -1,76 +1,100 @@
 from typing import Generator
 
-from fastapi import HTTPException, status
+from fastapi import HTTPException, Request, Response, status
 from fastapi.params import Depends
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
 
 from app.core.config import settings
 from app.core.logger import logger
+from app.deps.cache import Cache, get_cache
+from app.deps.conditional import ConditionalGet, check_payload_etag
 from app.deps.db import get_db
 from app.schemas.home import GetBestSeller, GetCategories
 
 router = APIRouter()
 
+category_versions = ConditionalGet(tables=["categories", "product_cards"])
 
-@router.get("/category", response_model=GetCategories, status_code=status.HTTP_200_OK)
+
+@router.get(
+    "/category",
+    response_model=GetCategories,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(category_versions)],
+)
 def get_category_with_image(
     session: Generator = Depends(get_db),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
-    categories = session.execute(
-        f"""
-            SELECT categories.id, categories.title, CONCAT('{settings.CLOUD_STORAGE}/',
-            COALESCE(image_url, 'image-not-available.webp')) AS image
-            FROM only categories
-            LEFT JOIN products ON categories.id = products.category_id
-            AND products.id = (
-                SELECT id FROM products WHERE category_id = categories.id LIMIT 1
-            )
-            LEFT JOIN product_images ON products.id = product_images.product_id
-            AND product_images.id = (
-                SELECT id FROM product_images WHERE product_id = products.id LIMIT 1
+    def load_categories():
+        categories = session.execute(
+            f"""
+                SELECT categories.id, categories.title, CONCAT('{settings.CLOUD_STORAGE}/',
+                COALESCE(card_url, image_url, 'image-not-available.webp')) AS image
+                FROM only categories
+                LEFT JOIN products ON categories.id = products.category_id
+                AND products.id = (
+                    SELECT id FROM products WHERE category_id = categories.id LIMIT 1
+                )
+                LEFT JOIN product_images ON products.id = product_images.product_id
+                AND product_images.id = (
+                    SELECT id FROM product_images WHERE product_id = products.id LIMIT 1
+                )
+                LEFT JOIN images ON product_images.image_id = images.id
+                """
+        ).fetchall()
+
+        if not categories:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="There are no categories",
             )
-            LEFT JOIN images ON product_images.image_id = images.id
-            """
-    ).fetchall()
 
-    if not categories:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="There are no categories",
-        )
+        return GetCategories(data=categories)
 
-    return GetCategories(data=categories)
+    return cache.get_or_set("home", "category", load_categories)
 
 
 @router.get(
-    "/best-seller", response_model=GetBestSeller, status_code=status.HTTP_200_OK
+    "/best-seller",
+    response_model=GetBestSeller,
+    status_code=status.HTTP_200_OK,
 )
 def get_best_seller(
+    request: Request,
+    response: Response,
     session: Generator = Depends(get_db),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
-    best_seller = session.execute(
-        f"""
-            SELECT products.id, products.title, products.price,
-            array_agg(DISTINCT CONCAT('{settings.CLOUD_STORAGE}/',
-            COALESCE(images.image_url, 'image-not-available.webp'))) as images
-            FROM only products
-            LEFT JOIN product_images ON products.id = product_images.product_id
-            LEFT JOIN images ON product_images.image_id = images.id
-            LEFT JOIN product_size_quantities ON products.id = product_size_quantities.product_id
-            JOIN order_items ON product_size_quantities.id = order_items.product_size_quantity_id
-            JOIN orders ON order_items.order_id = orders.id
-            WHERE orders.status = 'completed'
-            GROUP BY products.id
-            ORDER BY COUNT(order_items.id) DESC
-            LIMIT 10
-            """
-    ).fetchall()
+    def load_best_seller():
+        best_seller = session.execute(
+            f"""
+                SELECT product_cards.id, product_cards.title, product_cards.price,
+                ARRAY(SELECT CONCAT('{settings.CLOUD_STORAGE}/', image) FROM unnest(product_cards.images) image) as images
+                FROM (
+                    SELECT product_size_quantities.product_id, COUNT(order_items.id) sold
+                    FROM order_items
+                    JOIN orders ON order_items.order_id = orders.id
+                    JOIN product_size_quantities ON product_size_quantities.id = order_items.product_size_quantity_id
+                    WHERE orders.status = 'completed'
+                    GROUP BY product_size_quantities.product_id
+                ) best_seller
+                JOIN product_cards ON product_cards.id = best_seller.product_id
+                ORDER BY best_seller.sold DESC
+                LIMIT 10
+                """
+        ).fetchall()
+
+        if not best_seller:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="There are no best seller items",
+            )
 
-    if not best_seller:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="There are no best seller items",
-        )
+        return GetBestSeller(data=best_seller)
 
-    return GetBestSeller(data=best_seller)
+    best_seller = cache.get_or_set("home", "best-seller", load_best_seller)
+    # orders are not versioned, the cached result is
+    check_payload_etag(request, response, best_seller)
+    return best_seller
@@ -1,7 +1,7 @@
-from typing import Generator
+from typing import Generator, Optional
 from uuid import UUID
 
-from fastapi import BackgroundTasks, HTTPException, Query, status
+from fastapi import BackgroundTasks, Header, HTTPException, Query, status
 from fastapi.params import Depends
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
@@ -9,11 +9,15 @@ from fastapi.routing import APIRouter
 from app.core.config import settings
 from app.core.logger import logger
 from app.deps.authentication import get_current_active_admin, get_current_active_user
+from app.deps.cache import Cache, get_cache
 from app.deps.db import get_db
+from app.deps.idempotency import (
+    claim_idempotency_key,
+    request_fingerprint,
+    store_idempotent_response,
+)
 from app.deps.send_email import send_checkout_email
 from app.models.order import Order
-from app.models.order_item import OrderItem
-from app.models.product_size_quantity import ProductSizeQuantity
 from app.models.user import User
 from app.schemas.default_model import DefaultResponse, Pagination
 from app.schemas.order import (
@@ -52,7 +56,7 @@ def get_order_details(
                 ),
                 'price', order_items.price,
                 'name', products.title,
-                'image', CONCAT('{settings.CLOUD_STORAGE}/', COALESCE(images.image_url, 'image-not-available.webp'))
+                'image', CONCAT('{settings.CLOUD_STORAGE}/', COALESCE(images.thumb_url, images.image_url, 'image-not-available.webp'))
             ) product
             FROM only orders
             JOIN order_items ON orders.id = order_items.order_id
@@ -97,10 +101,10 @@ def get_shipping_price(
 
     total_price = session.execute(
         """
-        SELECT SUM(products.price * carts.quantity) total_price
+        SELECT SUM(product_cards.price * carts.quantity) total_price
         FROM only carts
         JOIN product_size_quantities ON carts.product_size_quantity_id = product_size_quantities.id
-        JOIN products ON product_size_quantities.product_id = products.id
+        JOIN product_cards ON product_size_quantities.product_id = product_cards.id
         WHERE carts.user_id = :user_id
         """,
         {
@@ -171,11 +175,13 @@ def get_orders_admin(
 
 
 @router.post("/order", status_code=status.HTTP_201_CREATED)
-async def create_order(
+def create_order(
     request: CreateOrder,
     background_task: BackgroundTasks,
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    cache: Cache = Depends(get_cache),
+    idempotency_key: Optional[str] = Header(None),
 ) -> JSONResponse:
     if request.shipping_address.address_name == "":
         raise HTTPException(
@@ -201,24 +207,54 @@ async def create_order(
             detail="Phone number is empty",
         )
 
+    # a retry gets the response of the first request, nothing is executed again
+    replay = claim_idempotency_key(
+        session,
+        current_user.id,
+        idempotency_key,
+        request_fingerprint("POST /order", request),
+    )
+    if replay:
+        return replay
+
+    # checkout is a single transaction, the user row and the stock rows stay
+    # locked until the commit, so concurrent checkouts cannot oversell
+    user = session.execute(
+        "SELECT id, balance FROM only users WHERE id = :user_id FOR UPDATE",
+        {"user_id": current_user.id},
+    ).fetchone()
+    # stock rows are locked in id order, concurrent checkouts cannot deadlock
     cart = session.execute(
         """
-        SELECT product_size_quantities.id, product_size_quantities.quantity as stock,
-        carts.quantity, products.title, products.brand, products.condition, products.price, sizes.size
+        SELECT carts.id as cart_id, product_size_quantities.id, product_size_quantities.quantity as stock,
+        carts.quantity, products.id as product_id, products.title, products.brand, products.condition, products.price, sizes.size,
+        products.deleted_at IS NOT NULL as archived
         FROM only carts
-        JOIN product_size_quantities ON carts.product_size_quantity_id = product_size_quantities.id
+        JOIN only product_size_quantities ON carts.product_size_quantity_id = product_size_quantities.id
         JOIN sizes ON product_size_quantities.size_id = sizes.id
         JOIN products ON product_size_quantities.product_id = products.id
         WHERE user_id = :user_id
+        ORDER BY product_size_quantities.id
+        FOR UPDATE OF product_size_quantities
     """,
         {"user_id": current_user.id},
     ).fetchall()
     if not cart:
+        session.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Cart is empty",
         )
 
+    for item in cart:
+        # no longer listed by the cart page, which reads product_cards
+        if item.archived:
+            session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Product {item.title} is no longer available, please remove it from cart",
+            )
+
     #  Regular:
     #  If total price of items < 200k: Shipping price is 15% of the total price of items purchased
     #  If total price of items >= 200k: Shipping price is 20% of the total price of items purchased
@@ -236,92 +272,102 @@ async def create_order(
         )
     logger.info(f"Shipping price: {shipping_price}")
     logger.info(f"Total price: {total_price}")
-    if total_price + shipping_price > current_user.balance:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Not enough balance, you need {total_price + shipping_price - current_user.balance} more",
-        )
-
-    # create order
-    try:
-        order = Order(
-            user_id=current_user.id,
-            address_name=request.shipping_address.address_name,
-            address=request.shipping_address.address,
-            city=request.shipping_address.city,
-            shipping_method=request.shipping_method,
-            shipping_price=shipping_price,
-            phone_number=request.shipping_address.phone_number,
-        )
-        session.add(order)
-        session.commit()
-        logger.info(f"User {current_user.name} created order {order.id}")
-    except Exception as e:
-        logger.error(e)
+    if total_price + shipping_price > user.balance:
         session.rollback()
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Something went wrong, when creating order",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Not enough balance, you need {total_price + shipping_price - user.balance} more",
         )
 
-    # create order items
     for item in cart:
         if item.quantity > item.stock:
+            session.rollback()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Product {item.title} is out of stock, please remove it from cart",
             )
-        order_item = OrderItem(
-            order_id=order.id,
-            product_size_quantity_id=item.id,
-            quantity=item.quantity,
-            price=item.price,
-        )
-        session.add(order_item)
-        session.commit()
-        logger.info(
-            f"User {current_user.name} added {item.quantity} of product {item.title} to order {order.id}"
-        )
 
-        product_size_quantity = session.query(ProductSizeQuantity).get(item.id)
-        product_size_quantity.quantity -= item.quantity
-        logger.info(
-            f"Stock of product {item.title} updated to {product_size_quantity.quantity}"
+    items = ", ".join(
+        f"(CAST(:id_{i} AS UUID), :quantity_{i}, :price_{i})" for i in range(len(cart))
+    )
+    item_params = {}
+    for i, item in enumerate(cart):
+        item_params[f"id_{i}"] = item.id
+        item_params[f"quantity_{i}"] = item.quantity
+        item_params[f"price_{i}"] = item.price
+
+    if request.send_email:
+        response = DefaultResponse(
+            message="Order created successfully And An Email Will Be Sent To You Shortly"
         )
-        session.commit()
+    else:
+        response = DefaultResponse(message="Order created successfully")
 
-    # clear cart
     try:
-        session.execute(
+        order_id = session.execute(
             """
-            DELETE FROM only carts
-            WHERE user_id = :user_id
+            INSERT INTO orders (user_id, status, address_name, address, city, shipping_method, shipping_price, phone_number)
+            VALUES (:user_id, 'processed', :address_name, :address, :city, :shipping_method, :shipping_price, :phone_number)
+            RETURNING id
+        """,
+            {
+                "user_id": current_user.id,
+                "address_name": request.shipping_address.address_name,
+                "address": request.shipping_address.address,
+                "city": request.shipping_address.city,
+                "shipping_method": request.shipping_method,
+                "shipping_price": shipping_price,
+                "phone_number": request.shipping_address.phone_number,
+            },
+        ).scalar()
+        session.execute(
+            f"""
+            INSERT INTO order_items (order_id, product_size_quantity_id, quantity, price)
+            SELECT :order_id, items.id, items.quantity, items.price
+            FROM (VALUES {items}) AS items (id, quantity, price)
         """,
-            {"user_id": current_user.id},
+            {"order_id": order_id, **item_params},
         )
-        session.commit()
-        logger.info(f"User {current_user.name} cleared cart")
-    except Exception as e:
-        logger.error(e)
-        session.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Something went wrong, when clearing cart",
+        session.execute(
+            f"""
+            UPDATE product_size_quantities
+            SET quantity = product_size_quantities.quantity - items.quantity
+            FROM (VALUES {items}) AS items (id, quantity, price)
+            WHERE product_size_quantities.id = items.id
+        """,
+            item_params,
+        )
+        session.execute(
+            "DELETE FROM only carts WHERE id IN :cart_ids",
+            {"cart_ids": tuple(item.cart_id for item in cart)},
+        )
+        session.execute(
+            "UPDATE only users SET balance = balance - :amount WHERE id = :user_id",
+            {"amount": total_price + shipping_price, "user_id": current_user.id},
+        )
+        store_idempotent_response(
+            session,
+            current_user.id,
+            idempotency_key,
+            status.HTTP_201_CREATED,
+            response,
         )
-
-    # reduce balance
-    try:
-        user = session.query(User).get(current_user.id)
-        user.balance -= total_price + shipping_price
         session.commit()
-        logger.info(f"User {current_user.name} reduced balance to {user.balance}")
     except Exception as e:
         logger.error(e)
         session.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Something went wrong, when reducing balance",
+            detail="Something went wrong, when creating order",
         )
+    logger.info(
+        f"User {current_user.name} created order {order_id} with {len(cart)} items"
+    )
+
+    # product details show the stock that was just sold
+    for item in cart:
+        cache.invalidate("products", key=str(item.product_id))
+
     if request.send_email:
         background_task.add_task(
             send_checkout_email,
@@ -334,11 +380,7 @@ async def create_order(
             total_price + shipping_price,
             cart,
         )
-        return DefaultResponse(
-            message="Order created successfully And An Email Will Be Sent To You Shortly"
-        )
-    else:
-        return DefaultResponse(message="Order created successfully")
+    return response
 
 
 @router.put(
@@ -348,6 +390,7 @@ def update_order_status(
     order_id: UUID,
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_user),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
     order = (
         session.query(Order)
@@ -369,6 +412,7 @@ def update_order_status(
 
     order.status = "completed"
     session.commit()
+    cache.invalidate("home")
 
     return DefaultResponse(message="Order status updated")
 
@@ -379,6 +423,7 @@ def update_orders(
     order_status: str = Query(regex="^(processed|shipped|cancelled|completed)$"),
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_admin),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
     order = session.execute(
         """
@@ -403,6 +448,7 @@ def update_orders(
     )
 
     session.commit()
+    cache.invalidate("home")
     logger.info(f"Order {id} updated by {current_user.email}")
 
     return DefaultResponse(message="Order updated")
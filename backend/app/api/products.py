@@ -1,8 +1,17 @@
 import math
-from typing import Generator, List
+import re
+from typing import Generator, List, Optional, Tuple
 from uuid import UUID
 
-from fastapi import File, HTTPException, Query, Response, UploadFile, status
+from fastapi import (
+    BackgroundTasks,
+    File,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+    status,
+)
 from fastapi.params import Depends
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
@@ -10,13 +19,16 @@ from fastapi.routing import APIRouter
 from app.core.config import settings
 from app.core.logger import logger
 from app.deps.authentication import get_current_active_admin
+from app.deps.cache import Cache, get_cache
+from app.deps.conditional import ConditionalGet
 from app.deps.db import get_db
-from app.deps.google_cloud import upload_image
 from app.deps.image_base64 import base64_to_image
+from app.deps.image_ingest import insert_product_images, upload_images
+from app.deps.pagination import decode_cursor, encode_cursor, estimate_count
+from app.deps.similarity import embed_images
 from app.deps.sql_error import format_error
-from app.models.image import Image
+from app.deps.upload import check_image_upload
 from app.models.product import Product
-from app.models.product_image import ProductImage
 from app.models.product_size_quantity import ProductSizeQuantity
 from app.models.size import Size
 from app.models.user import User
@@ -31,8 +43,116 @@ from app.schemas.product import (
 
 router = APIRouter()
 
+products_versions = ConditionalGet(tables=["product_cards"])
+product_versions = ConditionalGet(
+    """
+    SELECT updated_at FROM product_cards WHERE id = :id
+    UNION ALL
+    SELECT updated_at FROM only product_size_quantities WHERE product_id = :id
+    UNION ALL
+    SELECT categories.updated_at FROM only categories
+    JOIN product_cards ON product_cards.category_id = categories.id
+    WHERE product_cards.id = :id
+    """
+)
 
-@router.get("", response_model=GetProducts, status_code=status.HTTP_200_OK)
+PRODUCT_SORTS = {
+    "Title a_z": ("title", "ASC"),
+    "Title z_a": ("title", "DESC"),
+    "Price a_z": ("price", "ASC"),
+    "Price z_a": ("price", "DESC"),
+    "Newest": ("created_at", "DESC"),
+    "Oldest": ("created_at", "ASC"),
+}
+
+
+LIKE_SPECIAL = re.compile(r"[\\%_]")
+
+
+def name_filter(product_name: str) -> Tuple[str, dict]:
+    """Case-insensitive match of every word of `product_name` in the title.
+
+    One ILIKE per word, each served by the ix_product_cards_title_trgm
+    trigram index, LIKE wildcards in the words are matched literally.
+    """
+    filters, params = "", {}
+    for i, term in enumerate(product_name.split()):
+        filters += f"AND title ILIKE :product_name_{i} "
+        term = LIKE_SPECIAL.sub(r"\\\g<0>", term)
+        params[f"product_name_{i}"] = f"%{term}%"
+    return filters, params
+
+
+def products_query(
+    category: List[UUID],
+    page: int,
+    page_size: int,
+    sort_by: str,
+    price: List[int],
+    condition: str,
+    product_name: str,
+    cursor: Optional[str],
+    total: str,
+) -> Tuple[str, str, dict]:
+    """SQL of GET /products: the page query, the count of its filters and the binds."""
+    # cursor mode is opt-in, an empty cursor asks for the first page
+    use_cursor = cursor is not None
+    order, sort = PRODUCT_SORTS.get(sort_by, ("id", "ASC"))
+
+    filters, params = name_filter(product_name)
+    if category:
+        filters += "AND category_id IN :category "
+    if price.__len__() > 0:
+        filters += "AND price >= :min_price "
+    if price.__len__() > 1:
+        filters += "AND price <= :max_price "
+    if condition != "":
+        filters += "AND condition = :condition "
+
+    params = {
+        **params,
+        "category": tuple(category),
+        "min_price": price[0] if price.__len__() > 0 else 0,
+        "max_price": price[1] if price.__len__() > 1 else 0,
+        "condition": condition,
+        "limit": page_size,
+        "offset": (page - 1) * page_size,
+    }
+    count_query = f"SELECT 1 FROM product_cards {filters.replace('AND', 'WHERE', 1)}"
+
+    ordering = f"ORDER BY {order} {sort}" if sort_by != "" else ""
+    window = ", COUNT(*) OVER() totalrow_count" if total == "exact" else ""
+    if use_cursor:
+        # seek past the last row of the previous page instead of skipping rows
+        if cursor:
+            params["cursor_key"], params["cursor_id"] = decode_cursor(cursor, sort_by)
+            operator = ">" if sort == "ASC" else "<"
+            filters += f"AND ({order}, id) {operator} (:cursor_key, :cursor_id) "
+        ordering = f"ORDER BY {order} {sort}, id {sort}"
+        window = ""
+        params["limit"] = page_size + 1
+        params["offset"] = 0
+
+    # the filters are ANDed, the first one opens the WHERE clause
+    where = filters.replace("AND", "WHERE", 1)
+    query = f"""
+        SELECT id, title, brand, product_detail, price, condition, category_id, created_at,
+        ARRAY(SELECT CONCAT('{settings.CLOUD_STORAGE}/', image) FROM unnest(images) image) as images
+        {window}
+        FROM product_cards
+        {where}
+        {ordering}
+        LIMIT :limit OFFSET :offset
+        """
+    return query, count_query, params
+
+
+@router.get(
+    "",
+    response_model=GetProducts,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(products_versions)],
+)
 def get_products(
     session: Generator = Depends(get_db),
     category: List[UUID] = Query([]),
@@ -44,72 +164,54 @@ def get_products(
     price: List[int] = Query([], ge=0),
     condition: str = Query("", regex="^(new|used|)$"),
     product_name: str = "",
+    cursor: Optional[str] = Query(None),
+    total: str = Query("exact", regex="^(exact|approximate)$"),
 ) -> JSONResponse:
-    sorts = sort_by.split(" ")
-    if sorts[0] == "Newest":
-        order = "products.created_at"
-        sort = "DESC"
-    elif sorts[0] == "Oldest":
-        order = "products.created_at"
-        sort = "ASC"
-    elif sorts.__len__() == 2:
-        order = sorts[0].lower()
-        sort = "ASC" if sorts[1] == "a_z" else "DESC"
-
-    query = f"""
-        SELECT products.id, products.title, products.brand, products.product_detail,
-        products.price, products.condition, products.category_id,
-        array_agg(CONCAT('{settings.CLOUD_STORAGE}/', COALESCE(images.image_url, 'image-not-available.webp'))) as images,
-        COUNT(*) OVER() totalrow_count
-        FROM only products
-        LEFT JOIN only product_images ON products.id = product_images.product_id
-        LEFT JOIN images ON product_images.image_id = images.id
-        """
-    if category:
-        query += "AND category_id IN :category "
-    if product_name != "":
-        query += "AND title LIKE :product_name "
-    if price.__len__() > 0:
-        query += "AND price >= :min_price "
-    if price.__len__() > 1:
-        query += "AND price <= :max_price "
-    if condition != "":
-        query += "AND condition = :condition "
-    query += "GROUP BY products.id "
-    if sort_by != "":
-        query += f"ORDER BY {order} {sort} "
-    query += "LIMIT :limit OFFSET :offset "
-
-    query = query.replace("AND", "WHERE", 1)
+    use_cursor = cursor is not None
+    order, _ = PRODUCT_SORTS.get(sort_by, ("id", "ASC"))
+    query, count_query, params = products_query(
+        category,
+        page,
+        page_size,
+        sort_by,
+        price,
+        condition,
+        product_name,
+        cursor,
+        total,
+    )
 
-    products = session.execute(
-        query,
-        {
-            "category": tuple(category),
-            "product_name": f"%{product_name}%",
-            "min_price": price[0] if price.__len__() > 0 else 0,
-            "max_price": price[1] if price.__len__() > 1 else 0,
-            "condition": condition,
-            "limit": page_size,
-            "offset": (page - 1) * page_size,
-        },
-    ).fetchall()
+    products = session.execute(query, params).fetchall()
 
     if products.__len__() == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="There are no products"
         )
 
+    next_cursor = None
+    if use_cursor and products.__len__() > page_size:
+        products = products[:page_size]
+        last = products[-1]
+        next_cursor = encode_cursor(sort_by, getattr(last, order), last.id)
+
+    if total == "approximate":
+        total_item = estimate_count(session, count_query, params)
+    elif use_cursor:
+        total_item = session.execute(
+            f"SELECT COUNT(*) FROM ({count_query}) filtered", params
+        ).fetchone()[0]
+    else:
+        total_item = products[0].totalrow_count
+
     return GetProducts(
         data=products,
         total_rows=len(products),
+        next_cursor=next_cursor,
         pagination=Pagination(
             page=page,
             page_size=page_size,
-            total_item=products[0].totalrow_count if products else 0,
-            total_page=math.ceil(products[0].totalrow_count / page_size)
-            if products
-            else 1,
+            total_item=total_item,
+            total_page=math.ceil(total_item / page_size),
         ),
     )
 
@@ -117,8 +219,10 @@ def get_products(
 @router.post("", response_model=DefaultResponse, status_code=status.HTTP_201_CREATED)
 def create_product(
     request: CreateProduct,
+    background_tasks: BackgroundTasks,
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_admin),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
 
     product = Product(
@@ -183,61 +287,110 @@ def create_product(
                 detail="Invalid image format. Please use base64 format with data:image",
             )
 
+    files = []
     for image in request.images:
         image_data, image_type = base64_to_image(image)
-        file = {
-            "file": image_data,
-            "media_type": image_type,
-            "file_name": title_slug,
-        }
-        image_url = upload_image(file, f"products/{category}")
-        if image_url is None:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Product created but image upload failed, because of cloud storage error",
-            )
+        files.append(
+            {"file": image_data, "media_type": image_type, "file_name": title_slug}
+        )
+    uploaded = upload_images(files, f"products/{category}", variants=True)
+    try:
+        images = insert_product_images(session, product.id, uploaded)
+        session.commit()
+    except Exception as e:
+        logger.error(e)
+        session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=format_error(e)
+        )
+    logger.info(f"{len(images)} product images created by {current_user.name}")
+    uploaded_images = [
+        (image_id, file["file"]) for (image_id, _), file in zip(images, files)
+    ]
+
+    # embedded after the response, for the visual similarity search
+    if uploaded_images:
+        background_tasks.add_task(embed_images, uploaded_images)
+    cache.invalidate("products", "home")
+    logger.info(f"Product {product.title} created by {current_user.name}")
 
-        name = image_url.split("/")[-1].split(".")[0]
-        image = Image(name=name, image_url=image_url)
-        try:
-            session.add(image)
-            session.commit()
-            session.refresh(image)
-        except Exception as e:
-            logger.error(e)
-            session.rollback()
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail=format_error(e)
-            )
+    return DefaultResponse(message="Product added")
 
-        product_image = ProductImage(
-            product_id=product.id,
-            image_id=image.id,
+
+@router.post(
+    "/{id}/images",
+    response_model=DefaultResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+def add_product_images(
+    id: UUID,
+    background_tasks: BackgroundTasks,
+    images: List[UploadFile] = File(...),
+    session: Generator = Depends(get_db),
+    current_user: User = Depends(get_current_active_admin),
+    cache: Cache = Depends(get_cache),
+) -> JSONResponse:
+    """Adds multipart image files to a product, created with POST /products."""
+    if len(images) > settings.UPLOAD_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.UPLOAD_MAX_FILES} images per request",
         )
-        try:
-            session.add(product_image)
-            session.commit()
-            session.refresh(product_image)
-            logger.info(
-                f"Product image {product_image.id} created by {current_user.name}"
-            )
-        except Exception as e:
-            logger.error(e)
-            session.rollback()
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, detail=format_error(e)
-            )
+    product = session.execute(
+        """
+        SELECT products.title, categories.title AS category FROM only products
+        JOIN categories ON products.category_id = categories.id
+        WHERE products.id = :id
+        """,
+        {"id": id},
+    ).fetchone()
+    if product is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
+        )
+    # validate every file before the first one is stored
+    checked = [(upload, *check_image_upload(upload)) for upload in images]
 
-    logger.info(f"Product {product.title} created by {current_user.name}")
+    title_slug = product.title.lower().replace(" ", "-")
+    files = [
+        {
+            "file": upload.file,
+            "size": size,
+            "media_type": media_type,
+            "file_name": title_slug,
+        }
+        for upload, size, media_type in checked
+    ]
+    uploaded = upload_images(files, f"products/{product.category}", variants=True)
+    try:
+        images = insert_product_images(session, id, uploaded)
+        session.commit()
+    except Exception as e:
+        logger.error(e)
+        session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=format_error(e)
+        )
+    logger.info(f"{len(images)} images added to product {id} by {current_user.name}")
 
-    return DefaultResponse(message="Product added")
+    uploaded_images = []
+    for (image_id, _), (upload, _, _) in zip(images, checked):
+        upload.file.seek(0)
+        uploaded_images.append((image_id, upload.file.read()))
+
+    background_tasks.add_task(embed_images, uploaded_images)
+    cache.invalidate("products", "home")
+
+    return DefaultResponse(message="Product images added")
 
 
 @router.put("", response_model=DefaultResponse, status_code=status.HTTP_200_OK)
 def update_product(
     request: UpdateProduct,
+    background_tasks: BackgroundTasks,
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_admin),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
     try:
         product = session.query(Product).filter(Product.id == request.id).first()
@@ -288,7 +441,12 @@ def update_product(
     request_updated_images = []
     database_images = session.execute(
         f"""
-        SELECT CONCAT('{settings.CLOUD_STORAGE}/', images.image_url) AS image_url, images.id
+        SELECT CONCAT('{settings.CLOUD_STORAGE}/', images.image_url) AS image_url, images.id,
+        ARRAY(
+            SELECT CONCAT('{settings.CLOUD_STORAGE}/', url)
+            FROM unnest(ARRAY[images.image_url, images.thumb_url, images.card_url, images.detail_url]) url
+            WHERE url IS NOT NULL
+        ) AS urls
         FROM only product_images
         JOIN only images ON product_images.image_id = images.id
         WHERE product_images.product_id = :product_id
@@ -298,65 +456,46 @@ def update_product(
 
     # if images is url do not delete
 
+    files = []
     for image in request.images:
         if not image.startswith("data:image"):
             request_updated_images.append(image)
         else:
             image_data, image_type = base64_to_image(image)
-            file = {
-                "file": image_data,
-                "media_type": image_type,
-                "file_name": request.title.lower().replace(" ", "-"),
-            }
-            category = session.execute(
-                "SELECT title FROM categories WHERE id = :id",
-                {"id": request.category_id},
-            ).fetchone()[0]
-
-            image_url = upload_image(file, f"products/{category}")
-            if image_url is None:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Product updated but image upload failed, because of cloud storage error",
-                )
-            name = image_url.split("/")[-1].split(".")[0]
-            image = Image(name=name, image_url=image_url)
-            try:
-                session.add(image)
-                session.commit()
-                session.refresh(image)
-                logger.info(
-                    f"Image {image.name} added to product {request.title} by {current_user.name}"
-                )
-            except Exception as e:
-                logger.error(e)
-                session.rollback()
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST, detail=format_error(e)
-                )
-
-            try:
-                product_image = ProductImage(
-                    product_id=request.id,
-                    image_id=image.id,
-                )
-                session.add(product_image)
-                session.commit()
-                session.refresh(product_image)
-                logger.info(
-                    f"Product Image Relation {product_image.id} added to product {request.title} by {current_user.name}"
-                )
-
-            except Exception as e:
-                logger.error(e)
-                session.rollback()
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST, detail=format_error(e)
-                )
-
-    # delete images that are not in the request
+            files.append(
+                {
+                    "file": image_data,
+                    "media_type": image_type,
+                    "file_name": request.title.lower().replace(" ", "-"),
+                }
+            )
+
+    uploaded_images = []
+    if files:
+        category = session.execute(
+            "SELECT title FROM categories WHERE id = :id",
+            {"id": request.category_id},
+        ).fetchone()[0]
+        uploaded = upload_images(files, f"products/{category}", variants=True)
+        try:
+            images = insert_product_images(session, request.id, uploaded)
+            session.commit()
+        except Exception as e:
+            logger.error(e)
+            session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=format_error(e)
+            )
+        logger.info(
+            f"{len(images)} images added to product {request.title} by {current_user.name}"
+        )
+        uploaded_images = [
+            (image_id, file["file"]) for (image_id, _), file in zip(images, files)
+        ]
+
+    # delete images that are not in the request, by any of their variant urls
     for database_image in database_images:
-        if database_image.image_url not in request_updated_images:
+        if not set(database_image.urls) & set(request_updated_images):
             session.execute(
                 """
                 DELETE FROM product_images WHERE product_id = :product_id AND image_id = :image_id
@@ -369,6 +508,10 @@ def update_product(
                 f"Image {database_image.image_url} deleted by {current_user.name}"
             )
 
+    if uploaded_images:
+        background_tasks.add_task(embed_images, uploaded_images)
+    # removed images leave the similarity index, new ones join once embedded
+    cache.invalidate("products", "home", "product_images")
     logger.info(f"Product {product.title} updated by {current_user.name}")
 
     return DefaultResponse(message="Product updated")
@@ -379,6 +522,7 @@ def delete_product(
     product_id: UUID,
     session: Generator = Depends(get_db),
     current_user: User = Depends(get_current_active_admin),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
     product = session.query(Product).filter(Product.id == product_id).first()
     if product is None:
@@ -388,38 +532,48 @@ def delete_product(
         )
     session.delete(product)
     session.commit()
+    cache.invalidate("products", "home", "product_images")
 
     logger.info(f"Product {product.title} deleted by {current_user.name}")
 
     return DefaultResponse(message="Product deleted")
 
 
-@router.get("/{id}", response_model=GetProduct, status_code=status.HTTP_200_OK)
+@router.get(
+    "/{id}",
+    response_model=GetProduct,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(product_versions)],
+)
 def get_product(
     id: UUID,
     session: Generator = Depends(get_db),
+    cache: Cache = Depends(get_cache),
 ) -> JSONResponse:
-    result = session.execute(
-        f"""
-        SELECT products.id, products.title, products.brand, products.product_detail,
-        products.price, products.condition, products.category_id,
-        array_agg(DISTINCT  CONCAT('{settings.CLOUD_STORAGE}/', COALESCE(images.image_url, 'image-not-available.webp'))) as images,
-        array_agg(DISTINCT  sizes.size) FILTER (WHERE sizes.size IS NOT NULL) as size, categories.title as category_name,
-        array_agg(DISTINCT jsonb_build_object('size', sizes.size, 'quantity', product_size_quantities.quantity))
-        FILTER (WHERE sizes.size IS NOT NULL) as stock
-        FROM only products
-        LEFT JOIN only product_images ON products.id = product_images.product_id
-        LEFT JOIN only images ON product_images.image_id = images.id
-        LEFT JOIN product_size_quantities ON products.id = product_size_quantities.product_id
-        LEFT JOIN sizes ON product_size_quantities.size_id = sizes.id
-        JOIN categories ON products.category_id = categories.id
-        WHERE products.id = :id
-        GROUP BY products.id, categories.title
-        """,
-        {"id": id},
-    ).fetchone()
-    if not result:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
-        )
-    return result
+    def load_product():
+        result = session.execute(
+            f"""
+            SELECT products.id, products.title, products.brand, products.product_detail,
+            products.price, products.condition, products.category_id,
+            array_agg(DISTINCT  CONCAT('{settings.CLOUD_STORAGE}/', COALESCE(images.detail_url, images.image_url, 'image-not-available.webp'))) as images,
+            array_agg(DISTINCT  sizes.size) FILTER (WHERE sizes.size IS NOT NULL) as size, categories.title as category_name,
+            array_agg(DISTINCT jsonb_build_object('size', sizes.size, 'quantity', product_size_quantities.quantity))
+            FILTER (WHERE sizes.size IS NOT NULL) as stock
+            FROM only products
+            LEFT JOIN only product_images ON products.id = product_images.product_id
+            LEFT JOIN only images ON product_images.image_id = images.id
+            LEFT JOIN product_size_quantities ON products.id = product_size_quantities.product_id
+            LEFT JOIN sizes ON product_size_quantities.size_id = sizes.id
+            JOIN categories ON products.category_id = categories.id
+            WHERE products.id = :id
+            GROUP BY products.id, categories.title
+            """,
+            {"id": id},
+        ).fetchone()
+        if not result:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Product not found"
+            )
+        return GetProduct.from_orm(result)
+
+    return cache.get_or_set("products", str(id), load_product)
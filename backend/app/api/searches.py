@@ -1,37 +1,57 @@
-import random
-from datetime import datetime, timedelta
-from typing import Generator, List
+import math
+from typing import List
+from uuid import UUID
 
-import requests
-from fastapi import HTTPException, Response, status
+from fastapi import File, HTTPException, Query, Response, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.params import Depends
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRouter
+from sqlalchemy import text as sql_text
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.logger import logger
-from app.deps.db import get_db
+from app.core.metrics import metrics
+from app.deps.classifier import ClassifierService, get_classifier
+from app.deps.db import get_async_session
 from app.deps.image_base64 import base64_to_image
-from app.image_classification.pipeline.main import ImageClassifier
-from app.models.image import Image
+from app.deps.shower_thoughts import ShowerThoughtsFeed, get_shower_thoughts
+from app.deps.similarity import SimilarityIndex, get_similarity_index
+from app.deps.suggestions import SuggestionIndex, get_suggestion_index
+from app.deps.upload import read_image_upload
+from app.schemas.default_model import Pagination
 from app.schemas.search import (
     GetImage,
     SearchImage,
     SearchImageResponse,
+    SearchProducts,
     SearchText,
     ShowerThoughts,
+    SimilarProduct,
+    Suggestion,
 )
 
 router = APIRouter()
 
+# lower bounds of the price facet buckets after the first, which starts at 0
+PRICE_BUCKETS = [100000, 200000, 300000, 500000]
+
 
 @router.get("/image", response_model=GetImage, status_code=status.HTTP_200_OK)
 async def get_image(
     image_name: str,
-    session: Generator = Depends(get_db),
+    session: AsyncSession = Depends(get_async_session),
 ) -> JSONResponse:
     image_name = image_name.lower()
-    image = session.query(Image).filter(Image.name.like(f"%{image_name}%")).first()
+    image = (
+        await session.execute(
+            sql_text(
+                "SELECT name, image_url FROM only images WHERE name LIKE :name LIMIT 1"
+            ),
+            {"name": f"%{image_name}%"},
+        )
+    ).fetchone()
     if not image:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -44,25 +64,258 @@ async def get_image(
 
 
 @router.get("/search", response_model=List[SearchText], status_code=status.HTTP_200_OK)
-def search_text(
+async def search_text(
     text: str,
-    session: Generator = Depends(get_db),
+    session: AsyncSession = Depends(get_async_session),
 ) -> JSONResponse:
-    products = session.execute(
-        """
-            SELECT id, title FROM search_products(:text);
-        """,
-        {"text": text},
+    products = (
+        await session.execute(
+            sql_text(
+                """
+                SELECT id, title FROM search_products(:text);
+            """
+            ),
+            {"text": text},
+        )
     ).fetchall()
     return products
 
 
+@router.get(
+    "/search/products", response_model=SearchProducts, status_code=status.HTTP_200_OK
+)
+async def search_products(
+    text: str = Query(..., min_length=1),
+    category: List[UUID] = Query([]),
+    price: List[int] = Query([], ge=0),
+    condition: str = Query("", regex="^(new|used|)$"),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    session: AsyncSession = Depends(get_async_session),
+) -> JSONResponse:
+    """Ranked products and the facet counts of all matches, in one query.
+
+    A product matches by its weighted words (search_vector, GIN) or by
+    trigram word similarity (search_document, GiST). The facets count the
+    matches per category, condition, brand and price bucket, with GROUPING
+    SETS over the same rows; each one is filtered by all the filters but its
+    own, so the other values of a filtered facet stay selectable.
+    """
+    in_category = "category_id = ANY(:category)" if category else "true"
+    in_price = "true"
+    if len(price) > 0:
+        in_price = "price >= :min_price"
+    if len(price) > 1:
+        in_price += " AND price <= :max_price"
+    in_condition = "condition = :condition" if condition != "" else "true"
+
+    buckets = f"ARRAY[{', '.join(map(str, PRICE_BUCKETS))}]"
+    result = (
+        await session.execute(
+            sql_text(
+                f"""
+                WITH matched AS (
+                    SELECT id, brand, condition, category_id,
+                    width_bucket(price, {buckets}) AS price_bucket,
+                    COALESCE(ts_rank(search_vector, query), 0)
+                    + word_similarity(:text, search_document) AS rank,
+                    {in_category} AS in_category, {in_price} AS in_price,
+                    {in_condition} AS in_condition
+                    FROM only products, websearch_to_tsquery('simple', :text) query
+                    WHERE (search_vector @@ query OR :text <% search_document)
+                ), facets AS (
+                    SELECT category_id, condition, brand, price_bucket,
+                    CASE
+                        WHEN GROUPING(category_id) = 0
+                        THEN COUNT(*) FILTER (WHERE in_price AND in_condition)
+                        WHEN GROUPING(condition) = 0
+                        THEN COUNT(*) FILTER (WHERE in_category AND in_price)
+                        WHEN GROUPING(price_bucket) = 0
+                        THEN COUNT(*) FILTER (WHERE in_category AND in_condition)
+                        ELSE COUNT(*) FILTER (WHERE in_category AND in_price AND in_condition)
+                    END AS count
+                    FROM matched
+                    GROUP BY GROUPING SETS ((category_id), (condition), (brand), (price_bucket), ())
+                )
+                SELECT (
+                    SELECT COALESCE(json_agg(hit ORDER BY hit.rank DESC, hit.title), '[]')
+                    FROM (
+                        SELECT product_cards.id, product_cards.title, product_cards.brand,
+                        product_cards.price, product_cards.condition, product_cards.category_id,
+                        '{settings.CLOUD_STORAGE}/' || product_cards.images[1] AS image, matched.rank
+                        FROM matched JOIN product_cards ON product_cards.id = matched.id
+                        WHERE in_category AND in_price AND in_condition
+                        ORDER BY matched.rank DESC, product_cards.title
+                        LIMIT :limit OFFSET :offset
+                    ) hit
+                ) AS hits, (
+                    SELECT json_agg(facet)
+                    FROM (
+                        SELECT facets.*, categories.title AS category_title
+                        FROM facets LEFT JOIN categories ON categories.id = facets.category_id
+                        WHERE facets.count > 0
+                        ORDER BY facets.count DESC
+                    ) facet
+                ) AS facets
+                """
+            ),
+            {
+                "text": text,
+                "category": category,
+                "min_price": price[0] if len(price) > 0 else 0,
+                "max_price": price[1] if len(price) > 1 else 0,
+                "condition": condition,
+                "limit": page_size,
+                "offset": (page - 1) * page_size,
+            },
+        )
+    ).fetchone()
+
+    facets = {"categories": [], "conditions": [], "brands": [], "prices": []}
+    total_item = 0
+    for facet in result.facets or []:
+        if facet["category_id"] is not None:
+            facets["categories"].append(
+                {
+                    "id": facet["category_id"],
+                    "title": facet["category_title"],
+                    "count": facet["count"],
+                }
+            )
+        elif facet["condition"] is not None:
+            facets["conditions"].append(
+                {"value": facet["condition"], "count": facet["count"]}
+            )
+        elif facet["brand"] is not None:
+            facets["brands"].append({"value": facet["brand"], "count": facet["count"]})
+        elif facet["price_bucket"] is not None:
+            bounds = [0] + PRICE_BUCKETS + [None]
+            bucket = facet["price_bucket"]
+            facets["prices"].append(
+                {
+                    "min_price": bounds[bucket],
+                    "max_price": bounds[bucket + 1],
+                    "count": facet["count"],
+                }
+            )
+        else:
+            total_item = facet["count"]
+    facets["prices"].sort(key=lambda facet: facet["min_price"])
+
+    return SearchProducts(
+        data=result.hits,
+        facets=facets,
+        pagination=Pagination(
+            page=page,
+            page_size=page_size,
+            total_item=total_item,
+            total_page=math.ceil(total_item / page_size),
+        ),
+    )
+
+
+@router.get(
+    "/search/suggest", response_model=List[Suggestion], status_code=status.HTTP_200_OK
+)
+async def search_suggest(
+    text: str,
+    limit: int = Query(10, ge=1, le=20),
+    session: AsyncSession = Depends(get_async_session),
+    index: SuggestionIndex = Depends(get_suggestion_index),
+) -> JSONResponse:
+    """Completions of a typed prefix, from memory.
+
+    Postgres is only asked, with the fuzzy search_products, when nothing
+    starts with the prefix (e.g. a typo).
+    """
+    if not text.strip():
+        return []
+    if index.stale:
+        await run_in_threadpool(index.refresh)
+    suggestions = index.suggest(text, limit)
+    if suggestions:
+        metrics.increment("search.suggest.hit")
+        return suggestions
+
+    metrics.increment("search.suggest.miss")
+    products = (
+        await session.execute(
+            sql_text("SELECT id, title FROM search_products(:text) LIMIT :limit"),
+            {"text": text, "limit": limit},
+        )
+    ).fetchall()
+    return [
+        Suggestion(text=product.title, type="product", id=product.id)
+        for product in products
+    ]
+
+
+async def image_category(
+    img_data: bytes, session: AsyncSession, classifier: ClassifierService
+):
+    result = await classifier.predict(img_data)
+    return (
+        await session.execute(
+            sql_text(
+                """
+                SELECT id, title FROM
+                only categories
+                WHERE title = :title;
+            """
+            ),
+            {
+                "title": result,
+            },
+        )
+    ).fetchone()
+
+
+async def similar_products(
+    img_data: bytes,
+    k: int,
+    session: AsyncSession,
+    classifier: ClassifierService,
+    index: SimilarityIndex,
+) -> List[SimilarProduct]:
+    embedding = (await classifier.embed([img_data]))[0]
+    if isinstance(embedding, Exception):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Image could not be decoded",
+        )
+    await run_in_threadpool(index.refresh)
+    scores = dict(index.search(embedding, k))
+    if not scores:
+        return []
+
+    products = (
+        await session.execute(
+            sql_text(
+                f"""
+                SELECT id, title, brand, price,
+                '{settings.CLOUD_STORAGE}/' || images[1] AS image
+                FROM product_cards WHERE id = ANY(:ids)
+                """
+            ),
+            {"ids": list(scores)},
+        )
+    ).fetchall()
+    return sorted(
+        (
+            SimilarProduct(**product._mapping, score=scores[product.id])
+            for product in products
+        ),
+        key=lambda product: -product.score,
+    )
+
+
 @router.post(
     "/search_image", response_model=SearchImageResponse, status_code=status.HTTP_200_OK
 )
 async def search_image(
     request: SearchImage,
-    session: Generator = Depends(get_db),
+    session: AsyncSession = Depends(get_async_session),
+    classifier: ClassifierService = Depends(get_classifier),
 ) -> JSONResponse:
     # check if image is base64
     if not request.base64_image.startswith("data:"):
@@ -72,18 +325,61 @@ async def search_image(
         )
 
     img_data, image_type = base64_to_image(request.base64_image)
-    image_classifier = ImageClassifier()
-    result = image_classifier.predict(img_data)
-    return session.execute(
-        """
-            SELECT id, title FROM
-            categories
-            WHERE title = :title;
-        """,
-        {
-            "title": result,
-        },
-    ).fetchone()
+    return await image_category(img_data, session, classifier)
+
+
+@router.post(
+    "/search_image/upload",
+    response_model=SearchImageResponse,
+    status_code=status.HTTP_200_OK,
+)
+async def search_image_upload(
+    image: UploadFile = File(...),
+    session: AsyncSession = Depends(get_async_session),
+    classifier: ClassifierService = Depends(get_classifier),
+) -> JSONResponse:
+    """Same as POST /search_image, with the image as a multipart file."""
+    img_data = await read_image_upload(image)
+    return await image_category(img_data, session, classifier)
+
+
+@router.post(
+    "/search_image/similar",
+    response_model=List[SimilarProduct],
+    status_code=status.HTTP_200_OK,
+)
+async def search_similar_products(
+    request: SearchImage,
+    k: int = Query(10, ge=1, le=50),
+    session: AsyncSession = Depends(get_async_session),
+    classifier: ClassifierService = Depends(get_classifier),
+    index: SimilarityIndex = Depends(get_similarity_index),
+) -> JSONResponse:
+    if not request.base64_image.startswith("data:"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Image is not base64",
+        )
+
+    img_data, image_type = base64_to_image(request.base64_image)
+    return await similar_products(img_data, k, session, classifier, index)
+
+
+@router.post(
+    "/search_image/similar/upload",
+    response_model=List[SimilarProduct],
+    status_code=status.HTTP_200_OK,
+)
+async def search_similar_products_upload(
+    image: UploadFile = File(...),
+    k: int = Query(10, ge=1, le=50),
+    session: AsyncSession = Depends(get_async_session),
+    classifier: ClassifierService = Depends(get_classifier),
+    index: SimilarityIndex = Depends(get_similarity_index),
+) -> JSONResponse:
+    """Same as POST /search_image/similar, with the image as a multipart file."""
+    img_data = await read_image_upload(image)
+    return await similar_products(img_data, k, session, classifier, index)
 
 
 @router.get(
@@ -91,22 +387,10 @@ async def search_image(
     response_model=ShowerThoughts,
     status_code=status.HTTP_200_OK,
 )
-async def shower_thoughts() -> JSONResponse:
-    start = datetime(2022, 1, 1)
-    end = datetime.now() - timedelta(days=7)
-
-    random_date = start + (end - start) * random.random()
-    random_date = random_date.strftime("%Y-%m-%dT%H:%M:%SZ").replace(" ", "%20")
-
-    shower_thought_url = "https://api.twitter.com/2/users/854354686194929664/tweets"
-    url = f"{shower_thought_url}?max_results=8&end_time={random_date}"
-    data = requests.get(
-        headers={"Authorization": f"Bearer {settings.TWITTER_API}"},
-        url=f"{url}&tweet.fields=&expansions=&exclude=replies%2Cretweets",
-    ).json()
-
-    try:
-        tweets = [tweet["text"] for tweet in data["data"] if len(tweet["text"]) < 100]
-        return ShowerThoughts(data=tweets)
-    except Exception:
-        return ShowerThoughts(data=["No shower thoughts found"])
+async def shower_thoughts(
+    feed: ShowerThoughtsFeed = Depends(get_shower_thoughts),
+) -> JSONResponse:
+    if not feed.pool:
+        # cold start, the refresher has not filled the pool yet
+        await feed.refresh(if_empty=True)
+    return ShowerThoughts(data=feed.sample() or ["No shower thoughts found"])
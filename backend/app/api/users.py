@@ -75,7 +75,7 @@ def get_orders_user(
                 ),
                 'price', SUM(order_items.price * order_items.quantity),
                 'name', products.title,
-                'image', CONCAT('{settings.CLOUD_STORAGE}/', COALESCE(images.image_url, 'image-not-available.webp'))
+                'image', CONCAT('{settings.CLOUD_STORAGE}/', COALESCE(images.thumb_url, images.image_url, 'image-not-available.webp'))
             ) product
             FROM only orders
             JOIN order_items ON orders.id = order_items.order_id
@@ -28,15 +28,10 @@ def get_wishlist(
 ) -> JSONResponse:
     wishlists = session.execute(
         f"""
-        SELECT wishlists.id, wishlists.product_id, products.title, products.price,
-        CONCAT('{settings.CLOUD_STORAGE}/', COALESCE(images.image_url, 'image-not-available.webp')) AS image
+        SELECT wishlists.id, wishlists.product_id, product_cards.title, product_cards.price,
+        CONCAT('{settings.CLOUD_STORAGE}/', product_cards.thumbnails[1]) AS image
         FROM only wishlists
-        LEFT JOIN products ON products.id = wishlists.product_id
-        LEFT JOIN product_images ON products.id = product_images.product_id
-        AND product_images.id = (
-            SELECT id FROM product_images WHERE product_id = products.id LIMIT 1
-        )
-        LEFT JOIN images ON images.id = product_images.image_id
+        LEFT JOIN product_cards ON product_cards.id = wishlists.product_id
         WHERE user_id = :user_id
         """,
         {"user_id": current_user.id},
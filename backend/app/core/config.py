@@ -3,6 +3,9 @@ from typing import Any, Dict, List, Optional
 
 from pydantic import BaseSettings, HttpUrl, PostgresDsn, validator
 
+# the model files of each are listed in pipeline/main.py RUNTIME_ARTIFACTS
+CLASSIFIER_RUNTIMES = ("eager", "torchscript", "dynamic", "int8")
+
 
 class Settings(BaseSettings):
 
@@ -17,6 +20,83 @@ class Settings(BaseSettings):
 
     BACKEND_CORS_ORIGINS: List[str] = []
 
+    # Cache of public read endpoints
+    CACHE_TTL: int = 60
+    CACHE_MAX_ENTRIES: int = 1024
+    CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    CACHE_BACKEND: str = "memory"
+    CACHE_LOCK_TIMEOUT: int = 10
+    CACHE_INVALIDATION_CHANNEL: str = "cache_invalidation"
+    REDIS_URL: Optional[str] = None
+
+    # Connection pool of each engine, per worker
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # milliseconds, 0 disables the timeout
+    DB_STATEMENT_TIMEOUT: int = 0
+
+    # Image storage: gcs (BUCKET_NAME), local (files under STORAGE_LOCAL_ROOT,
+    # served at /media, set CLOUD_STORAGE to <backend url>/media) or memory
+    # (tests and load runs, with an optional simulated write latency)
+    STORAGE_BACKEND: str = "gcs"
+    STORAGE_LOCAL_ROOT: str = "media"
+    STORAGE_MEMORY_LATENCY_MS: int = 0
+
+    # Multipart image uploads, streamed to storage in chunks of 256 KiB multiples
+    UPLOAD_MAX_IMAGE_BYTES: int = 10 * 1024 * 1024
+    UPLOAD_MAX_FILES: int = 10
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+    # Parallel uploads to the bucket, per worker
+    UPLOAD_CONCURRENCY: int = 8
+
+    # Stored results of POST /order and POST /cart retries, in seconds
+    IDEMPOTENCY_KEY_TTL: int = 60 * 60 * 24
+
+    # Image classifier, loaded at startup and fed in micro-batches
+    CLASSIFIER_PRELOAD: bool = True
+    # eager, torchscript, dynamic or int8, see pipeline/export.py
+    CLASSIFIER_RUNTIME: str = "eager"
+
+    @validator("CLASSIFIER_RUNTIME")
+    def check_classifier_runtime(cls, v: str):
+        """Fails at startup rather than on the first classified image."""
+        if v not in CLASSIFIER_RUNTIMES:
+            raise ValueError(f"must be one of {', '.join(CLASSIFIER_RUNTIMES)}")
+        return v
+
+    CLASSIFIER_WORKERS: int = 1
+    CLASSIFIER_MAX_BATCH_SIZE: int = 8
+    CLASSIFIER_MAX_WAIT_MS: int = 10
+    # queued images per process, more are answered with 503
+    CLASSIFIER_MAX_QUEUE: int = 64
+    # Results by image content, 0 entries disables the cache; uploads whose
+    # dHash differs in at most MAX_DISTANCE of 64 bits share a result
+    CLASSIFIER_CACHE_ENTRIES: int = 4096
+    CLASSIFIER_CACHE_MAX_DISTANCE: int = 3
+
+    # Visual similarity index over the product image embeddings, brute force
+    # below SIMILARITY_PARTITIONS * 40 images or with 0 partitions
+    SIMILARITY_PARTITIONS: int = 0
+    SIMILARITY_PROBES: int = 4
+
+    # GET /shower-thoughts pool, refilled from twitter (or "stub", canned
+    # tweets for tests and offline runs) in the background
+    SHOWER_THOUGHTS_UPSTREAM: str = "twitter"
+    SHOWER_THOUGHTS_REFRESH_SECONDS: int = 300
+    SHOWER_THOUGHTS_POOL_SIZE: int = 200
+    SHOWER_THOUGHTS_TIMEOUT_SECONDS: float = 5.0
+    # Consecutive failures that open the circuit, and how long it stays open
+    SHOWER_THOUGHTS_FAILURE_THRESHOLD: int = 3
+    SHOWER_THOUGHTS_OPEN_SECONDS: int = 60
+
+    # Per-request SQL profiling, opt-in
+    SQL_PROFILING: bool = False
+    SQL_SLOW_REQUEST_MS: int = 500
+    SQL_REPEATED_STATEMENT_THRESHOLD: int = 5
+
     # The following variables need to be defined in environment
 
     TEST_DATABASE_URL: Optional[PostgresDsn]
@@ -0,0 +1,52 @@
+import threading
+from collections import defaultdict
+
+
+class Metrics:
+    """Process-local counters and timings, exported by GET /admin/metrics.
+
+    Every worker keeps its own values, a scraper has to sum them up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.timings = {}
+        self.gauges = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self.timings.setdefault(
+                name, {"count": 0, "total": 0.0, "max": 0.0}
+            )
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+
+    def gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "timings": {
+                    name: {**timing, "avg": timing["total"] / timing["count"]}
+                    for name, timing in self.timings.items()
+                },
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.timings.clear()
+            self.gauges.clear()
+
+
+metrics = Metrics()
@@ -0,0 +1,160 @@
+import json
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import metrics
+
+SLOWEST = 5
+
+literals = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+whitespace = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Statement without its literals, f-string values count as the same shape."""
+    return whitespace.sub(" ", literals.sub("?", statement)).strip()
+
+
+def slowest_shapes(durations: dict) -> list:
+    return sorted(
+        ((duration, shape) for shape, duration in durations.items()), reverse=True
+    )[:SLOWEST]
+
+
+class RequestProfile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+        # longest execution of each shape
+        self.durations = {}
+
+    @property
+    def slowest(self) -> list:
+        return slowest_shapes(self.durations)
+
+    def record(self, statement: str, duration: float) -> None:
+        shape = statement_shape(statement)
+        self.queries += 1
+        self.db_time += duration
+        self.shapes[shape] += 1
+        self.durations[shape] = max(self.durations.get(shape, 0.0), duration)
+
+    def repeated(self) -> dict:
+        # the same shape over and over is usually a query inside a loop (N+1)
+        return {
+            shape: count
+            for shape, count in self.shapes.items()
+            if count >= settings.SQL_REPEATED_STATEMENT_THRESHOLD
+        }
+
+    def server_timing(self, total: float) -> str:
+        return (
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries", '
+            f"app;dur={(total - self.db_time) * 1000:.1f}"
+        )
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar(
+    "current_profile", default=None
+)
+
+
+class RouteProfiles:
+    """Query count, DB time and slowest statements, aggregated per route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes = {}
+
+    def add(self, route: str, profile: RequestProfile) -> None:
+        with self._lock:
+            stats = self.routes.setdefault(
+                route,
+                {"requests": 0, "queries": 0, "db_time": 0.0, "slowest": []},
+            )
+            stats["requests"] += 1
+            stats["queries"] += profile.queries
+            stats["db_time"] += profile.db_time
+            durations = {shape: duration for duration, shape in stats["slowest"]}
+            for duration, shape in profile.slowest:
+                durations[shape] = max(durations.get(shape, 0.0), duration)
+            stats["slowest"] = slowest_shapes(durations)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                route: {
+                    **stats,
+                    "slowest": [
+                        {"duration": duration, "statement": statement}
+                        for duration, statement in stats["slowest"]
+                    ],
+                }
+                for route, stats in self.routes.items()
+            }
+
+
+route_profiles = RouteProfiles()
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is not None and conn.info.get("query_start"):
+        profile.record(statement, time.perf_counter() - conn.info["query_start"].pop())
+
+
+def init_sql_profiling() -> None:
+    # on the Engine class, so the async engine and test engines are included
+    if not event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+
+
+def finish_profile(request, response, profile: RequestProfile) -> None:
+    total = time.perf_counter() - profile.start
+    route = request.scope.get("route")
+    name = f"{request.method} {route.path if route else request.url.path}"
+
+    response.headers["Server-Timing"] = profile.server_timing(total)
+    route_profiles.add(name, profile)
+    metrics.observe(f"route.{name}.db_time", profile.db_time)
+    metrics.increment(f"route.{name}.queries", profile.queries)
+
+    repeated = profile.repeated()
+    if repeated:
+        metrics.increment(f"route.{name}.repeated_statements")
+    slow = total * 1000 >= settings.SQL_SLOW_REQUEST_MS
+    if repeated or slow:
+        logger.warning(
+            json.dumps(
+                {
+                    "event": "slow_request" if slow else "repeated_statements",
+                    "route": name,
+                    "status": response.status_code,
+                    "duration_ms": round(total * 1000, 1),
+                    "db_time_ms": round(profile.db_time * 1000, 1),
+                    "queries": profile.queries,
+                    "repeated": repeated,
+                    "slowest": [
+                        {"duration_ms": round(duration * 1000, 1), "statement": shape}
+                        for duration, shape in profile.slowest
+                    ],
+                }
+            )
+        )
@@ -1,12 +1,68 @@
-import databases
+import time
+
 from sqlalchemy import create_engine
+from sqlalchemy import exc as sa_exc
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
 from sqlalchemy.orm import registry, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
 from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class InstrumentedPoolMixin:
+    """Records checkout wait, overflow connections and checkout timeouts.
+
+    Metrics are named after the `pool_logging_name` of the engine.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa_exc.TimeoutError:
+            metrics.increment(f"db.{self._orig_logging_name}.checkout_timeouts")
+            raise
+        finally:
+            metrics.observe(
+                f"db.{self._orig_logging_name}.checkout_wait",
+                time.perf_counter() - start,
+            )
+
+    def _inc_overflow(self):
+        created = super()._inc_overflow()
+        # _overflow starts at -pool_size, above zero the pool is overflowing
+        if created and self._overflow > 0:
+            metrics.increment(f"db.{self._orig_logging_name}.overflow")
+        return created
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
 
-async_engine = create_async_engine(settings.ASYNC_DATABASE_URL)
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+pool_options = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+)
+
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    poolclass=InstrumentedAsyncQueuePool,
+    pool_logging_name="async",
+    connect_args={
+        "server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT)}
+    },
+    **pool_options,
+)
 async_session_maker = sessionmaker(
     async_engine,
     class_=AsyncSession,
@@ -16,11 +72,33 @@ async_session_maker = sessionmaker(
 )
 
 # We still have a second old style sync SQLAlchemy engine for shell and alembic
-engine = create_engine(settings.DATABASE_URL, future=True)
+engine = create_engine(
+    settings.DATABASE_URL,
+    future=True,
+    poolclass=InstrumentedQueuePool,
+    pool_logging_name="sync",
+    connect_args={"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT}"},
+    **pool_options,
+)
 # cursor =
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 
 mapper_registry = registry()
 Base: DeclarativeMeta = declarative_base()
 
-database = databases.Database(settings.DATABASE_URL)
+
+def pool_status() -> dict:
+    """Current occupancy of both pools, per worker."""
+    return {
+        name: {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+        }
+        for name, pool in (
+            ("sync", engine.pool),
+            ("async", async_engine.sync_engine.pool),
+        )
+    }
@@ -14,7 +14,7 @@ from app.schemas.authentication import TokenData
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_PATH}/sign-in")
 
 
-async def get_current_active_user(
+def get_current_active_user(
     token: str = Depends(oauth2_scheme),
     session: Generator = Depends(get_db),
 ):
@@ -47,13 +47,10 @@ def is_authenticated(token: str):
         token_data = TokenData(email=email)
     except JWTError:
         return None
-    user = (
-        SessionLocal()
-        .execute(
+    with SessionLocal() as session:
+        user = session.execute(
             "SELECT * FROM users WHERE email = :email", {"email": token_data.email}
-        )
-        .fetchone()
-    )
+        ).fetchone()
     if user is None:
         return None
     return user.is_admin
@@ -67,11 +64,11 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
-async def get_current_active_admin(
+def get_current_active_admin(
     session: Generator = Depends(get_db),
     token: str = Depends(oauth2_scheme),
 ):
-    user = await get_current_active_user(token=token, session=session)
+    user = get_current_active_user(token=token, session=session)
     if not user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized"
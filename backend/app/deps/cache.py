@@ -0,0 +1,436 @@
+import json
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Hashable, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.db import engine
+
+MISSING = object()
+
+
+class CacheBackend:
+    """Storage of cache entries, keyed by (namespace, key).
+
+    Values are JSON-able. `acquire`/`release` guard the recomputation of an
+    expired key, backends shared between workers make it a cross-worker lock.
+    `acquire` returns the token the lock is released with, None while
+    another owner holds it.
+    """
+
+    shared = False
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: int) -> None:
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: Hashable = MISSING) -> None:
+        raise NotImplementedError
+
+    def clear(self) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+    def acquire(self, namespace: str, key: Hashable, timeout: int) -> Optional[str]:
+        return "local"
+
+    def release(self, namespace: str, key: Hashable, token: str) -> None:
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """Bounded LRU with per-entry TTL, sized by the JSON length of the values."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.evictions = 0
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                return MISSING
+            expires_at, size, value = entry
+            if expires_at < time.monotonic():
+                self._remove((namespace, key))
+                return MISSING
+            self._entries.move_to_end((namespace, key))
+            return value
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: int) -> None:
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if (namespace, key) in self._entries:
+                self._remove((namespace, key))
+            self._entries[(namespace, key)] = (time.monotonic() + ttl, size, value)
+            self.size += size
+            while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, namespace: str, key: Hashable = MISSING) -> None:
+        with self._lock:
+            for cache_key in list(self._entries):
+                if cache_key[0] == namespace and key in (MISSING, cache_key[1]):
+                    self._remove(cache_key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size": self.size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, cache_key) -> None:
+        _, size, _ = self._entries.pop(cache_key)
+        self.size -= size
+
+
+class RedisBackend(CacheBackend):
+    """Entries shared by all workers in any Redis-protocol server.
+
+    Every namespace keeps the set of its keys so it can be dropped without
+    scanning the keyspace. Eviction is left to the server's maxmemory policy.
+    """
+
+    shared = True
+
+    # deletes the lock only while it still holds the caller's token, it may
+    # have expired and been taken by another worker
+    RELEASE_SCRIPT = """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("del", KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url: str, prefix: str = "cache"):
+        # optional dependency, only needed when CACHE_BACKEND=redis
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        value = self.client.get(self._key(namespace, key))
+        return MISSING if value is None else json.loads(value)
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: int) -> None:
+        pipeline = self.client.pipeline()
+        pipeline.set(self._key(namespace, key), json.dumps(value, default=str), ex=ttl)
+        pipeline.sadd(self._members(namespace), self._key(namespace, key))
+        pipeline.execute()
+
+    def delete(self, namespace: str, key: Hashable = MISSING) -> None:
+        pipeline = self.client.pipeline()
+        if key is MISSING:
+            members = self.client.smembers(self._members(namespace))
+            if members:
+                pipeline.delete(*members)
+            pipeline.delete(self._members(namespace))
+        else:
+            pipeline.delete(self._key(namespace, key))
+            pipeline.srem(self._members(namespace), self._key(namespace, key))
+        pipeline.execute()
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter(match=f"{self.prefix}:*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self) -> dict:
+        return {
+            "entries": self.client.dbsize(),
+            "size": self.client.info("memory").get("used_memory", 0),
+            "max_entries": 0,
+            "max_bytes": self.client.info("memory").get("maxmemory", 0),
+            "evictions": self.client.info("stats").get("evicted_keys", 0),
+        }
+
+    def acquire(self, namespace: str, key: Hashable, timeout: int) -> Optional[str]:
+        token = f"{self.owner}:{uuid.uuid4().hex}"
+        if self.client.set(
+            self._key(namespace, key, "lock"), token, nx=True, ex=timeout
+        ):
+            return token
+        return None
+
+    def release(self, namespace: str, key: Hashable, token: str) -> None:
+        self._release(keys=[self._key(namespace, key, "lock")], args=[token])
+
+    def _key(self, namespace: str, key: Hashable, kind: str = "entry") -> str:
+        return f"{self.prefix}:{kind}:{namespace}:{key}"
+
+    def _members(self, namespace: str) -> str:
+        return f"{self.prefix}:members:{namespace}"
+
+
+class InvalidationBus:
+    """Fans invalidations out to the other workers over Postgres LISTEN/NOTIFY."""
+
+    def __init__(self, channel: str, on_message: Callable[[dict], None]):
+        self.channel = channel
+        self.on_message = on_message
+        self.origin = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        # started per worker, after the fork
+        self.origin = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._listen, name="cache-invalidation", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def publish(self, payload: dict) -> None:
+        payload = json.dumps({**payload, "origin": self.origin})
+        try:
+            with engine.connect() as connection:
+                connection.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {"channel": self.channel, "payload": payload},
+                )
+                connection.commit()
+        except Exception as e:
+            logger.error(f"Cache invalidation publish failed: {e}")
+
+    def connect(self):
+        # a dedicated connection, a pooled one would be held for the life of
+        # the worker and handed back in LISTEN state
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        return engine.dialect.dbapi.connect(*cargs, **cparams)
+
+    def _listen(self) -> None:
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                connection = self.connect()
+                connection.autocommit = True  # LISTEN is immediate
+                connection.cursor().execute(f"LISTEN {self.channel}")
+                logger.info(f"Listening for cache invalidations on {self.channel}")
+                while not self._stopped.is_set():
+                    if select.select([connection], [], [], 1) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        message = json.loads(notify.payload)
+                        if message.get("origin") != self.origin:
+                            self.on_message(message)
+            except Exception as e:
+                logger.error(f"Cache invalidation listener failed: {e}")
+                self._stopped.wait(5)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+class Cache:
+    """Read-through cache of the public read endpoints.
+
+    Concurrent misses of a key are collapsed into a single load (per process
+    by a key lock, across workers by the backend lock). Invalidations are
+    applied locally, broadcast to the other workers and passed on to the
+    subscribers, which keep their own derived state in sync.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: int, lock_timeout: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.bus = InvalidationBus(
+            settings.CACHE_INVALIDATION_CHANNEL, self._on_remote_invalidation
+        )
+        self.subscribers: List[Callable[[str, Hashable], None]] = []
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, namespace: str, key: Hashable = None) -> Any:
+        value = self.backend.get(namespace, key)
+        with self._lock:
+            if value is MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(
+        self, namespace: str, key: Hashable, value: Any, ttl: Optional[int] = None
+    ) -> None:
+        self.backend.set(namespace, key, value, ttl or self.ttl)
+
+    def get_or_set(
+        self,
+        namespace: str,
+        key: Hashable,
+        loader: Callable[[], Any],
+        ttl: Optional[int] = None,
+    ) -> Any:
+        value = self.get(namespace, key)
+        if value is not MISSING:
+            return value
+
+        with self._flight(namespace, key):
+            # filled by the request we were waiting for
+            value = self.backend.get(namespace, key)
+            if value is not MISSING:
+                self.coalesced += 1
+                return value
+            token = self.backend.acquire(namespace, key, self.lock_timeout)
+            if token is None:
+                value = self._wait(namespace, key)
+                if value is not MISSING:
+                    self.coalesced += 1
+                    return value
+                # the lock expired without a result, its owner may be gone
+                token = self.backend.acquire(namespace, key, self.lock_timeout)
+
+            try:
+                generation = self._generations.get(namespace, 0)
+                # exceptions raised by the loader (e.g. 404) are not cached
+                value = jsonable_encoder(loader())
+                # do not store what was loaded before an invalidation
+                if generation == self._generations.get(namespace, 0):
+                    self.set(namespace, key, value, ttl)
+            finally:
+                # loaded without the lock when another worker took it over
+                if token is not None:
+                    self.backend.release(namespace, key, token)
+        return value
+
+    def invalidate(self, *namespaces: str, key: Hashable = MISSING) -> None:
+        self._invalidate(namespaces, key)
+        self.bus.publish(
+            {
+                "namespaces": namespaces,
+                "key": None if key is MISSING else key,
+                "all": key is MISSING,
+            }
+        )
+
+    def subscribe(self, callback: Callable[[str, Hashable], None]) -> None:
+        """Call `callback(namespace, key)` on local and remote invalidations."""
+        self.subscribers.append(callback)
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                **self.backend.stats(),
+                "backend": settings.CACHE_BACKEND,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def start(self) -> None:
+        self.bus.start()
+
+    def stop(self) -> None:
+        self.bus.stop()
+
+    def _invalidate(self, namespaces, key: Hashable, local_only: bool = False):
+        for namespace in namespaces:
+            with self._lock:
+                self._generations[namespace] = self._generations.get(namespace, 0) + 1
+            if not local_only:
+                self.backend.delete(namespace, key)
+            for callback in self.subscribers:
+                try:
+                    callback(namespace, None if key is MISSING else key)
+                except Exception as e:
+                    logger.error(f"Cache subscriber failed: {e}")
+
+    def _on_remote_invalidation(self, message: dict) -> None:
+        key = MISSING if message.get("all") else message.get("key")
+        # a shared backend was already invalidated by the publishing worker
+        self._invalidate(message["namespaces"], key, local_only=self.backend.shared)
+
+    @contextmanager
+    def _flight(self, namespace: str, key: Hashable):
+        with self._lock:
+            flight = self._flights.setdefault((namespace, key), [threading.Lock(), 0])
+            flight[1] += 1
+        try:
+            with flight[0]:
+                yield
+        finally:
+            with self._lock:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights[(namespace, key)]
+
+    def _wait(self, namespace: str, key: Hashable) -> Any:
+        # another worker holds the lock, wait for its result
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = self.backend.get(namespace, key)
+            if value is not MISSING:
+                return value
+        return MISSING
+
+
+def create_backend() -> CacheBackend:
+    if settings.CACHE_BACKEND == "redis":
+        try:
+            backend = RedisBackend(settings.REDIS_URL)
+            logger.info("Redis cache backend initialized")
+            return backend
+        except Exception as e:
+            logger.error(f"Redis cache backend initialization failed: {e}")
+    return MemoryBackend(settings.CACHE_MAX_ENTRIES, settings.CACHE_MAX_BYTES)
+
+
+cache = Cache(
+    create_backend(),
+    ttl=settings.CACHE_TTL,
+    lock_timeout=settings.CACHE_LOCK_TIMEOUT,
+)
+
+
+def get_cache() -> Cache:
+    return cache
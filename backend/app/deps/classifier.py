@@ -0,0 +1,201 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import metrics
+from app.deps.prediction_cache import PredictionCache, dhash
+
+
+class ClassifierService:
+    """Process-wide image classifier with micro-batched inference.
+
+    The model is loaded once, in the inference pool, at startup. Requests
+    are queued; a batch worker collects up to `max_batch_size` of them,
+    waiting at most `max_wait` seconds after the first, and classifies them
+    in one forward pass on a pool thread. At most `max_queue` images wait,
+    more are refused with a 503. Results are cached by image content, a
+    repeated or near-identical upload is answered before decoding.
+    """
+
+    def __init__(
+        self,
+        runtime: str,
+        workers: int,
+        max_batch_size: int,
+        max_wait: float,
+        max_queue: int,
+        cache: Optional[PredictionCache] = None,
+    ):
+        self.runtime = runtime
+        self.cache = cache
+        self.workers = workers
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.classifier = None
+        self.queue: Optional[asyncio.Queue] = None
+        self._batchers: List[asyncio.Task] = []
+        self._start_lock: Optional[asyncio.Lock] = None
+
+    def load(self):
+        # imported here, torch is only needed by the processes that classify
+        from app.image_classification.pipeline.main import ImageClassifier
+
+        return ImageClassifier(runtime=self.runtime)
+
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="classifier"
+        )
+        start = time.perf_counter()
+        try:
+            self.classifier = await loop.run_in_executor(self.executor, self.load)
+        except BaseException:
+            # retried on demand with a new pool
+            self.executor.shutdown(wait=False)
+            self.executor = None
+            raise
+        metrics.observe("classifier.load", time.perf_counter() - start)
+
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self._batchers = [
+            asyncio.create_task(self._batch_worker()) for _ in range(self.workers)
+        ]
+        logger.info(f"Image classifier loaded ({self.runtime} runtime)")
+
+    async def stop(self) -> None:
+        for batcher in self._batchers:
+            batcher.cancel()
+        self._batchers = []
+        if self.queue is not None:
+            while not self.queue.empty():
+                _, future, _ = self.queue.get_nowait()
+                if not future.done():
+                    future.set_result(RuntimeError("Image classifier stopped"))
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    async def ensure_started(self) -> None:
+        if not self._batchers:
+            # startup failed (e.g. model not downloaded yet), retry on demand
+            if self._start_lock is None:
+                self._start_lock = asyncio.Lock()
+            async with self._start_lock:
+                if not self._batchers:
+                    await self.start()
+
+    async def predict(self, image: bytes) -> str:
+        if self.cache is None:
+            return await self._predict(image)
+
+        key = self.cache.key(image)
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+        fingerprint = await run_in_threadpool(dhash, image)
+        result = self.cache.get_similar(fingerprint)
+        if result is None:
+            result = await self._predict(image)
+        self.cache.set(key, fingerprint, result)
+        return result
+
+    async def _predict(self, image: bytes) -> str:
+        await self.ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((image, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            metrics.increment("classifier.rejected")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Image classifier is busy, try again later",
+            )
+        metrics.gauge("classifier.queue_depth", self.queue.qsize())
+        result = await future
+        if isinstance(result, Exception):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(result)
+            )
+        return result
+
+    async def embed(self, images: List[bytes]) -> list:
+        """Embeddings of `images` in one forward pass, exceptions for bad ones."""
+        await self.ensure_started()
+        start = time.perf_counter()
+        embeddings = await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.classifier.embed_batch, images
+        )
+        metrics.observe("classifier.embed", time.perf_counter() - start)
+        return embeddings
+
+    async def _batch_worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                batch.append(await self.queue.get())
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._classify(batch)
+            finally:
+                # cancelled by stop(), the requests of the batch are not left waiting
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_result(RuntimeError("Image classifier stopped"))
+
+    async def _classify(self, batch: list) -> None:
+        metrics.gauge("classifier.queue_depth", self.queue.qsize())
+        metrics.gauge("classifier.batch_size", len(batch))
+        metrics.increment("classifier.batches")
+        metrics.increment("classifier.images", len(batch))
+
+        start = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                self.classifier.predict_batch,
+                [image for image, _, _ in batch],
+            )
+        except Exception as e:
+            logger.error(f"Image classification failed: {e}")
+            results = [e] * len(batch)
+        metrics.observe("classifier.inference", time.perf_counter() - start)
+
+        for (_, future, queued_at), result in zip(batch, results):
+            metrics.observe("classifier.latency", time.perf_counter() - queued_at)
+            if not future.done():
+                future.set_result(result)
+
+
+classifier = ClassifierService(
+    runtime=settings.CLASSIFIER_RUNTIME,
+    workers=settings.CLASSIFIER_WORKERS,
+    max_batch_size=settings.CLASSIFIER_MAX_BATCH_SIZE,
+    max_wait=settings.CLASSIFIER_MAX_WAIT_MS / 1000,
+    max_queue=settings.CLASSIFIER_MAX_QUEUE,
+    cache=PredictionCache(
+        max_entries=settings.CLASSIFIER_CACHE_ENTRIES,
+        max_distance=settings.CLASSIFIER_CACHE_MAX_DISTANCE,
+    )
+    if settings.CLASSIFIER_CACHE_ENTRIES
+    else None,
+)
+
+
+def get_classifier() -> ClassifierService:
+    return classifier
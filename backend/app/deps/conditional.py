@@ -0,0 +1,105 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Generator, Optional, Sequence
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.params import Depends
+from sqlalchemy.exc import DataError
+
+from app.deps.db import get_db
+
+
+class NotModified(HTTPException):
+    """Answered with an empty 304 by the handler registered in the factory."""
+
+    def __init__(self, headers: dict):
+        super().__init__(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+class ConditionalGet:
+    """Validators of a read endpoint, derived from the versions of its rows.
+
+    `versions` selects the `updated_at` of every row the response is built
+    from, path parameters can be used as binds; meant for a few rows found
+    by index. The row count is part of the ETag, so deletes change it as
+    well. Endpoints reading whole tables pass `tables` instead, their write
+    counters in table_versions are read, not the rows. A matching
+    `If-None-Match` (or `If-Modified-Since`) raises NotModified before the
+    endpoint runs.
+    """
+
+    def __init__(self, versions: Optional[str] = None, tables: Sequence[str] = ()):
+        if tables:
+            names = ", ".join(f"'{table}'" for table in tables)
+            self.query = (
+                "SELECT MAX(updated_at), SUM(version) FROM table_versions "
+                f"WHERE table_name IN ({names})"
+            )
+        else:
+            self.query = f"SELECT MAX(updated_at), COUNT(*) FROM ({versions}) versions"
+
+    def __call__(
+        self,
+        request: Request,
+        response: Response,
+        session: Generator = Depends(get_db),
+    ) -> None:
+        try:
+            last_modified, count = session.execute(
+                self.query, dict(request.path_params)
+            ).fetchone()
+        except DataError:
+            # malformed path parameter, left to the endpoint validation
+            session.rollback()
+            return
+
+        params = sorted(request.query_params.multi_items())
+        digest = hashlib.sha1(
+            f"{request.url.path}|{params}|{last_modified}|{count}".encode("utf-8")
+        ).hexdigest()
+        headers = {"ETag": f'W/"{digest}"', "Cache-Control": "no-cache"}
+        if last_modified:
+            last_modified = last_modified.astimezone(timezone.utc).replace(
+                microsecond=0
+            )
+            headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+        if is_not_modified(request, headers["ETag"], last_modified):
+            raise NotModified(headers)
+        response.headers.update(headers)
+
+
+def check_payload_etag(request: Request, response: Response, payload: Any) -> None:
+    """Validators of a response derived from its cached payload.
+
+    For endpoints over tables that are not versioned (orders, written by
+    every checkout), the ETag hashes the body; the cache invalidation
+    following their writes changes it. Raises NotModified on a matching
+    `If-None-Match`.
+    """
+    body = json.dumps(payload, sort_keys=True, default=str)
+    digest = hashlib.sha1(f"{request.url.path}|{body}".encode("utf-8")).hexdigest()
+    headers = {"ETag": f'W/"{digest}"', "Cache-Control": "no-cache"}
+    if is_not_modified(request, headers["ETag"], None):
+        raise NotModified(headers)
+    response.headers.update(headers)
+
+
+def is_not_modified(
+    request: Request, etag: str, last_modified: Optional[datetime]
+) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # weak comparison, gzip does not change the validator
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        return last_modified <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
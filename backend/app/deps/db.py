@@ -1,4 +1,6 @@
-from typing import Generator
+from typing import AsyncGenerator, Generator
+
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db import SessionLocal, async_session_maker
 
@@ -13,7 +15,7 @@ def get_db() -> Generator:
             db.close()
 
 
-# async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-#     async with async_session_maker() as session:
-#         yield session
-#         await session.close()
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    # for `async def` endpoints, queries are awaited instead of blocking the loop
+    async with async_session_maker() as session:
+        yield session
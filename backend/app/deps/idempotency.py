@@ -0,0 +1,112 @@
+import hashlib
+import json
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.core.config import settings
+
+# a key purged as expired between the failed claim and its read is claimed
+# again, a few times at most
+CLAIM_ATTEMPTS = 3
+
+
+def request_fingerprint(route: str, request: BaseModel) -> str:
+    body = request.json(sort_keys=True)
+    return hashlib.sha256(f"{route}|{body}".encode("utf-8")).hexdigest()
+
+
+def claim_idempotency_key(
+    session, user_id, key: Optional[str], fingerprint: str
+) -> Optional[JSONResponse]:
+    """Claims `key` in the current transaction of `session`.
+
+    Returns the stored response when the key was already used, None when the
+    request has to be executed. The claim is only visible once committed, a
+    concurrent retry waits on the unique index until then, and disappears on
+    rollback, so a failed request can be retried with the same key.
+    """
+    if key is None:
+        return None
+    if len(key) > 255:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Idempotency-Key is too long",
+        )
+
+    session.execute(
+        "DELETE FROM idempotency_keys WHERE user_id = :user_id AND expires_at < now()",
+        {"user_id": user_id},
+    )
+    for _ in range(CLAIM_ATTEMPTS):
+        claimed = session.execute(
+            """
+            INSERT INTO idempotency_keys (key, fingerprint, expires_at, user_id)
+            VALUES (:key, :fingerprint, now() + make_interval(secs => :ttl), :user_id)
+            ON CONFLICT (user_id, key) DO NOTHING
+            RETURNING id
+            """,
+            {
+                "key": key,
+                "fingerprint": fingerprint,
+                "ttl": settings.IDEMPOTENCY_KEY_TTL,
+                "user_id": user_id,
+            },
+        ).fetchone()
+        if claimed:
+            return None
+
+        stored = session.execute(
+            """
+            SELECT fingerprint, status_code, response FROM idempotency_keys
+            WHERE user_id = :user_id AND key = :key
+            """,
+            {"user_id": user_id, "key": key},
+        ).fetchone()
+        if stored is not None:
+            break
+    else:
+        session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed",
+        )
+    session.rollback()
+    if stored.fingerprint != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request",
+        )
+    if stored.status_code is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed",
+        )
+    return JSONResponse(
+        status_code=stored.status_code,
+        content=stored.response,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def store_idempotent_response(
+    session, user_id, key: Optional[str], status_code: int, response
+) -> None:
+    """Records the response of a claimed key, in the transaction of the claim."""
+    if key is None:
+        return
+    session.execute(
+        """
+        UPDATE idempotency_keys SET status_code = :status_code, response = :response
+        WHERE user_id = :user_id AND key = :key
+        """,
+        {
+            "status_code": status_code,
+            "response": json.dumps(jsonable_encoder(response)),
+            "user_id": user_id,
+            "key": key,
+        },
+    )
@@ -0,0 +1,114 @@
+import uuid
+from typing import List, Tuple
+from uuid import UUID
+
+from fastapi import HTTPException, status
+
+from app.core.logger import logger
+from app.deps.image_variants import IMAGE_VARIANTS, make_variants, variant_name
+from app.deps.storage import storage, transfer_pool
+
+
+def unique_image_name(parent_folder: str, file_name: str, media_type: str) -> str:
+    # collision free without listing the storage for the last -N suffix
+    return f"{parent_folder}/{file_name}-{uuid.uuid4().hex[:12]}.{media_type}"
+
+
+def _make_variants(file: dict) -> dict:
+    try:
+        return make_variants(file["file"])
+    except Exception as e:
+        # the original is still stored, the queries fall back to it
+        logger.error(f"Image variants of {file['file_name']} failed: {e}")
+        return {}
+
+
+def upload_images(files: List[dict], parent_folder: str, variants=False) -> List[dict]:
+    """Uploads `files` concurrently and returns their storage paths, in order.
+
+    A file is a dict with "file" (bytes or a file object), "media_type",
+    "file_name" and, for file objects, "size". Every result has the
+    "image_url" of the original and, with `variants`, the "<variant>_url" of
+    its WebP derivatives. The derivatives of all files are made first, then
+    everything is stored at once. If one upload fails the others are
+    deleted again and a 500 is raised.
+    """
+    if not files:
+        return []
+    if storage is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Image upload failed, because of cloud storage error",
+        )
+
+    images, uploads = [], []
+    for file in files:
+        name = unique_image_name(parent_folder, file["file_name"], file["media_type"])
+        images.append({"image_url": name})
+        uploads.append(
+            (name, file["file"], f"image/{file['media_type']}", file.get("size"))
+        )
+    if variants:
+        for image, derivatives in zip(images, transfer_pool.map(_make_variants, files)):
+            for variant, data in derivatives.items():
+                name = variant_name(image["image_url"], variant)
+                image[f"{variant}_url"] = name
+                uploads.append((name, data, "image/webp", len(data)))
+
+    try:
+        storage.put_many(uploads)
+    except Exception as e:
+        logger.error(f"Image upload failed: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Image upload failed, because of cloud storage error",
+        )
+
+    logger.info(f"{len(uploads)} images uploaded to {storage.name} storage")
+    return images
+
+
+def insert_product_images(
+    session, product_id: UUID, images: List[dict]
+) -> List[Tuple[UUID, str]]:
+    """Inserts the images and their product_images rows in one statement.
+
+    `images` are results of upload_images, they are positioned after the
+    product's current images in their order. Returns (image id, image url)
+    pairs in the same order; the caller commits.
+    """
+    if not images:
+        return []
+    columns = ["image_url"] + [f"{variant}_url" for variant in IMAGE_VARIANTS]
+    values = ", ".join(
+        f"({i}, :name_{i}, {', '.join(f':{column}_{i}' for column in columns)})"
+        for i in range(len(images))
+    )
+    params = {"product_id": product_id}
+    for i, image in enumerate(images):
+        params[f"name_{i}"] = image["image_url"].split("/")[-1].split(".")[0]
+        for column in columns:
+            params[f"{column}_{i}"] = image.get(column)
+    # the rows of one statement share created_at, the position keeps the order
+    rows = session.execute(
+        f"""
+        WITH uploaded (position, name, {', '.join(columns)}) AS (
+            VALUES {values}
+        ), new_images AS (
+            INSERT INTO images (name, {', '.join(columns)})
+            SELECT name, {', '.join(columns)} FROM uploaded
+            RETURNING id, image_url
+        ), new_product_images AS (
+            INSERT INTO product_images (image_id, product_id, position)
+            SELECT new_images.id, :product_id, uploaded.position + (
+                SELECT COALESCE(MAX(position) + 1, 0)
+                FROM only product_images WHERE product_id = :product_id
+            )
+            FROM new_images JOIN uploaded USING (image_url)
+        )
+        SELECT id, image_url FROM new_images
+        """,
+        params,
+    ).fetchall()
+    ids = {row.image_url: row.id for row in rows}
+    return [(ids[image["image_url"]], image["image_url"]) for image in images]
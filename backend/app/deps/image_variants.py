@@ -0,0 +1,28 @@
+import io
+from typing import Dict
+
+from PIL import Image, ImageOps
+
+# longest side in pixels of every derivative, never upscaled
+IMAGE_VARIANTS = {"thumb": 160, "card": 480, "detail": 1200}
+WEBP_QUALITY = 80
+
+
+def variant_name(image_url: str, variant: str) -> str:
+    # products/bags/tote-1a2b.jpeg -> products/bags/tote-1a2b.card.webp
+    return f"{image_url.rsplit('.', 1)[0]}.{variant}.webp"
+
+
+def make_variants(file) -> Dict[str, bytes]:
+    """WebP derivatives of an image (bytes or a file object) by variant name."""
+    image = Image.open(io.BytesIO(file) if isinstance(file, bytes) else file)
+    image = ImageOps.exif_transpose(image)
+    image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+    variants = {}
+    for variant, size in IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        output = io.BytesIO()
+        resized.save(output, "WEBP", quality=WEBP_QUALITY, method=4)
+        variants[variant] = output.getvalue()
+    return variants
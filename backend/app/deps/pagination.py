@@ -0,0 +1,36 @@
+import base64
+import json
+from typing import Any, Tuple
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(sort_by: str, key: Any, id: Any) -> str:
+    # cursor is opaque for the client, it only has to send it back as is
+    payload = json.dumps({"s": sort_by, "k": key, "i": str(id)}, default=str)
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> Tuple[Any, str]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+        key, id = payload["k"], payload["i"]
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+    # a cursor is only meaningful for the ordering it was created with
+    if payload.get("s") != sort_by:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor does not match sort_by",
+        )
+    return key, id
+
+
+def estimate_count(session, query: str, params: dict) -> int:
+    # planner row estimate, costs no scan of the matching rows
+    plan = session.execute(f"EXPLAIN (FORMAT JSON) {query}", params).fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,121 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image
+
+from app.core.metrics import metrics
+
+HASH_BITS = 64
+
+
+def dhash(byte_image: bytes) -> Optional[int]:
+    """64-bit difference hash, None when the image can not be decoded.
+
+    JPEGs are decoded at a reduced scale (PIL draft mode), a full decode is
+    not needed for a 9 x 8 thumbnail.
+    """
+    try:
+        image = Image.open(io.BytesIO(byte_image))
+        image.draft("L", (64, 64))
+        pixels = np.asarray(
+            image.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16
+        )
+    except Exception:
+        return None
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class PredictionCache:
+    """LRU of classification results by image content.
+
+    An upload is looked up by the sha256 of its bytes first, then by its
+    dHash: a result is reused for any cached image within `max_distance`
+    differing bits (re-encoded or resized screenshots). The hash is split in
+    `max_distance + 1` bands, two hashes that close share at least one band
+    exactly, so only the entries of the same bands are compared.
+    """
+
+    def __init__(self, max_entries: int, max_distance: int):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        self.band_bits = [
+            HASH_BITS // bands + (1 if band < HASH_BITS % bands else 0)
+            for band in range(bands)
+        ]
+        self.entries: "OrderedDict[bytes, Tuple[Optional[int], str]]" = OrderedDict()
+        self.bands: Dict[Tuple[int, int], Set[bytes]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(byte_image: bytes) -> bytes:
+        return hashlib.sha256(byte_image).digest()
+
+    def _band_keys(self, fingerprint: int):
+        shift = 0
+        for band, bits in enumerate(self.band_bits):
+            yield band, (fingerprint >> shift) & ((1 << bits) - 1)
+            shift += bits
+
+    def get(self, key: bytes) -> Optional[str]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        self._record("exact" if entry is not None else None)
+        return entry[1] if entry is not None else None
+
+    def get_similar(self, fingerprint: Optional[int]) -> Optional[str]:
+        result = None
+        if fingerprint is not None:
+            with self._lock:
+                candidates = set()
+                for band_key in self._band_keys(fingerprint):
+                    candidates |= self.bands.get(band_key, set())
+                best = self.max_distance + 1
+                for key in candidates:
+                    distance = bin(self.entries[key][0] ^ fingerprint).count("1")
+                    if distance < best:
+                        best, result = distance, self.entries[key][1]
+                        self.entries.move_to_end(key)
+        self._record("similar" if result is not None else "miss")
+        return result
+
+    def set(self, key: bytes, fingerprint: Optional[int], result: str) -> None:
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return
+            self.entries[key] = (fingerprint, result)
+            if fingerprint is not None:
+                for band_key in self._band_keys(fingerprint):
+                    self.bands.setdefault(band_key, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                evicted, (evicted_fingerprint, _) = self.entries.popitem(last=False)
+                if evicted_fingerprint is not None:
+                    for band_key in self._band_keys(evicted_fingerprint):
+                        members = self.bands[band_key]
+                        members.discard(evicted)
+                        if not members:
+                            del self.bands[band_key]
+            metrics.gauge("classifier.cache.entries", len(self.entries))
+
+    def _record(self, outcome: Optional[str]) -> None:
+        # an exact miss is followed by a perceptual lookup, counted there
+        if outcome is None:
+            return
+        with self._lock:
+            if outcome == "miss":
+                self.misses += 1
+            else:
+                self.hits += 1
+            hit_rate = self.hits / (self.hits + self.misses)
+        metrics.increment(f"classifier.cache.{outcome}")
+        metrics.gauge("classifier.cache.hit_rate", hit_rate)
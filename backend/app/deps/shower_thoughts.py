@@ -0,0 +1,196 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import metrics
+
+TWEETS_URL = "https://api.twitter.com/2/users/854354686194929664/tweets"
+# tweets per upstream request and per response
+PAGE_SIZE = 8
+# longer tweets do not fit the home page card
+MAX_LENGTH = 100
+# refresh interval while the pool is nearly empty
+FILL_SECONDS = 5
+
+STUB_TWEETS = [
+    "Your stomach thinks all potatoes are mashed.",
+    "A lot of people are alive because it is illegal to kill them.",
+    "Pizza is the only thing you order round, get square and eat as triangles.",
+    "Your future self is watching you right now through memories.",
+    "The word swims upside down is still swims.",
+    "Nothing is on fire, fire is on things.",
+    "Mirrors are made of the same sand as the beach.",
+    "Every book you read is just the alphabet rearranged.",
+    "Somewhere there is a photo with you in the background of a stranger.",
+    "The brain named itself.",
+]
+
+
+def stub_transport() -> httpx.MockTransport:
+    """Answers like the twitter timeline endpoint, without the network."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        tweets = random.sample(STUB_TWEETS, PAGE_SIZE)
+        return httpx.Response(200, json={"data": [{"text": t} for t in tweets]})
+
+    return httpx.MockTransport(handler)
+
+
+class CircuitBreaker:
+    """Stops calling a failing upstream for `open_seconds`.
+
+    Opens after `failure_threshold` consecutive failures; once the time is
+    up a single trial call is let through (half open), its success closes
+    the circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.open_seconds:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class ShowerThoughtsFeed:
+    """Pool of shower thought tweets, refilled in the background.
+
+    Requests sample the pool in memory. A refresher task pulls a page of
+    tweets ending at a random date every `refresh_seconds` with an async
+    client and adds them to the pool, keeping the newest `pool_size`.
+    Upstream failures trip the circuit breaker, the pool keeps serving what
+    it has.
+    """
+
+    def __init__(
+        self,
+        refresh_seconds: float,
+        pool_size: int,
+        timeout: float,
+        breaker: CircuitBreaker,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.breaker = breaker
+        self.transport = transport
+        self.pool: List[str] = []
+        self.client: Optional[httpx.AsyncClient] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    async def start(self) -> None:
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            transport=self.transport,
+            headers={"Authorization": f"Bearer {settings.TWITTER_API}"},
+        )
+        self._refresh_lock = asyncio.Lock()
+        self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            self._refresher = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def sample(self, k: int = PAGE_SIZE) -> List[str]:
+        return random.sample(self.pool, min(k, len(self.pool)))
+
+    async def refresh(self, if_empty: bool = False) -> None:
+        """Adds a page of tweets to the pool, `if_empty` only to an empty one."""
+        if self.client is None:
+            return
+        async with self._refresh_lock:
+            # checked after waiting, a half open circuit lets one call through
+            if not self.breaker.allow() or (if_empty and self.pool):
+                return
+            start = time.perf_counter()
+            try:
+                response = await self.client.get(TWEETS_URL, params=self._params())
+                response.raise_for_status()
+                tweets = [
+                    tweet["text"]
+                    for tweet in response.json()["data"]
+                    if len(tweet["text"]) < MAX_LENGTH
+                ]
+            except Exception as e:
+                self.breaker.record_failure()
+                metrics.increment("shower_thoughts.failures")
+                logger.error(
+                    f"Shower thoughts refresh failed ({self.breaker.state}): {e!r}"
+                )
+                return
+            finally:
+                metrics.observe("shower_thoughts.fetch", time.perf_counter() - start)
+            self.breaker.record_success()
+
+            fresh = [tweet for tweet in tweets if tweet not in self.pool]
+            self.pool = (self.pool + fresh)[-self.pool_size :]
+            metrics.gauge("shower_thoughts.pool", len(self.pool))
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await self.refresh()
+            # refill sooner until the pool has a few pages
+            filling = len(self.pool) < PAGE_SIZE * 4 and self.breaker.allow()
+            await asyncio.sleep(
+                min(FILL_SECONDS, self.refresh_seconds)
+                if filling
+                else self.refresh_seconds
+            )
+
+    @staticmethod
+    def _params() -> dict:
+        start = datetime(2022, 1, 1)
+        end = datetime.now() - timedelta(days=7)
+        end_time = start + (end - start) * random.random()
+        return {
+            "max_results": PAGE_SIZE,
+            "end_time": end_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "exclude": "replies,retweets",
+        }
+
+
+shower_thoughts = ShowerThoughtsFeed(
+    refresh_seconds=settings.SHOWER_THOUGHTS_REFRESH_SECONDS,
+    pool_size=settings.SHOWER_THOUGHTS_POOL_SIZE,
+    timeout=settings.SHOWER_THOUGHTS_TIMEOUT_SECONDS,
+    breaker=CircuitBreaker(
+        failure_threshold=settings.SHOWER_THOUGHTS_FAILURE_THRESHOLD,
+        open_seconds=settings.SHOWER_THOUGHTS_OPEN_SECONDS,
+    ),
+    transport=stub_transport() if settings.SHOWER_THOUGHTS_UPSTREAM == "stub" else None,
+)
+
+
+def get_shower_thoughts() -> ShowerThoughtsFeed:
+    return shower_thoughts
@@ -0,0 +1,228 @@
+import threading
+from typing import Hashable, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.core.metrics import metrics
+from app.db import SessionLocal
+from app.deps.cache import cache
+from app.deps.classifier import classifier
+
+DIMENSIONS = 256
+# k-means needs enough images per partition to be worth it
+MIN_IMAGES_PER_PARTITION = 40
+KMEANS_ITERATIONS = 10
+
+
+def encode_embedding(vector: np.ndarray) -> bytes:
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+
+def decode_embedding(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<f4")
+
+
+def kmeans(vectors: np.ndarray, partitions: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means centroids of L2-normalized `vectors`."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), partitions, replace=False)]
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = (vectors @ centroids.T).argmax(axis=1)
+        for partition in range(partitions):
+            members = vectors[assignments == partition]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[partition] = centroid / (np.linalg.norm(centroid) or 1)
+    return centroids
+
+
+class SimilarityIndex:
+    """In-process nearest neighbour index of the product image embeddings.
+
+    Vectors live in one float32 matrix, a query is a matrix-vector product
+    over all of them, or, with `partitions`, over the images of the `probes`
+    k-means partitions closest to the query (IVF). Product image and
+    embedding writes invalidate the "product_images" and "embeddings" cache
+    namespaces, on every worker; the next search then syncs the difference
+    with the database: removed images are dropped and only new vectors are
+    fetched. The new matrix (and centroids) is built aside and swapped in,
+    searches keep using the current one meanwhile.
+    """
+
+    def __init__(self, partitions: int, probes: int):
+        self.partitions = partitions
+        self.probes = probes
+        self.image_ids: List[UUID] = []
+        self.product_ids: List[UUID] = []
+        self.vectors = np.zeros((0, DIMENSIONS), dtype=np.float32)
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.zeros(0, dtype=np.int64)
+        self.trained_size = 0
+        self.loaded = False
+        self.stale = True
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def on_invalidation(self, namespace: str, key: Hashable) -> None:
+        if namespace in ("product_images", "embeddings"):
+            self.stale = True
+
+    def refresh(self) -> None:
+        """Syncs a stale index, a loaded one is not waited for."""
+        if not self.stale:
+            return
+        if not self._sync_lock.acquire(blocking=not self.loaded):
+            return  # another request is syncing, search the current vectors
+        try:
+            if self.stale:
+                with SessionLocal() as session:
+                    self.sync(session)
+        finally:
+            self._sync_lock.release()
+
+    def sync(self, session) -> None:
+        self.stale = False
+        current = session.execute(
+            """
+            SELECT product_images.image_id, product_images.product_id
+            FROM only product_images
+            JOIN only products ON products.id = product_images.product_id
+            JOIN only image_embeddings
+            ON image_embeddings.image_id = product_images.image_id
+            """
+        ).fetchall()
+        wanted = {row.image_id: row.product_id for row in current}
+        indexed = dict(zip(self.image_ids, self.product_ids))
+        keep = [wanted.get(image_id) == indexed[image_id] for image_id in indexed]
+        added = [i for i, product_id in wanted.items() if indexed.get(i) != product_id]
+
+        vectors = []
+        if added:
+            rows = session.execute(
+                """
+                SELECT image_id, embedding FROM only image_embeddings
+                WHERE image_id IN :image_ids
+                """,
+                {"image_ids": tuple(added)},
+            ).fetchall()
+            embeddings = {row.image_id: decode_embedding(row.embedding) for row in rows}
+            added = [image_id for image_id in added if image_id in embeddings]
+            vectors = [embeddings[image_id] for image_id in added]
+        session.rollback()
+
+        # only syncs write the index, built outside the lock of the searches
+        state = self._build(keep, added, [wanted[i] for i in added], vectors)
+        with self._lock:
+            (
+                self.image_ids,
+                self.product_ids,
+                self.vectors,
+                self.centroids,
+                self.assignments,
+                self.trained_size,
+            ) = state
+            self.loaded = True
+        metrics.gauge("similarity.images", len(self.image_ids))
+        logger.info(
+            f"Similarity index synced: {keep.count(False)} removed, "
+            f"{len(added)} added, {len(self.image_ids)} images"
+        )
+
+    def _build(self, keep, image_ids, product_ids, vectors) -> tuple:
+        keep = np.array(keep, dtype=bool)
+        image_ids = [i for i, k in zip(self.image_ids, keep) if k] + image_ids
+        product_ids = [p for p, k in zip(self.product_ids, keep) if k] + product_ids
+        added = np.array(vectors, dtype=np.float32).reshape(-1, DIMENSIONS)
+        matrix = np.concatenate([self.vectors[keep], added])
+
+        size = len(matrix)
+        centroids, assignments = self.centroids, self.assignments
+        trained_size = self.trained_size
+        if not self.partitions or size < self.partitions * MIN_IMAGES_PER_PARTITION:
+            centroids = None
+        elif centroids is None or not (trained_size / 2 <= size <= trained_size * 2):
+            # retrain when the index halved or doubled since the last training
+            centroids = kmeans(matrix, self.partitions)
+            assignments = (matrix @ centroids.T).argmax(axis=1)
+            trained_size = size
+        else:
+            assignments = np.concatenate(
+                [assignments[keep], (added @ centroids.T).argmax(axis=1)]
+            )
+        return image_ids, product_ids, matrix, centroids, assignments, trained_size
+
+    def search(self, vector: np.ndarray, k: int) -> List[Tuple[UUID, float]]:
+        """Top `k` products by the cosine similarity of their closest image."""
+        with self._lock:
+            vectors, product_ids = self.vectors, self.product_ids
+            centroids, assignments = self.centroids, self.assignments
+
+        if centroids is not None:
+            probed = np.argsort(centroids @ vector)[-self.probes :]
+            candidates = np.flatnonzero(np.isin(assignments, probed))
+        else:
+            candidates = np.arange(len(vectors))
+        scores = vectors[candidates] @ vector
+
+        results = {}
+        for position in np.argsort(-scores):
+            product_id = product_ids[candidates[position]]
+            if product_id not in results:
+                results[product_id] = float(scores[position])
+                if len(results) == k:
+                    break
+        return list(results.items())
+
+
+def store_embeddings(session, image_ids: List[UUID], vectors: List[np.ndarray]) -> None:
+    session.execute(
+        """
+        INSERT INTO image_embeddings (image_id, embedding)
+        VALUES (:image_id, :embedding)
+        ON CONFLICT (image_id) DO UPDATE
+        SET embedding = EXCLUDED.embedding, updated_at = now()
+        """,
+        [
+            {"image_id": image_id, "embedding": encode_embedding(vector)}
+            for image_id, vector in zip(image_ids, vectors)
+        ],
+    )
+
+
+async def embed_images(images: List[Tuple[UUID, bytes]]) -> None:
+    """Background task of the product writes: embeds and stores new images."""
+    try:
+        vectors = await classifier.embed([image for _, image in images])
+    except Exception as e:
+        logger.error(f"Embedding of {len(images)} images failed: {e}")
+        return
+    embedded = [
+        (image_id, vector)
+        for (image_id, _), vector in zip(images, vectors)
+        if not isinstance(vector, Exception)
+    ]
+    if not embedded:
+        return
+
+    def store():
+        with SessionLocal() as session:
+            store_embeddings(session, *zip(*embedded))
+            session.commit()
+
+    await run_in_threadpool(store)
+    # the index of every worker picks the new vectors up on its next search
+    cache.invalidate("embeddings")
+
+
+similarity_index = SimilarityIndex(
+    partitions=settings.SIMILARITY_PARTITIONS, probes=settings.SIMILARITY_PROBES
+)
+cache.subscribe(similarity_index.on_invalidation)
+
+
+def get_similarity_index() -> SimilarityIndex:
+    return similarity_index
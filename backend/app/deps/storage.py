@@ -0,0 +1,268 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.core.logger import logger
+
+Data = Union[bytes, BinaryIO]
+
+# shared by all requests, bounds the concurrent transfers to the storage
+transfer_pool = ThreadPoolExecutor(
+    max_workers=settings.UPLOAD_CONCURRENCY, thread_name_prefix="storage"
+)
+
+
+class StoredObject(NamedTuple):
+    path: str
+    size: int
+
+
+class StorageBackend:
+    """Object storage of the uploaded images, paths are relative to
+    CLOUD_STORAGE, the public base url the queries prefix them with."""
+
+    name = "base"
+
+    def put(
+        self, path: str, data: Data, content_type: str, size: Optional[int] = None
+    ) -> str:
+        raise NotImplementedError
+
+    def delete(self, path: str) -> None:
+        raise NotImplementedError
+
+    def exists(self, path: str) -> bool:
+        raise NotImplementedError
+
+    def list(self, prefix: str = "") -> List[StoredObject]:
+        raise NotImplementedError
+
+    def url(self, path: str) -> str:
+        return f"{settings.CLOUD_STORAGE}/{path}"
+
+    def signed_url(self, path: str, expires: timedelta) -> str:
+        # public backends, the object is readable by anyone with the url
+        return self.url(path)
+
+    def put_many(self, items: List[Tuple[str, Data, str, Optional[int]]]) -> List[str]:
+        """Stores (path, data, content type, size) items concurrently.
+
+        All or nothing: if one fails the stored ones are deleted again and
+        the first error is raised.
+        """
+        futures = [transfer_pool.submit(self.put, *item) for item in items]
+        stored, error = [], None
+        for future in futures:
+            try:
+                stored.append(future.result())
+            except Exception as e:
+                error = error or e
+        if error is not None:
+            for path in stored:
+                transfer_pool.submit(self.delete, path)
+            raise error
+        return stored
+
+
+class GCSBackend(StorageBackend):
+    name = "gcs"
+
+    def __init__(self, bucket_name: str):
+        # imported here, the other backends run without the google libraries
+        from google.cloud import storage
+
+        client = storage.Client.from_service_account_info(
+            {
+                "type": settings.GCP_TYPE,
+                "project_id": settings.GCP_PROJECT_ID,
+                "private_key_id": settings.GCP_PRIVATE_KEY_ID,
+                "private_key": settings.GCP_PRIVATE_KEY,
+                "client_email": settings.GCP_CLIENT_EMAIL,
+                "client_id": settings.GCP_CLIENT_ID,
+                "auth_uri": settings.GCP_AUTH_URI,
+                "token_uri": settings.GCP_TOKEN_URI,
+                "auth_provider_x509_cert_url": settings.GCP_AUTH_PROVIDER_X509_CERT_URL,
+                "client_x509_cert_url": settings.GCP_CLIENT_X509_CERT_URL,
+            }
+        )
+        self.bucket_name = bucket_name
+        self.bucket = client.bucket(bucket_name)
+
+    def put(self, path, data, content_type, size=None):
+        if isinstance(data, bytes):
+            self.bucket.blob(path).upload_from_string(data, content_type=content_type)
+        else:
+            # resumable upload, read from the file in UPLOAD_CHUNK_BYTES pieces
+            blob = self.bucket.blob(path, chunk_size=settings.UPLOAD_CHUNK_BYTES)
+            blob.upload_from_file(
+                data, size=size, content_type=content_type, rewind=True
+            )
+        return path
+
+    def delete(self, path):
+        self.bucket.blob(path).delete()
+
+    def exists(self, path):
+        return self.bucket.blob(path).exists()
+
+    def list(self, prefix=""):
+        return [
+            StoredObject(blob.name, blob.size)
+            for blob in self.bucket.list_blobs(prefix=prefix)
+        ]
+
+    def signed_url(self, path, expires):
+        return self.bucket.blob(path).generate_signed_url(
+            expiration=expires, version="v4"
+        )
+
+
+class LocalBackend(StorageBackend):
+    """Files under `root`, served by the app at /media (see factory)."""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, path: str) -> str:
+        full = os.path.abspath(os.path.join(self.root, path))
+        if not full.startswith(self.root + os.sep):
+            raise ValueError(f"Path {path} is outside of the storage root")
+        return full
+
+    def put(self, path, data, content_type, size=None):
+        full = self._path(path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        # written aside and renamed, a reader never sees a partial file
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(full), delete=False) as f:
+            if isinstance(data, bytes):
+                f.write(data)
+            else:
+                data.seek(0)
+                shutil.copyfileobj(data, f, settings.UPLOAD_CHUNK_BYTES)
+        os.replace(f.name, full)
+        return path
+
+    def delete(self, path):
+        os.remove(self._path(path))
+
+    def exists(self, path):
+        return os.path.isfile(self._path(path))
+
+    def list(self, prefix=""):
+        objects = []
+        for directory, _, files in os.walk(self.root):
+            for file in files:
+                full = os.path.join(directory, file)
+                path = os.path.relpath(full, self.root).replace(os.sep, "/")
+                if path.startswith(prefix):
+                    objects.append(StoredObject(path, os.path.getsize(full)))
+        return sorted(objects)
+
+
+class MemoryBackend(StorageBackend):
+    """Process-local dict, for tests and load runs without a network.
+
+    `latency` seconds are slept on every write to mimic a remote store.
+    """
+
+    name = "memory"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.objects: Dict[str, Tuple[bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, path, data, content_type, size=None):
+        if not isinstance(data, bytes):
+            data.seek(0)
+            data = data.read()
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.objects[path] = (data, content_type)
+        return path
+
+    def delete(self, path):
+        with self._lock:
+            if self.objects.pop(path, None) is None:
+                raise FileNotFoundError(path)
+
+    def exists(self, path):
+        return path in self.objects
+
+    def list(self, prefix=""):
+        with self._lock:
+            return sorted(
+                StoredObject(path, len(data))
+                for path, (data, _) in self.objects.items()
+                if path.startswith(prefix)
+            )
+
+
+def create_storage() -> Optional[StorageBackend]:
+    try:
+        if settings.STORAGE_BACKEND == "local":
+            backend = LocalBackend(settings.STORAGE_LOCAL_ROOT)
+        elif settings.STORAGE_BACKEND == "memory":
+            backend = MemoryBackend(settings.STORAGE_MEMORY_LATENCY_MS / 1000)
+        else:
+            backend = GCSBackend(settings.BUCKET_NAME)
+        logger.info(f"Storage initialized ({backend.name})")
+        return backend
+    except Exception as e:
+        logger.error(f"Storage initialization failed: {e}")
+        return None
+
+
+storage = create_storage()
+
+
+def get_storage() -> Optional[StorageBackend]:
+    return storage
+
+
+def next_image_name(parent_folder, file_name, media_type):
+    prefix = f"{parent_folder}/{file_name}"
+    last_index = 0
+    for image in storage.list(prefix):
+        # only <prefix>-<n>.<suffix>, not the names of longer titles
+        suffix = image.path[len(prefix) :].split(".")[0]
+        if suffix[:1] == "-" and suffix[1:].isdigit():
+            last_index = max(last_index, int(suffix[1:]))
+    return f"{prefix}-{last_index + 1}.{media_type}"
+
+
+def upload_image(file, parent_folder):
+    if storage:
+        file["file_name"] = next_image_name(
+            parent_folder, file["file_name"], file["media_type"]
+        )
+        storage.put(file["file_name"], file["file"], f"image/{file['media_type']}")
+
+        logger.info(f"Image {file['file_name']} uploaded to {storage.name} storage")
+        return file["file_name"]
+
+
+def upload_image_file(file_obj, size, media_type, file_name, parent_folder):
+    """Streams a file object to the storage."""
+    if storage:
+        name = next_image_name(parent_folder, file_name, media_type)
+        storage.put(name, file_obj, f"image/{media_type}", size)
+
+        logger.info(f"Image {name} uploaded to {storage.name} storage")
+        return name
+
+
+def delete_image(file_name):
+    if storage:
+        storage.delete(file_name)
+        logger.info(f"Image {file_name} deleted from {storage.name} storage")
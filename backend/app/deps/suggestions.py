@@ -0,0 +1,190 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from app.core.logger import logger
+from app.core.metrics import metrics
+from app.db import SessionLocal
+from app.deps.cache import cache
+
+# suggestion types, in the order they are ranked
+CATEGORY, BRAND, PRODUCT = "category", "brand", "product"
+RANK = {CATEGORY: 0, BRAND: 1, PRODUCT: 2}
+# entries looked at per type and query, a one letter prefix matches most
+# product titles
+MAX_SCANNED = 200
+# product_cards.updated_at is the start of the writing transaction, rows
+# committed after a sync can be older than the newest one it read
+SYNC_OVERLAP = timedelta(minutes=1)
+
+WORD_SEPARATOR = re.compile(r"[\s\-]+")
+
+# (key, text, id, word position)
+Entry = Tuple[str, str, Optional[str], int]
+
+
+def normalize(text: str) -> str:
+    return " ".join(WORD_SEPARATOR.split(text.casefold())).strip()
+
+
+def entries(text: str, ref: Optional[str]) -> List[Entry]:
+    """One entry per word start, "air" completes "Nuke Air Max" too."""
+    words = normalize(text).split(" ")
+    return [(" ".join(words[i:]), text, ref, i) for i in range(len(words)) if words[i]]
+
+
+class SuggestionIndex:
+    """Typeahead of product titles, brands and category names.
+
+    A sorted array per type of the normalized word-start suffixes of every
+    name, a prefix is completed by a binary search and a scan of the
+    following entries. Product and category writes invalidate the "products" and
+    "categories" cache namespaces, on every worker; the next query then
+    reads the product cards updated since the last sync (and their ids when
+    the count shows removals), diffs the names and only inserts and removes the changed
+    entries. Invalidations of a single product are stock changes, its names
+    are left as they are.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, List[Entry]] = {kind: [] for kind in RANK}
+        self.products: Dict[str, Tuple[str, str]] = {}
+        self.categories: Dict[str, str] = {}
+        self.brands: Counter = Counter()
+        self.synced_at = None
+        self.loaded = False
+        self.stale = True
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+
+    def on_invalidation(self, namespace: str, key: Hashable) -> None:
+        # e.g. the stock of each product bought by a checkout
+        if namespace in ("products", "categories") and key is None:
+            self.stale = True
+
+    def refresh(self) -> None:
+        """Syncs a stale index, a loaded one is not waited for."""
+        if not self.stale:
+            return
+        if not self._sync_lock.acquire(blocking=not self.loaded):
+            return  # another request is syncing, complete from the current names
+        try:
+            if self.stale:
+                with SessionLocal() as session:
+                    self.sync(session)
+        except Exception:
+            self.stale = True  # retried by the next query
+            raise
+        finally:
+            self._sync_lock.release()
+
+    def sync(self, session) -> None:
+        self.stale = False
+        query = "SELECT id, title, brand, updated_at FROM product_cards"
+        if self.synced_at is None:
+            changed = session.execute(query).fetchall()
+            products = {}
+        else:
+            changed = session.execute(
+                f"{query} WHERE updated_at > :since",
+                {"since": self.synced_at - SYNC_OVERLAP},
+            ).fetchall()
+            products = dict(self.products)
+            count = session.execute("SELECT COUNT(*) FROM product_cards").scalar()
+            if count != len(products.keys() | {str(row.id) for row in changed}):
+                # fewer cards than names, some products were removed
+                ids = {
+                    str(row.id)
+                    for row in session.execute("SELECT id FROM product_cards")
+                }
+                products = {ref: names for ref, names in products.items() if ref in ids}
+        products.update({str(row.id): (row.title, row.brand) for row in changed})
+        synced_at = max((row.updated_at for row in changed), default=self.synced_at)
+        # a few rows, read whole
+        categories = {
+            str(row.id): row.title
+            for row in session.execute("SELECT id, title FROM only categories")
+        }
+        session.rollback()
+
+        added = {kind: [] for kind in RANK}
+        removed = {kind: [] for kind in RANK}
+        brands = Counter(self.brands)
+        for ref, (title, brand) in self.products.items():
+            if products.get(ref) != (title, brand):
+                removed[PRODUCT] += entries(title, ref)
+                brands[brand] -= 1
+                if not brands[brand]:
+                    del brands[brand]
+                    removed[BRAND] += entries(brand, None)
+        for ref, (title, brand) in products.items():
+            if self.products.get(ref) != (title, brand):
+                added[PRODUCT] += entries(title, ref)
+                if not brands[brand]:
+                    added[BRAND] += entries(brand, None)
+                brands[brand] += 1
+        for ref, title in self.categories.items():
+            if categories.get(ref) != title:
+                removed[CATEGORY] += entries(title, ref)
+        for ref, title in categories.items():
+            if self.categories.get(ref) != title:
+                added[CATEGORY] += entries(title, ref)
+
+        with self._lock:
+            for kind, array in self.entries.items():
+                if len(added[kind]) + len(removed[kind]) > len(array) // 4:
+                    # cheaper to sort everything again than to shift the array
+                    current = set(array).difference(removed[kind])
+                    self.entries[kind] = sorted(current.union(added[kind]))
+                else:
+                    for entry in removed[kind]:
+                        del array[bisect_left(array, entry)]
+                    for entry in added[kind]:
+                        insort(array, entry)
+            self.products, self.categories = products, categories
+            self.brands = brands
+            self.synced_at = synced_at
+            self.loaded = True
+        size = sum(len(array) for array in self.entries.values())
+        metrics.gauge("search.suggest.entries", size)
+        logger.info(
+            f"Suggestion index synced: {sum(map(len, removed.values()))} removed, "
+            f"{sum(map(len, added.values()))} added, {size} entries"
+        )
+
+    def suggest(self, text: str, limit: int) -> List[dict]:
+        prefix = normalize(text)
+        if not prefix:
+            return []
+        matches = []
+        with self._lock:
+            for kind, array in self.entries.items():
+                start = bisect_left(array, (prefix,))
+                for key, name, ref, position in array[start : start + MAX_SCANNED]:
+                    if not key.startswith(prefix):
+                        break
+                    popularity = self.brands[name] if kind == BRAND else 0
+                    matches.append((position, kind, popularity, name, ref))
+
+        # names starting with the prefix first, then by type, popular brands
+        # and short names first
+        matches.sort(key=lambda m: (m[0] > 0, RANK[m[1]], -m[2], len(m[3])))
+        suggestions, seen = [], set()
+        for _, kind, _, name, ref in matches:
+            if (kind, name, ref) not in seen:
+                seen.add((kind, name, ref))
+                suggestions.append({"text": name, "type": kind, "id": ref})
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+
+suggestion_index = SuggestionIndex()
+cache.subscribe(suggestion_index.on_invalidation)
+
+
+def get_suggestion_index() -> SuggestionIndex:
+    return suggestion_index
@@ -0,0 +1,51 @@
+from typing import Tuple
+
+from fastapi import HTTPException, UploadFile, status
+
+from app.core.config import settings
+
+# content types accepted by the multipart endpoints, with their file suffix
+IMAGE_TYPES = {
+    "image/jpeg": "jpeg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+
+
+def max_request_bytes() -> int:
+    # every file at its limit, plus room for the form fields and boundaries
+    return settings.UPLOAD_MAX_IMAGE_BYTES * settings.UPLOAD_MAX_FILES + 64 * 1024
+
+
+def check_image_upload(upload: UploadFile) -> Tuple[int, str]:
+    """Size and file suffix of an uploaded image, 400/413 if it is not valid.
+
+    The multipart parser has already spooled the file (to disk above 1 MB),
+    so the size is known without reading it.
+    """
+    media_type = IMAGE_TYPES.get(upload.content_type)
+    if media_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid image format. Please use one of {', '.join(IMAGE_TYPES)}",
+        )
+    upload.file.seek(0, 2)
+    size = upload.file.tell()
+    upload.file.seek(0)
+    if size == 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Image is empty"
+        )
+    if size > settings.UPLOAD_MAX_IMAGE_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image is larger than {settings.UPLOAD_MAX_IMAGE_BYTES} bytes",
+        )
+    return size, media_type
+
+
+async def read_image_upload(upload: UploadFile) -> bytes:
+    """Contents of an uploaded image, for the classifier that needs them whole."""
+    check_image_upload(upload)
+    return await upload.read()
@@ -1,7 +1,7 @@
 from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 from fastapi.routing import APIRoute
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
@@ -24,7 +24,8 @@ from app.api import (
 )
 from app.core.config import settings
 from app.core.logger import logger
-from app.db import SessionLocal, async_session_maker
+from app.db import SessionLocal, async_engine, async_session_maker, engine
+from app.deps.conditional import NotModified
 
 
 def create_app():
@@ -46,6 +47,10 @@ def create_app():
             content={"message": exc.detail},
         )
 
+    @app.exception_handler(NotModified)
+    async def not_modified_handler(request, exc):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=exc.headers)
+
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request, exc):
         if hasattr(exc, "detail"):
@@ -61,8 +66,14 @@ def create_app():
 
     setup_routers(app)
     init_db_hooks(app)
+    init_cache_hooks(app)
+    init_classifier_hooks(app)
+    init_suggestion_hooks(app)
+    init_shower_thoughts_hooks(app)
     setup_cors_middleware(app)
     setup_gzip_middleware(app)
+    setup_profiling_middleware(app)
+    setup_upload_limit_middleware(app)
     serve_static_app(app)
 
     return app
@@ -130,6 +141,13 @@ def setup_routers(app: FastAPI) -> None:
 
 
 def serve_static_app(app):
+    if settings.STORAGE_BACKEND == "local":
+        # the images of the local storage backend, mounted before the catch-all
+        app.mount(
+            "/media",
+            StaticFiles(directory=settings.STORAGE_LOCAL_ROOT, check_dir=False),
+            name="media",
+        )
     app.mount("/", StaticFiles(directory="static"), name="static")
     templates = Jinja2Templates(directory="static")
 
@@ -165,6 +183,52 @@ def setup_gzip_middleware(app):
     app.add_middleware(GZipMiddleware, minimum_size=500)
 
 
+def setup_profiling_middleware(app):
+    if not settings.SQL_PROFILING:
+        return
+
+    from app.core.profiling import (
+        RequestProfile,
+        current_profile,
+        finish_profile,
+        init_sql_profiling,
+    )
+
+    init_sql_profiling()
+
+    @app.middleware("http")
+    async def _profile_sql(request: Request, call_next):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = await call_next(request)
+        finally:
+            current_profile.reset(token)
+        finish_profile(request, response, profile)
+        return response
+
+
+def setup_upload_limit_middleware(app):
+    from app.deps.upload import max_request_bytes
+
+    @app.middleware("http")
+    async def _limit_upload_size(request: Request, call_next):
+        # the form is parsed before any dependency runs, refuse an oversized
+        # body before it is spooled; single files are checked by the endpoints
+        length = request.headers.get("content-length")
+        if (
+            request.headers.get("content-type", "").startswith("multipart/form-data")
+            and length
+            and length.isdigit()
+            and int(length) > max_request_bytes()
+        ):
+            return JSONResponse(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                content={"message": "Request body is too large"},
+            )
+        return await call_next(request)
+
+
 def use_route_names_as_operation_ids(app: FastAPI) -> None:
     """
     Simplify operation IDs so that generated API clients have simpler function
@@ -185,8 +249,6 @@ def init_db_hooks(app: FastAPI) -> None:
     from sqlalchemy import event
     from sqlalchemy.orm.query import Query
 
-    from app.db import database
-
     @event.listens_for(
         Query, "before_compile", retval=True, bake_ok=True, propagate=True
     )
@@ -198,10 +260,62 @@ def init_db_hooks(app: FastAPI) -> None:
                 query = query.filter(entity.deleted_at.is_(None))
         return query
 
+    @app.on_event("shutdown")
+    async def shutdown():
+        engine.dispose()
+        await async_engine.dispose()
+
+
+def init_classifier_hooks(app: FastAPI) -> None:
+    from app.deps.classifier import classifier
+
     @app.on_event("startup")
-    async def startup():
-        await database.connect()
+    async def start_classifier():
+        if not settings.CLASSIFIER_PRELOAD:
+            return
+        try:
+            await classifier.start()
+        except Exception as e:
+            logger.error(f"Image classifier loading failed: {e}")
 
     @app.on_event("shutdown")
-    async def shutdown():
-        await database.disconnect()
+    async def stop_classifier():
+        await classifier.stop()
+
+
+def init_cache_hooks(app: FastAPI) -> None:
+    from app.deps.cache import cache
+
+    @app.on_event("startup")
+    def start_cache():
+        cache.start()
+
+    @app.on_event("shutdown")
+    def stop_cache():
+        cache.stop()
+
+
+def init_suggestion_hooks(app: FastAPI) -> None:
+    from fastapi.concurrency import run_in_threadpool
+
+    from app.deps.suggestions import suggestion_index
+
+    @app.on_event("startup")
+    async def load_suggestions():
+        # built before the first keystroke, later writes sync it incrementally
+        try:
+            await run_in_threadpool(suggestion_index.refresh)
+        except Exception as e:
+            logger.error(f"Suggestion index loading failed: {e}")
+
+
+def init_shower_thoughts_hooks(app: FastAPI) -> None:
+    from app.deps.shower_thoughts import shower_thoughts
+
+    @app.on_event("startup")
+    async def start_shower_thoughts():
+        await shower_thoughts.start()
+
+    @app.on_event("shutdown")
+    async def stop_shower_thoughts():
+        await shower_thoughts.stop()
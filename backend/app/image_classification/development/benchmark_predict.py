@@ -0,0 +1,87 @@
+"""Compare ImageClassifier.predict with the former per-view implementation.
+
+    python -m app.image_classification.development.benchmark_predict \
+        --image tests/fixtures/test_image.jpeg --runs 50
+
+Without a downloaded model.pth, pass --random-weights to time the network
+with untrained weights.
+"""
+import argparse
+import time
+from collections import Counter
+
+import torch
+import torchvision.transforms as transforms
+from PIL import Image
+
+from app.image_classification.pipeline.main import PRODUCT_CATEGORY, ImageClassifier
+
+
+def legacy_predict(classifier, byte_image):
+    # per view forward passes, as predict() did before batching
+    count_final = 2
+    image = classifier.read_byte_image(byte_image)
+    list_image = classifier.augmentation(image)
+    list_image.append(image)
+    while count_final > 1:
+        lists = []
+        for view in list_image:
+            transform = transforms.Compose(
+                [
+                    transforms.Resize((128, 128)),
+                    transforms.RandomHorizontalFlip(p=0.8),
+                    transforms.ToTensor(),
+                    transforms.Normalize([0.5], [0.5]),
+                    transforms.Grayscale(1),
+                ]
+            )
+            image_tensor = transform(Image.fromarray(view)).float().unsqueeze_(0)
+            output = classifier.classifiers(image_tensor)
+            lists.append(PRODUCT_CATEGORY[output.data.numpy().argmax()])
+        c = Counter(lists)
+        highest_freq = max(c.values())
+        mod = [n for n, freq in sorted(c.items()) if freq == highest_freq]
+        count_final = len(mod)
+    return mod[0]
+
+
+def timed(function, runs):
+    function()  # warm up
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = function()
+    return (time.perf_counter() - start) / runs * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--image", default="tests/fixtures/test_image.jpeg")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--random-weights", action="store_true")
+    args = parser.parse_args()
+
+    if args.random_weights:
+        classifier = ImageClassifier(model_path=None)
+    else:
+        classifier = ImageClassifier()
+    with open(args.image, "rb") as f:
+        byte_image = f.read()
+
+    legacy_ms, legacy = timed(lambda: legacy_predict(classifier, byte_image), args.runs)
+    single_ms, single = timed(lambda: classifier.predict(byte_image), args.runs)
+    batch_ms, _ = timed(
+        lambda: classifier.predict_batch([byte_image] * args.batch), args.runs
+    )
+
+    print(f"torch threads: {torch.get_num_threads()}")
+    print(f"legacy predict:   {legacy_ms:8.2f} ms/image  -> {legacy}")
+    print(f"batched predict:  {single_ms:8.2f} ms/image  -> {single}")
+    print(
+        f"predict_batch({args.batch}): {batch_ms / args.batch:8.2f} ms/image "
+        f"({batch_ms:.2f} ms/batch)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Accuracy and latency of every exported classifier runtime.
+
+    python -m app.image_classification.development.compare_runtimes <dir>
+
+<dir> is a held-out set with one sub directory per category, named as in
+PRODUCT_CATEGORY (e.g. <dir>/bags/1.jpg). Every runtime is measured in a
+fresh process, so cold start and peak memory are its own.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+from pathlib import Path
+
+from app.image_classification.pipeline.main import (
+    CURRENT_PATH,
+    PRODUCT_CATEGORY,
+    RUNTIME_ARTIFACTS,
+)
+
+
+def held_out_set(directory):
+    samples = []
+    for category in PRODUCT_CATEGORY.values():
+        for path in sorted(Path(directory, category).glob("*")):
+            samples.append((path.read_bytes(), category))
+    return samples
+
+
+def measure(runtime, directory, threads):
+    import torch
+
+    from app.image_classification.pipeline.main import ImageClassifier
+
+    torch.set_num_threads(threads)
+    start = time.perf_counter()
+    classifier = ImageClassifier(runtime=runtime)
+    load = time.perf_counter() - start
+
+    samples = held_out_set(directory)
+    correct = 0
+    latencies = []
+    for byte_image, category in samples:
+        start = time.perf_counter()
+        correct += classifier.predict(byte_image) == category
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    return {
+        "runtime": runtime,
+        "size": os.path.getsize(f"{CURRENT_PATH}/{RUNTIME_ARTIFACTS[runtime]}"),
+        "load": load,
+        "accuracy": correct / len(samples) if samples else 0.0,
+        "p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+        # kilobytes on linux
+        "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "samples": len(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory")
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    runtimes = [
+        runtime
+        for runtime, artifact in RUNTIME_ARTIFACTS.items()
+        if os.path.exists(f"{CURRENT_PATH}/{artifact}")
+    ]
+    if not runtimes:
+        raise SystemExit(
+            f"No model in {CURRENT_PATH}, run make download_model and export_model"
+        )
+    context = multiprocessing.get_context("spawn")
+    print(
+        f"{'runtime':<12}{'size KiB':>10}{'load ms':>10}{'accuracy':>10}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'RSS MiB':>10}"
+    )
+    for runtime in runtimes:
+        with context.Pool(1) as pool:
+            result = pool.apply(measure, (runtime, args.directory, args.threads))
+        print(
+            f"{runtime:<12}{result['size'] / 1024:>10.0f}"
+            f"{result['load'] * 1000:>10.1f}{result['accuracy']:>10.3f}"
+            f"{result['p50'] * 1000:>10.1f}{result['p95'] * 1000:>10.1f}"
+            f"{result['max_rss'] / 1024:>10.0f}"
+        )
+    print(f"{result['samples']} held-out images, {args.threads} torch thread(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Export model.pth to the runtimes ImageClassifier can load.
+
+    python -m app.image_classification.pipeline.export --calibration <dir>
+
+Writes next to model.pth:
+    model.torchscript.pt  traced and frozen fp32 graph
+    model.dynamic.pt      int8 weights for the linear layers, dynamic activations
+    model.int8.pt         int8 convolutions and linear layers (static), the
+                          activation ranges are calibrated on the images of
+                          <dir> (any layout, searched recursively); it has no
+                          embed(), ImageClassifier embeds with model.pth then
+"""
+import argparse
+import copy
+import os
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+from PIL import Image
+
+from app.image_classification.pipeline.main import (
+    CURRENT_PATH,
+    RUNTIME_ARTIFACTS,
+    ImageClassifier,
+)
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def calibration_batches(classifier, directory, batch_size=32):
+    views = []
+    for path in sorted(Path(directory).rglob("*")):
+        if path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        image = classifier.read_byte_image(path.read_bytes())
+        if image is None:
+            continue
+        for view in classifier.augmentation(image) + [image]:
+            views.append(classifier.preprocessing(Image.fromarray(view)))
+        if len(views) >= batch_size:
+            yield torch.stack(views)
+            views = []
+    if views:
+        yield torch.stack(views)
+
+
+def trace(model, example):
+    # embed() is kept next to forward() for the similarity search, a FX
+    # quantized graph only has forward()
+    methods = ["forward", "embed"] if hasattr(model, "embed") else ["forward"]
+    with torch.inference_mode():
+        traced = torch.jit.trace_module(model, {m: example for m in methods})
+        return torch.jit.freeze(traced, preserved_attrs=methods[1:])
+
+
+def export_dynamic(model, example):
+    quantized = torch.ao.quantization.quantize_dynamic(
+        copy.deepcopy(model), {nn.Linear}, dtype=torch.qint8
+    )
+    return trace(quantized, example)
+
+
+def explicit_padding(model):
+    # quantized convolutions do not take padding="same", for odd kernels it is
+    # the same as a symmetric padding of kernel_size // 2
+    for module in model.modules():
+        if isinstance(module, nn.Conv2d) and module.padding == "same":
+            module.padding = tuple(size // 2 for size in module.kernel_size)
+    return model
+
+
+def export_static(model, example, batches):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    # fbgemm on x86 servers, qnnpack on arm
+    engines = torch.backends.quantized.supported_engines
+    backend = "fbgemm" if "fbgemm" in engines else "qnnpack"
+    torch.backends.quantized.engine = backend
+    prepared = prepare_fx(
+        explicit_padding(copy.deepcopy(model)),
+        get_default_qconfig_mapping(backend),
+        (example,),
+    )
+    calibrated = 0
+    with torch.inference_mode():
+        for batch in batches:
+            prepared(batch)
+            calibrated += len(batch)
+    if not calibrated:
+        raise SystemExit("No calibration images found")
+    print(f"Calibrated on {calibrated} views")
+    return trace(convert_fx(prepared), example)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calibration", help="directory of calibration images")
+    parser.add_argument("--output", default=CURRENT_PATH)
+    args = parser.parse_args()
+
+    classifier = ImageClassifier()
+    model = classifier.classifiers
+    example = torch.zeros(1, 1, 128, 128)
+
+    artifacts = {
+        "torchscript": trace(model, example),
+        "dynamic": export_dynamic(model, example),
+    }
+    if args.calibration:
+        artifacts["int8"] = export_static(
+            model, example, calibration_batches(classifier, args.calibration)
+        )
+    else:
+        print("No --calibration directory, skipping the static int8 export")
+
+    for runtime, artifact in artifacts.items():
+        path = os.path.join(args.output, RUNTIME_ARTIFACTS[runtime])
+        torch.jit.save(artifact, path)
+        print(f"{runtime}: {path} ({os.path.getsize(path) / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
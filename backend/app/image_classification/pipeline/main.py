@@ -1,5 +1,4 @@
 import os
-from collections import Counter
 
 import cv2
 import numpy as np
@@ -7,7 +6,6 @@ import torch
 import torchvision.transforms as transforms
 from fastapi import HTTPException
 from PIL import Image
-from torch.autograd import Variable
 
 from app.image_classification.pipeline.model import Net
 
@@ -25,24 +23,53 @@ PRODUCT_CATEGORY = {
     9: "bags",
     10: "ankle-boots",
 }
+# model files per runtime, the non eager ones are made by pipeline/export.py
+RUNTIME_ARTIFACTS = {
+    "eager": "model.pth",
+    "torchscript": "model.torchscript.pt",
+    "dynamic": "model.dynamic.pt",
+    "int8": "model.int8.pt",
+}
 
 
-class ImageClassifier:
-    def __init__(self):
-        # Class module from AI team
-        self.classifiers = Net(num_classes=11)
-        self.classifiers.eval()
-        # Model path with pth file
-        model_path = f"{CURRENT_PATH}/model.pth"
-        self.classifiers.load_state_dict(
-            torch.load(model_path, map_location=torch.device("cpu"))
-        )
+def load_net(model_path):
+    # Class module from AI team
+    net = Net(num_classes=11)
+    net.eval()
+    # Model path with pth file, None keeps untrained weights (benchmarks)
+    if model_path is not None:
+        net.load_state_dict(torch.load(model_path, map_location=torch.device("cpu")))
+    return net
 
-    def preprocessing(self, image):
-        transform = transforms.Compose(
+
+class ImageClassifier:
+    def __init__(
+        self,
+        model_path=f"{CURRENT_PATH}/model.pth",
+        runtime="eager",
+        model_dir=CURRENT_PATH,
+    ):
+        if runtime not in RUNTIME_ARTIFACTS:
+            raise ValueError(f"Unknown classifier runtime {runtime}")
+        if runtime == "eager":
+            self.classifiers = load_net(model_path)
+        else:
+            # exported graphs carry their weights, no Net to rebuild
+            self.classifiers = torch.jit.load(
+                os.path.join(model_dir, RUNTIME_ARTIFACTS[runtime]),
+                map_location=torch.device("cpu"),
+            )
+        # the static int8 graph has no embed(), the similarity search uses
+        # the fp32 weights of model.pth then, as the eager runtime does
+        if hasattr(self.classifiers, "embed"):
+            self.embedder = self.classifiers
+        else:
+            self.embedder = load_net(model_path)
+        # built once, without random flips the prediction is deterministic,
+        # the flipped views come from augmentation()
+        self.transform = transforms.Compose(
             [
                 transforms.Resize((128, 128)),
-                transforms.RandomHorizontalFlip(p=0.8),
                 transforms.ToTensor(),
                 transforms.Normalize(
                     [
@@ -55,7 +82,9 @@ class ImageClassifier:
                 transforms.Grayscale(1),
             ]
         )
-        image = transform(image).float()
+
+    def preprocessing(self, image):
+        image = self.transform(image).float()
         return image
 
     def threshold(self, image):
@@ -89,30 +118,75 @@ class ImageClassifier:
         return image
 
     def predict(self, byte_image):
-        count_final = 2
-        try:
-            image = self.read_byte_image(byte_image)
-            list_image = self.augmentation(image)
-            list_image.append(image)
-            while count_final > 1:
-                lists = []
-                for i in range(len(list_image)):
-                    img = Image.fromarray(list_image[i])
-                    image_tensor = self.preprocessing(img)
-                    image_tensor = image_tensor.unsqueeze_(0)
-                    img = Variable(image_tensor)
-                    # Predict image from classifier
-                    output = self.classifiers(img)
-                    index = output.data.numpy().argmax()
-
-                    # Get result final and return it
-                    result_final = PRODUCT_CATEGORY[index]
-                    lists.append(result_final)
-                c = Counter(lists)
-                highest_freq = max(c.values())
-                mod = [n for n, freq in sorted(c.items()) if freq == highest_freq]
-                count_final = len(mod)
-            result_final = mod[0]
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=str(e))
-        return result_final
+        result = self.predict_batch([byte_image])[0]
+        if isinstance(result, Exception):
+            raise HTTPException(status_code=500, detail=str(result))
+        return result
+
+    def predict_batch(self, byte_images):
+        """Classify several images with a single forward pass.
+
+        All augmented views of all images go through the network as one
+        N x 1 x 128 x 128 tensor. Every image is voted on by its views, a tie
+        goes to the tied category with the highest mean probability.
+        Undecodable images get their exception back.
+        """
+        results = [None] * len(byte_images)
+        views = {}
+        for i, byte_image in enumerate(byte_images):
+            try:
+                image = self.read_byte_image(byte_image)
+                list_image = self.augmentation(image)
+                list_image.append(image)
+                views[i] = list_image
+            except Exception as e:
+                results[i] = e
+        if not views:
+            return results
+
+        image_tensor = torch.stack(
+            [
+                self.preprocessing(Image.fromarray(view))
+                for list_image in views.values()
+                for view in list_image
+            ]
+        )
+        # Predict all images from classifier at once
+        with torch.inference_mode():
+            probabilities = torch.softmax(self.classifiers(image_tensor), dim=1)
+
+        offset = 0
+        for i, list_image in views.items():
+            image_probabilities = probabilities[offset : offset + len(list_image)]
+            offset += len(list_image)
+            votes = torch.bincount(
+                image_probabilities.argmax(dim=1), minlength=len(PRODUCT_CATEGORY)
+            )
+            mean_probabilities = image_probabilities.mean(dim=0)
+            index = mean_probabilities.masked_fill(votes < votes.max(), -1).argmax()
+            results[i] = PRODUCT_CATEGORY[index.item()]
+        return results
+
+    def embed_batch(self, byte_images):
+        """L2-normalized 256-d embeddings of several images, as float32 arrays.
+
+        Only the original view is embedded, so an image always maps to the
+        same vector. Undecodable images get their exception back.
+        """
+        results = [None] * len(byte_images)
+        tensors = {}
+        for i, byte_image in enumerate(byte_images):
+            try:
+                image = self.read_byte_image(byte_image)
+                tensors[i] = self.preprocessing(Image.fromarray(image))
+            except Exception as e:
+                results[i] = e
+        if not tensors:
+            return results
+
+        with torch.inference_mode():
+            embeddings = self.embedder.embed(torch.stack(list(tensors.values())))
+            embeddings = torch.nn.functional.normalize(embeddings, dim=1)
+        for i, embedding in zip(tensors, embeddings.numpy()):
+            results[i] = embedding.astype(np.float32)
+        return results
@@ -35,6 +35,14 @@ class Net(nn.Module):
     def forward(self, x):
         x = self.features(x)
         x = self.avgpool(x)
-        x = x.view(-1, 128 * 8 * 8)
+        x = x.reshape(-1, 128 * 8 * 8)
         x = self.classifier(x)
         return x
+
+    def embed(self, x):
+        # 256-d output of the penultimate layer, before dropout and the logits
+        x = self.features(x)
+        x = self.avgpool(x)
+        x = x.reshape(-1, 128 * 8 * 8)
+        x = self.classifier[:4](x)
+        return x
@@ -6,13 +6,17 @@ from app.models import (
     cart,
     category,
     forgot_password,
+    idempotency_key,
     image,
+    image_embedding,
     order,
     order_item,
     product,
+    product_card,
     product_image,
     product_size_quantity,
     size,
+    table_version,
     user,
     wishlist,
 )
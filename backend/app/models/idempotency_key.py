@@ -0,0 +1,32 @@
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from app.db import Base
+from app.models.default import DefaultModel
+
+
+class IdempotencyKey(DefaultModel, Base):
+    """Stored result of a POST sent with an `Idempotency-Key` header."""
+
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(length=255), nullable=False)
+    # sha256 of the method, path and body the key was first used with
+    fingerprint = Column(String(length=64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response = Column(JSONB, nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    user_id = Column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_id_key"),
+        Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
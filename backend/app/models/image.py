@@ -9,6 +9,10 @@ class Image(DefaultModel, Base):
 
     name = Column(String(length=128), nullable=False, unique=True)
     image_url = Column(String(length=128), nullable=False, unique=True)
+    # WebP derivatives made at upload time, see deps/image_variants.py
+    thumb_url = Column(String(length=160), nullable=True)
+    card_url = Column(String(length=160), nullable=True)
+    detail_url = Column(String(length=160), nullable=True)
 
     __table_args__ = (Index("image_url", image_url), {"extend_existing": True})
 
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, ForeignKey, LargeBinary
+
+from app.db import Base
+from app.models.default import DefaultModel
+
+
+class ImageEmbedding(DefaultModel, Base):
+    """Classifier embedding of an image, for the visual similarity search."""
+
+    __tablename__ = "image_embeddings"
+
+    image_id = Column(
+        ForeignKey("images.id", ondelete="CASCADE"), nullable=False, unique=True
+    )
+    # L2-normalized float32 vector of Net.embed, 256 * 4 bytes
+    embedding = Column(LargeBinary, nullable=False)
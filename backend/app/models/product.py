@@ -1,4 +1,5 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 from app.db import Base
 from app.models.default import DefaultModel
@@ -27,6 +28,21 @@ class Product(DefaultModel, Base):
     category_id = Column(
         ForeignKey("categories.id", ondelete="CASCADE"), nullable=False
     )
+    # title, brand and category words, kept by the sql/search_document.sql
+    # triggers for the trigram index of search_products()
+    search_document = Column(Text, nullable=False, server_default="")
+    # the same words weighted for ts_rank, for GET /search/products
+    search_vector = Column(TSVECTOR, nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_products_search_document",
+            "search_document",
+            postgresql_using="gist",
+            postgresql_ops={"search_document": "gist_trgm_ops(siglen=256)"},
+        ),
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     @classmethod
     def seed(cls, fake, item_name, item_price, category_id):
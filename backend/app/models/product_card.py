@@ -0,0 +1,38 @@
+from fastapi_users_db_sqlalchemy import GUID
+from sqlalchemy import Column, Index, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from app.db import Base
+from app.models.default import DefaultModel
+
+
+class ProductCard(DefaultModel, Base):
+    """Denormalized listing row per product, maintained by sql/product_card.sql."""
+
+    __tablename__ = "product_cards"
+
+    title = Column(String(length=128), nullable=False)
+    brand = Column(String(length=128), nullable=False)
+    product_detail = Column(String(length=256), nullable=False)
+    price = Column(Integer, nullable=False)
+    condition = Column(String(length=32), nullable=False)
+    category_id = Column(GUID, nullable=False)
+    # image paths relative to CLOUD_STORAGE, in upload order, card sized
+    images = Column(ARRAY(String(length=160)), nullable=False)
+    # the same images thumbnail sized, for cart and wishlist rows
+    thumbnails = Column(ARRAY(String(length=160)), nullable=False)
+
+    # keyset pagination seeks on (sort key, id)
+    __table_args__ = (
+        Index("ix_product_cards_title_id", "title", "id"),
+        Index("ix_product_cards_price_id", "price", "id"),
+        Index("ix_product_cards_created_at_id", "created_at", "id"),
+        Index("ix_product_cards_category_id", "category_id"),
+        # ILIKE '%term%' of the product_name filter
+        Index(
+            "ix_product_cards_title_trgm",
+            "title",
+            postgresql_using="gin",
+            postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+    )
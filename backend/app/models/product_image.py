@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Integer
 
 from app.db import Base
 from app.models.default import DefaultModel
@@ -9,6 +9,8 @@ class ProductImage(DefaultModel, Base):
 
     image_id = Column(ForeignKey("images.id", ondelete="CASCADE"), nullable=False)
     product_id = Column(ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    # upload order of the product's images, the first one is the cover
+    position = Column(Integer, nullable=False, server_default="0")
 
     @classmethod
     def seed(cls, fake, product_id, image_id):
@@ -0,0 +1,18 @@
+from sqlalchemy import BigInteger, Column, DateTime, String
+from sqlalchemy.sql.functions import func
+
+from app.db import Base
+
+
+class TableVersion(Base):
+    """Write counter of a table, bumped by the triggers of sql/table_version.sql.
+
+    The validators of the read endpoints are taken from it, a primary key
+    lookup instead of a scan of the tables they read.
+    """
+
+    __tablename__ = "table_versions"
+
+    table_name = Column(String(length=64), primary_key=True)
+    version = Column(BigInteger, nullable=False, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
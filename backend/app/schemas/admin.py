@@ -1,5 +1,5 @@
 import datetime
-from typing import List
+from typing import Dict, List
 from uuid import UUID
 
 from fastapi import Query
@@ -75,3 +75,59 @@ class CategoryOrder(BaseModel):
 class GetDashboard(BaseModel):
     income_per_month: List[IncomeMonth]
     total_order_per_category: List[CategoryOrder]
+
+
+class CacheStats(BaseModel):
+    backend: str
+    entries: int
+    size: int
+    max_entries: int
+    max_bytes: int
+    hits: int
+    misses: int
+    coalesced: int
+    evictions: int
+    hit_rate: float
+
+
+class GetCacheStats(BaseModel):
+    data: CacheStats
+
+
+class PoolStatus(BaseModel):
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    max_overflow: int
+
+
+class Timing(BaseModel):
+    count: int
+    total: float
+    max: float
+    avg: float
+
+
+class SlowStatement(BaseModel):
+    duration: float
+    statement: str
+
+
+class RouteProfile(BaseModel):
+    requests: int
+    queries: int
+    db_time: float
+    slowest: List[SlowStatement]
+
+
+class Metrics(BaseModel):
+    pools: Dict[str, PoolStatus]
+    counters: Dict[str, int]
+    gauges: Dict[str, float]
+    timings: Dict[str, Timing]
+    routes: Dict[str, RouteProfile]
+
+
+class GetMetrics(BaseModel):
+    data: Metrics
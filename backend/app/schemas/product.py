@@ -88,6 +88,7 @@ class GetProducts(BaseModel):
     data: List[Product]
     total_rows: int
     pagination: Pagination
+    next_cursor: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -1,8 +1,10 @@
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
 from pydantic import BaseModel
 
+from app.schemas.default_model import Pagination
+
 
 class GetImage(BaseModel):
     name: str
@@ -27,6 +29,19 @@ class SearchImageResponse(BaseModel):
         orm_mode = True
 
 
+class SimilarProduct(BaseModel):
+    id: UUID
+    title: str
+    brand: str
+    price: int
+    image: Optional[str]
+    # cosine similarity of the closest product image, 1 is identical
+    score: float
+
+    class Config:
+        orm_mode = True
+
+
 class SearchText(BaseModel):
     id: UUID
     title: str
@@ -35,6 +50,66 @@ class SearchText(BaseModel):
         orm_mode = True
 
 
+class SearchProduct(BaseModel):
+    id: UUID
+    title: str
+    brand: str
+    price: int
+    condition: str
+    category_id: UUID
+    image: Optional[str]
+    # ts_rank of the weighted words plus the trigram word similarity
+    rank: float
+
+    class Config:
+        orm_mode = True
+
+
+class CategoryFacet(BaseModel):
+    id: UUID
+    title: str
+    count: int
+
+
+class ValueFacet(BaseModel):
+    value: str
+    count: int
+
+
+class PriceFacet(BaseModel):
+    min_price: int
+    # None for the last, open ended, bucket
+    max_price: Optional[int]
+    count: int
+
+
+class SearchFacets(BaseModel):
+    categories: List[CategoryFacet]
+    conditions: List[ValueFacet]
+    brands: List[ValueFacet]
+    prices: List[PriceFacet]
+
+
+class SearchProducts(BaseModel):
+    data: List[SearchProduct]
+    facets: SearchFacets
+    pagination: Pagination
+
+    class Config:
+        orm_mode = True
+
+
+class Suggestion(BaseModel):
+    text: str
+    # "category", "brand" or "product"
+    type: str
+    # category or product id, brands have none
+    id: Optional[UUID]
+
+    class Config:
+        orm_mode = True
+
+
 class ShowerThoughts(BaseModel):
     data: List[str]
 
@@ -0,0 +1,54 @@
+import requests
+
+from app import db
+from app.core.config import settings
+from app.core.logger import logger
+from app.deps.cache import cache
+from app.deps.similarity import store_embeddings
+from app.image_classification.pipeline.main import ImageClassifier
+
+BATCH_SIZE = 32
+
+
+def embed_missing_images():
+    # backfill for images uploaded before the similarity search, new product
+    # images are embedded by create_product and update_product
+
+    classifier = ImageClassifier(runtime=settings.CLASSIFIER_RUNTIME)
+    embedded = 0
+    with db.SessionLocal() as session:
+        images = session.execute(
+            """
+            SELECT DISTINCT images.id, images.image_url FROM only images
+            JOIN only product_images ON product_images.image_id = images.id
+            LEFT JOIN image_embeddings ON image_embeddings.image_id = images.id
+            WHERE image_embeddings.id IS NULL
+            """
+        ).fetchall()
+        for start in range(0, len(images), BATCH_SIZE):
+            batch = []
+            for image in images[start : start + BATCH_SIZE]:
+                response = requests.get(f"{settings.CLOUD_STORAGE}/{image.image_url}")
+                if response.ok:
+                    batch.append((image.id, response.content))
+                else:
+                    logger.error(
+                        f"Image {image.image_url}: HTTP {response.status_code}"
+                    )
+            vectors = classifier.embed_batch([content for _, content in batch])
+            done = [
+                (image_id, vector)
+                for (image_id, _), vector in zip(batch, vectors)
+                if not isinstance(vector, Exception)
+            ]
+            if done:
+                store_embeddings(session, *zip(*done))
+                session.commit()
+            embedded += len(done)
+            logger.info(f"Embedded {embedded} of {len(images)} images")
+
+    cache.invalidate("embeddings")
+
+
+if __name__ == "__main__":
+    embed_missing_images()
@@ -0,0 +1,17 @@
+from app import db
+from app.core.logger import logger
+
+
+def delete_expired_idempotency_keys():
+    # keys are also pruned per user on every claim, this catches inactive users
+
+    with db.SessionLocal() as session:
+        deleted = session.execute(
+            "DELETE FROM idempotency_keys WHERE expires_at < now()"
+        ).rowcount
+        session.commit()
+        logger.info(f"Deleted {deleted} expired idempotency keys")
+
+
+if __name__ == "__main__":
+    delete_expired_idempotency_keys()
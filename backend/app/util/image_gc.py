@@ -0,0 +1,118 @@
+"""Deletes the blobs and rows of images nothing refers to anymore.
+
+    python -m app.util.image_gc [--dry-run] [--batch-size N] [--rate N]
+
+update_product drops the product_images rows of removed images, and
+banner updates replace their image, but the images rows and their blobs
+(the original and its WebP variants) stay. An image is kept while a
+banner (archived or not) or a live product_images row points at it, or an
+archived product_images row of an archived product, that product can
+still be restored. Images younger than --min-age are
+skipped, their product or banner may not be committed yet.
+
+Blobs are deleted first, in batches, at most --rate per second; the rows
+of images whose blobs are gone are then deleted (archived by the soft
+delete rule), failed ones are retried on the next run. Run it
+periodically, e.g. from cron.
+"""
+import argparse
+import time
+
+from app import db
+from app.core.logger import logger
+from app.deps.image_variants import IMAGE_VARIANTS
+from app.deps.storage import storage, transfer_pool
+
+COLUMNS = ["image_url"] + [f"{variant}_url" for variant in IMAGE_VARIANTS]
+
+ORPHANED_IMAGES = f"""
+SELECT images.id, {', '.join(f'images.{column}' for column in COLUMNS)}
+FROM only images
+WHERE images.created_at < now() - make_interval(hours => :min_age)
+AND NOT EXISTS (SELECT 1 FROM banners WHERE banners.image_id = images.id)
+AND NOT EXISTS (
+    SELECT 1 FROM only product_images WHERE product_images.image_id = images.id
+)
+AND NOT EXISTS (
+    SELECT 1 FROM z_archive_product_images
+    JOIN z_archive_products ON z_archive_products.id = z_archive_product_images.product_id
+    WHERE z_archive_product_images.image_id = images.id
+)
+ORDER BY images.created_at
+"""
+
+
+def delete_blob(path):
+    try:
+        storage.delete(path)
+        return True
+    except Exception as e:
+        # already gone, e.g. deleted by an interrupted run
+        if not storage.exists(path):
+            return True
+        logger.error(f"Image {path}: {e}")
+        return False
+
+
+def collect_garbage(dry_run=False, batch_size=100, rate=50.0, min_age=24):
+    if storage is None:
+        logger.error("Storage is not configured")
+        return
+    with db.SessionLocal() as session:
+        images = session.execute(ORPHANED_IMAGES, {"min_age": min_age}).fetchall()
+        session.rollback()
+    # one listing for the sizes instead of a request per blob
+    sizes = {blob.path: blob.size for blob in storage.list()}
+
+    deleted, failed, reclaimed = 0, 0, 0
+    for start in range(0, len(images), batch_size):
+        batch = images[start : start + batch_size]
+        paths = {
+            image.id: [getattr(image, c) for c in COLUMNS if getattr(image, c)]
+            for image in batch
+        }
+        blobs = [path for image_paths in paths.values() for path in image_paths]
+        if dry_run:
+            deleted += len(batch)
+            reclaimed += sum(sizes.get(path, 0) for path in blobs)
+            continue
+
+        started = time.monotonic()
+        results = dict(zip(blobs, transfer_pool.map(delete_blob, blobs)))
+        done = [
+            i for i, image_paths in paths.items() if all(map(results.get, image_paths))
+        ]
+        if done:
+            with db.SessionLocal() as session:
+                session.execute(
+                    "DELETE FROM image_embeddings WHERE image_id IN :ids",
+                    {"ids": tuple(done)},
+                )
+                session.execute(
+                    "DELETE FROM images WHERE id IN :ids", {"ids": tuple(done)}
+                )
+                session.commit()
+        deleted += len(done)
+        failed += len(batch) - len(done)
+        reclaimed += sum(sizes.get(path, 0) for path in blobs if results[path])
+
+        # rate limit, a batch of deletes takes at least len(blobs) / rate
+        time.sleep(max(0.0, len(blobs) / rate - (time.monotonic() - started)))
+
+    logger.info(
+        f"{'Would delete' if dry_run else 'Deleted'} {deleted} of {len(images)} "
+        f"orphaned images, {reclaimed / 2**20:.1f} MiB "
+        f"{'reclaimable' if dry_run else 'reclaimed'}"
+        + (f", {failed} failed" if failed else "")
+    )
+    return deleted, reclaimed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=50.0, help="blob deletes/s")
+    parser.add_argument("--min-age", type=int, default=24, help="hours")
+    args = parser.parse_args()
+    collect_garbage(args.dry_run, args.batch_size, args.rate, args.min_age)
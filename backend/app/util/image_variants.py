@@ -0,0 +1,66 @@
+import requests
+
+from app import db
+from app.core.config import settings
+from app.core.logger import logger
+from app.deps.cache import cache
+from app.deps.image_variants import IMAGE_VARIANTS, make_variants, variant_name
+from app.deps.storage import storage, transfer_pool
+
+
+def upload_variants(image):
+    response = requests.get(f"{settings.CLOUD_STORAGE}/{image.image_url}")
+    if not response.ok:
+        logger.error(f"Image {image.image_url}: HTTP {response.status_code}")
+        return None
+    try:
+        derivatives = make_variants(response.content)
+    except Exception as e:
+        logger.error(f"Image {image.image_url}: {e}")
+        return None
+    urls = {}
+    for variant, data in derivatives.items():
+        name = variant_name(image.image_url, variant)
+        storage.put(name, data, "image/webp")
+        urls[f"{variant}_url"] = name
+    return urls
+
+
+def make_missing_variants():
+    # backfill for product images uploaded before the derivatives, new ones
+    # get theirs in create_product and update_product
+
+    if storage is None:
+        logger.error("Storage is not configured")
+        return
+    with db.SessionLocal() as session:
+        images = session.execute(
+            """
+            SELECT DISTINCT images.id, images.image_url FROM only images
+            JOIN only product_images ON product_images.image_id = images.id
+            WHERE images.thumb_url IS NULL
+            """
+        ).fetchall()
+        done = 0
+        for image, urls in zip(images, transfer_pool.map(upload_variants, images)):
+            if urls is None:
+                continue
+            # the images trigger refreshes the product cards
+            session.execute(
+                f"""
+                UPDATE images SET {', '.join(f'{c} = :{c}' for c in urls)}
+                WHERE id = :id
+                """,
+                {**urls, "id": image.id},
+            )
+            session.commit()
+            done += 1
+        logger.info(
+            f"Made {', '.join(IMAGE_VARIANTS)} variants of {done} of {len(images)} images"
+        )
+
+    cache.invalidate("products", "home")
+
+
+if __name__ == "__main__":
+    make_missing_variants()
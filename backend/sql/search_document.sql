@@ -0,0 +1,64 @@
+-- products.search_document is what search_products() matches, a plain column
+-- so that the ix_products_search_document trigram GiST index serves <% and <<->.
+-- products.search_vector has the same words weighted (title A, brand B,
+-- category C) for the ranked search, GIN indexed.
+CREATE OR REPLACE FUNCTION product_search_document(title TEXT, brand TEXT, category_title TEXT)
+RETURNS TEXT AS $$
+    SELECT title || ' ' || brand || ' ' || SPLIT_PART(category_title, '-', 1) || ' ' || SPLIT_PART(category_title, '-', 2);
+$$ LANGUAGE SQL IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION product_search_vector(title TEXT, brand TEXT, category_title TEXT)
+RETURNS TSVECTOR AS $$
+    SELECT setweight(to_tsvector('simple', title), 'A') ||
+    setweight(to_tsvector('simple', brand), 'B') ||
+    setweight(to_tsvector('simple', REPLACE(COALESCE(category_title, ''), '-', ' ')), 'C');
+$$ LANGUAGE SQL IMMUTABLE;
+
+-- WHEN PRODUCT INSERTED OR ITS TITLE, BRAND OR CATEGORY CHANGED
+CREATE OR REPLACE FUNCTION search_document_products()
+RETURNS TRIGGER AS $$
+DECLARE
+    category_title TEXT := (SELECT title FROM categories WHERE id = NEW.category_id);
+BEGIN
+    NEW.search_document := product_search_document(NEW.title, NEW.brand, category_title);
+    NEW.search_vector := product_search_vector(NEW.title, NEW.brand, category_title);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_search_document ON products;
+CREATE TRIGGER trigger_search_document
+BEFORE INSERT OR UPDATE OF title, brand, category_id ON products
+FOR EACH ROW EXECUTE PROCEDURE search_document_products();
+
+-- WHEN CATEGORY RENAMED
+CREATE OR REPLACE FUNCTION search_document_categories()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE only products SET
+        search_document = product_search_document(title, brand, NEW.title),
+        search_vector = product_search_vector(title, brand, NEW.title)
+    WHERE category_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_search_document ON categories;
+CREATE TRIGGER trigger_search_document
+AFTER UPDATE OF title ON categories
+FOR EACH ROW WHEN (OLD.title IS DISTINCT FROM NEW.title)
+EXECUTE PROCEDURE search_document_categories();
+
+CREATE OR REPLACE FUNCTION search_products(term TEXT)
+returns table(
+  id UUID,
+  title TEXT
+)
+as
+$$
+
+SELECT p.id, p.title
+FROM only products p
+WHERE term <% p.search_document
+ORDER BY term <<-> p.search_document LIMIT 10;
+$$ language SQL;
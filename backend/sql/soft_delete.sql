@@ -76,57 +76,4 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
--- Implement Full Text Search Function
--- ALTER TABLE products
--- ADD search tsvector
--- GENERATED ALWAYS AS (
---   setweight(to_tsvector('simple',title), 'A')  || ' ' ||
---   setweight(to_tsvector('english',brand), 'B') :: tsvector
-
--- ) stored;
-
-
--- CREATE index idx_search ON products USING GIN(search);
-
--- CREATE OR REPLACE FUNCTION search_questions(term TEXT)
--- returns table(
---   id UUID,
---   title TEXT,
---   rank REAL
--- )
--- as
--- $$
-
--- SELECT id, title,
---   ts_rank(search, websearch_to_tsquery('english',term)) +
---   ts_rank(search, websearch_to_tsquery('simple',term)) as rank
--- FROM products
--- WHERE search @@ websearch_to_tsquery('english',term)
--- OR search @@ websearch_to_tsquery('simple',term)
--- ORDER BY rank DESC;
-
--- $$ language SQL;
-
---  ALTER TABLE products
---  ADD search TEXT
---  GENERATED ALWAYS AS (
-
---  ) stored;
-
--- CREATE INDEX products_searchable_text_trgm_gist_idx on PRODUCTS
---   USING GIST((title || ' ' || brand)  gist_trgm_ops(siglen=256));
-
-CREATE OR REPLACE FUNCTION search_products(term TEXT)
-returns table(
-  id UUID,
-  title TEXT
-)
-as
-$$
-
-SELECT p.id, p.title
-FROM products p
-JOIN categories c ON p.category_id = c.id
-WHERE term <% (p.title || ' ' || p.brand || ' ' || SPLIT_PART(c.title, '-', 1) || ' ' || SPLIT_PART(c.title, '-', 2))
-ORDER BY term <<-> (p.title || ' ' || p.brand || ' ' || SPLIT_PART(c.title, '-', 1) || ' ' || SPLIT_PART(c.title, '-', 2)) LIMIT 10;
-$$ language SQL;
+-- search_products() is defined in search_document.sql, over an indexed column
@@ -0,0 +1,30 @@
+-- table_versions counts the write statements of the tables the conditional
+-- GETs of the read endpoints depend on (app/deps/conditional.py). The row
+-- is updated in the writing transaction, readers see the new version with
+-- the committed data. The row stays locked until the commit, so tables
+-- written by concurrent checkouts (orders) are not counted.
+CREATE OR REPLACE FUNCTION bump_table_version()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO table_versions (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, clock_timestamp())
+    ON CONFLICT (table_name) DO UPDATE SET
+        version = table_versions.version + 1,
+        updated_at = EXCLUDED.updated_at;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t text;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['product_cards', 'categories', 'banners', 'images']
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_table_version ON %I', t);
+        EXECUTE format('CREATE TRIGGER trigger_table_version
+                    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I
+                    FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()', t);
+    END loop;
+END;
+$$ language 'plpgsql';
@@ -56,3 +56,25 @@ def test_get_order(
     resp = client.get(f"{prefix}/order", headers=get_jwt_header(admin))
     assert resp.status_code == 200
     assert resp.json().get("data")[0].get("id") == str(order.id)
+
+
+def test_get_cache_stats(client: TestClient, create_admin, create_banner):
+    user = create_admin()
+    create_banner()
+    client.get(f"{settings.API_PATH}/banners")
+    client.get(f"{settings.API_PATH}/banners")
+
+    resp = client.get(f"{prefix}/cache", headers=get_jwt_header(user))
+    assert resp.status_code == 200
+    assert resp.json().get("data").get("entries") == 1
+    assert resp.json().get("data").get("hits") >= 1
+
+
+def test_get_metrics(client: TestClient, create_admin):
+    user = create_admin()
+
+    resp = client.get(f"{prefix}/metrics", headers=get_jwt_header(user))
+    assert resp.status_code == 200
+    data = resp.json().get("data")
+    assert set(data["pools"]) == {"sync", "async"}
+    assert data["pools"]["sync"]["size"] == settings.DB_POOL_SIZE
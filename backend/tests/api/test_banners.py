@@ -4,7 +4,7 @@ from sqlalchemy.orm.session import Session
 from starlette.testclient import TestClient
 
 from app.core.config import settings
-from app.deps.google_cloud import delete_image
+from app.deps.storage import delete_image
 from tests.utils import get_jwt_header
 
 prefix = f"{settings.API_PATH}/banners"
@@ -63,6 +63,33 @@ def test_create_banner(client: TestClient, create_admin, get_base64_image):
     delete_image(file_name)
 
 
+def test_create_banner_upload(client: TestClient, create_admin):
+    admin = create_admin()
+
+    with open("tests/fixtures/test_image.jpeg", "rb") as image_file:
+        resp = client.post(
+            f"{prefix}/upload",
+            headers=get_jwt_header(admin),
+            data={"title": "Banner 2", "url_path": "/products"},
+            files={"image": ("banner.jpeg", image_file, "image/jpeg")},
+        )
+    assert resp.status_code == 201
+    assert resp.json()["message"] == "Banner created successfully"
+    delete_image("banners/banner-2-1.jpeg")
+
+
+def test_create_banner_upload_wrong_type(client: TestClient, create_admin):
+    admin = create_admin()
+
+    resp = client.post(
+        f"{prefix}/upload",
+        headers=get_jwt_header(admin),
+        data={"title": "Banner 2"},
+        files={"image": ("banner.txt", b"not an image", "text/plain")},
+    )
+    assert resp.status_code == 400
+
+
 def test_update_banner(
     client: TestClient,
     create_admin,
@@ -134,6 +161,38 @@ def test_delete_banner(
     assert resp.status_code == 200
 
 
+def test_get_banners_after_delete(
+    client: TestClient,
+    create_admin,
+    create_banner,
+):
+    admin = create_admin()
+    banner = create_banner()
+
+    resp = client.get(f"{prefix}")
+    assert resp.json()["data"][0]["id"] == str(banner.id)
+
+    client.delete(
+        f"{prefix}",
+        headers=get_jwt_header(admin),
+        params={"id": str(banner.id)},
+    )
+    resp = client.get(f"{prefix}")
+    assert resp.status_code == 404
+    assert resp.json() == {"message": "There are no banners"}
+
+
+def test_get_banners_not_modified_since(client: TestClient, create_banner):
+    create_banner()
+
+    resp = client.get(f"{prefix}")
+    last_modified = resp.headers["Last-Modified"]
+
+    resp = client.get(f"{prefix}", headers={"If-Modified-Since": last_modified})
+    assert resp.status_code == 304
+    assert resp.content == b""
+
+
 def test_delete_empty_banner(
     client: TestClient,
     create_admin,
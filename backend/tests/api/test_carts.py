@@ -59,6 +59,46 @@ def test_create_cart(
     assert resp.status_code == 201
 
 
+def test_create_cart_idempotency_key(
+    client: TestClient,
+    create_user,
+    create_product,
+    create_size,
+    create_product_size_quantity,
+    db: Session,
+):
+    user = create_user()
+    product = create_product()
+    size = create_size()
+    product_size_quantity = create_product_size_quantity(product, size)
+    cart = {"product_id": str(product.id), "quantity": "1", "size": str(size.size)}
+    headers = {**get_jwt_header(user), "Idempotency-Key": "add-to-cart-1"}
+
+    resp = client.post(f"{prefix}", headers=headers, json=cart)
+    assert resp.status_code == 201
+    assert "Idempotent-Replayed" not in resp.headers
+
+    # a retry gets the first response, the quantity is not added twice
+    resp = client.post(f"{prefix}", headers=headers, json=cart)
+    assert resp.status_code == 201
+    assert resp.json()["message"] == "Added to cart"
+    assert resp.headers["Idempotent-Replayed"] == "true"
+    db.rollback()
+    assert (
+        db.execute(
+            "SELECT quantity FROM only carts WHERE product_size_quantity_id = :id",
+            {"id": product_size_quantity.id},
+        ).scalar()
+        == 1
+    )
+
+    resp = client.post(f"{prefix}", headers=headers, json={**cart, "quantity": "2"})
+    assert resp.status_code == 422
+    assert resp.json()["message"] == (
+        "Idempotency-Key was already used with a different request"
+    )
+
+
 def test_create_cart_wrong_product_id(
     client: TestClient,
     create_user,
@@ -1,6 +1,7 @@
 from starlette.testclient import TestClient
 
 from app.core.config import settings
+from app.deps.cache import cache
 
 prefix = f"{settings.API_PATH}/home"
 
@@ -42,3 +43,27 @@ def test_get_best_seller(
     assert resp.status_code == 200
     data = resp.json().get("data")
     assert data[0]["id"] == str(product.id)
+
+
+def test_get_best_seller_not_modified(
+    client: TestClient,
+    create_order,
+    create_order_item,
+    create_product_size_quantity,
+):
+    create_order_item(create_order(), create_product_size_quantity())
+
+    resp = client.get(f"{prefix}/best-seller")
+    assert resp.status_code == 200
+    etag = resp.headers["ETag"]
+
+    resp = client.get(f"{prefix}/best-seller", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+    # a completed order invalidates the cached result
+    create_order_item(create_order(), create_product_size_quantity())
+    cache.invalidate("home")
+    resp = client.get(f"{prefix}/best-seller", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert len(resp.json()["data"]) == 2
@@ -64,9 +64,10 @@ def test_get_orders_admin(
     assert resp.json()["data"][0]["id"] == str(order.id)
 
 
-def test_create_order(client: TestClient, create_user, create_cart):
+def test_create_order(client: TestClient, create_user, create_cart, db: Session):
     user = create_user()
     user.balance = 1000000
+    db.commit()
     create_cart(user)
 
     resp = client.post(
@@ -87,6 +88,113 @@ def test_create_order(client: TestClient, create_user, create_cart):
     assert resp.json()["message"] == "Order created successfully"
 
 
+def test_create_order_updates_stock_and_balance(
+    client: TestClient, create_user, create_cart, db: Session
+):
+    user = create_user()
+    user.balance = 1000000
+    db.commit()
+    cart = create_cart(user)
+    quantity, product_size_quantity_id = cart.quantity, cart.product_size_quantity_id
+    stock = db.execute(
+        "SELECT quantity FROM product_size_quantities WHERE id = :id",
+        {"id": product_size_quantity_id},
+    ).scalar()
+
+    resp = client.post(
+        f"{prefix}",
+        headers=get_jwt_header(user),
+        json={
+            "shipping_method": "Regular",
+            "shipping_address": {
+                "address_name": "Bali",
+                "address": "Renon",
+                "city": "Denpasar",
+                "phone_number": "081123344556",
+            },
+            "send_email": False,
+        },
+    )
+    assert resp.status_code == 201
+
+    db.rollback()
+    order_item = db.execute("SELECT quantity, price FROM order_items").fetchone()
+    assert order_item.quantity == quantity
+    assert order_item.price == 10000
+    # Regular shipping is 15% under 200k
+    total_price = 10000 * quantity
+    shipping_price = int(total_price * 0.15)
+    assert db.execute("SELECT shipping_price FROM orders").scalar() == shipping_price
+    assert (
+        db.execute(
+            "SELECT quantity FROM product_size_quantities WHERE id = :id",
+            {"id": product_size_quantity_id},
+        ).scalar()
+        == stock - quantity
+    )
+    assert db.execute("SELECT COUNT(*) FROM only carts").scalar() == 0
+    balance = db.execute(
+        "SELECT balance FROM users WHERE id = :id", {"id": user.id}
+    ).scalar()
+    assert balance == 1000000 - total_price - shipping_price
+
+
+def test_create_order_idempotency_key(
+    client: TestClient, create_user, create_cart, db: Session
+):
+    user = create_user()
+    user.balance = 1000000
+    db.commit()
+    cart = create_cart(user)
+    quantity, product_size_quantity_id = cart.quantity, cart.product_size_quantity_id
+    stock = db.execute(
+        "SELECT quantity FROM product_size_quantities WHERE id = :id",
+        {"id": product_size_quantity_id},
+    ).scalar()
+    order = {
+        "shipping_method": "Regular",
+        "shipping_address": {
+            "address_name": "Bali",
+            "address": "Renon",
+            "city": "Denpasar",
+            "phone_number": "081123344556",
+        },
+        "send_email": False,
+    }
+    headers = {**get_jwt_header(user), "Idempotency-Key": "checkout-1"}
+
+    resp = client.post(f"{prefix}", headers=headers, json=order)
+    assert resp.status_code == 201
+
+    # the cart is empty now, a retry still gets the first response
+    resp = client.post(f"{prefix}", headers=headers, json=order)
+    assert resp.status_code == 201
+    assert resp.json()["message"] == "Order created successfully"
+    assert resp.headers["Idempotent-Replayed"] == "true"
+    db.rollback()
+    assert db.execute("SELECT COUNT(*) FROM orders").scalar() == 1
+    # charged and taken from the stock once
+    assert (
+        db.execute(
+            "SELECT quantity FROM product_size_quantities WHERE id = :id",
+            {"id": product_size_quantity_id},
+        ).scalar()
+        == stock - quantity
+    )
+    total_price = 10000 * quantity
+    assert db.execute(
+        "SELECT balance FROM users WHERE id = :id", {"id": user.id}
+    ).scalar() == 1000000 - total_price - int(total_price * 0.15)
+
+    resp = client.post(
+        f"{prefix}", headers=headers, json={**order, "shipping_method": "Next Day"}
+    )
+    assert resp.status_code == 422
+    assert resp.json()["message"] == (
+        "Idempotency-Key was already used with a different request"
+    )
+
+
 def test_create_order_insufficient_balance(
     client: TestClient,
     create_user,
@@ -113,6 +221,56 @@ def test_create_order_insufficient_balance(
     assert resp.json()["message"].startswith("Not enough balance")
 
 
+def test_create_order_archived_product(
+    client: TestClient, create_user, create_cart, db: Session
+):
+    user = create_user()
+    user.balance = 1000000
+    db.commit()
+    cart = create_cart(user)
+    product_id = db.execute(
+        "SELECT product_id FROM product_size_quantities WHERE id = :id",
+        {"id": cart.product_size_quantity_id},
+    ).scalar()
+    db.execute(
+        "UPDATE products SET deleted_at = now() WHERE id = :id", {"id": product_id}
+    )
+    db.commit()
+
+    # the cart page does not list it anymore
+    resp = client.get(f"{settings.API_PATH}/cart", headers=get_jwt_header(user))
+    assert resp.status_code == 404
+    resp = client.get(
+        f"{settings.API_PATH}/shipping_price", headers=get_jwt_header(user)
+    )
+    assert resp.json()["data"][0]["price"] == 0
+
+    resp = client.post(
+        f"{prefix}",
+        headers=get_jwt_header(user),
+        json={
+            "shipping_method": "Regular",
+            "shipping_address": {
+                "address_name": "Bali",
+                "address": "Renon",
+                "city": "Denpasar",
+                "phone_number": "081123344556",
+            },
+            "send_email": False,
+        },
+    )
+    assert resp.status_code == 400
+    assert resp.json()["message"].endswith(
+        "is no longer available, please remove it from cart"
+    )
+    db.rollback()
+    assert db.execute("SELECT COUNT(*) FROM orders").scalar() == 0
+    assert (
+        db.execute("SELECT balance FROM users WHERE id = :id", {"id": user.id}).scalar()
+        == 1000000
+    )
+
+
 def test_create_order_without_adrress_name(client: TestClient, create_user):
     user = create_user()
 
@@ -222,6 +380,7 @@ def test_create_order_no_quantitiy(
 ):
     user = create_user()
     user.balance = 1000000
+    db.commit()
     product = create_product()
     size = create_size()
     db.execute(
@@ -3,9 +3,10 @@ import uuid
 from sqlalchemy.orm.session import Session
 from starlette.testclient import TestClient
 
+from app.api.products import products_query
 from app.core.config import settings
-from app.deps.google_cloud import delete_image
 from app.deps.image_base64 import base64_to_image
+from app.deps.storage import delete_image
 from tests.utils import get_jwt_header
 
 prefix = f"{settings.API_PATH}/products"
@@ -107,6 +108,52 @@ def test_products_with_name_price_condition(
     assert resp.json()["data"][0]["title"] == "product1"
 
 
+def test_get_products_with_product_name_terms(client: TestClient, create_product):
+    product = create_product()
+    create_product()
+
+    suffix = product.title.split("_")[-1]
+    resp = client.get(
+        f"{prefix}", params={"product_name": f"TITLE {suffix.upper()} product_"}
+    )
+    assert resp.status_code == 200
+    assert [item["id"] for item in resp.json()["data"]] == [str(product.id)]
+
+    resp = client.get(f"{prefix}", params={"product_name": "product missing"})
+    assert resp.status_code == 404
+
+
+def test_get_products_product_name_uses_index(db: Session):
+    # enough titles for the planner to prefer an index, few of them match
+    db.execute(
+        """
+        INSERT INTO product_cards (title, brand, product_detail, price, condition, category_id, images, thumbnails)
+        SELECT CASE WHEN i % 1000 = 0 THEN 'product title ' || i ELSE md5(i::text) END,
+        'brand', 'detail', 10000, 'new', uuid_generate_v4(), '{}', '{}'
+        FROM generate_series(1, 5000) i
+        """
+    )
+    db.commit()
+    db.execute("ANALYZE product_cards")
+    query, _, params = products_query(
+        category=[],
+        page=1,
+        page_size=20,
+        sort_by="Title a_z",
+        price=[5000, 20000],
+        condition="new",
+        product_name="product title",
+        cursor=None,
+        total="exact",
+    )
+
+    plan = db.execute(f"EXPLAIN {query}", params).fetchall()
+    db.rollback()
+    plan = "\n".join(row[0] for row in plan)
+    assert "ix_product_cards_title_trgm" in plan
+    assert "Seq Scan" not in plan
+
+
 def test_products_with_page_limit(client: TestClient, create_product):
     create_product()
     create_product()
@@ -116,6 +163,88 @@ def test_products_with_page_limit(client: TestClient, create_product):
     assert len(resp.json()["data"]) == 2
 
 
+def test_products_with_cursor(client: TestClient, create_product):
+    create_product()
+    create_product()
+    create_product()
+
+    resp = client.get(f"{prefix}", params={"cursor": "", "page_size": 2})
+    assert resp.status_code == 200
+    assert len(resp.json()["data"]) == 2
+    assert resp.json()["pagination"]["total_item"] == 3
+    next_cursor = resp.json()["next_cursor"]
+    assert next_cursor
+
+    resp = client.get(f"{prefix}", params={"cursor": next_cursor, "page_size": 2})
+    assert resp.status_code == 200
+    assert len(resp.json()["data"]) == 1
+    assert resp.json()["next_cursor"] is None
+
+
+def test_products_with_cursor_and_filters(client: TestClient, create_product):
+    create_product()
+    create_product()
+    create_product()
+    params = {
+        "cursor": "",
+        "page_size": 2,
+        "price": [5000, 20000],
+        "product_name": "product_title",
+    }
+
+    resp = client.get(f"{prefix}", params=params)
+    assert resp.status_code == 200
+    assert len(resp.json()["data"]) == 2
+    assert resp.json()["pagination"]["total_item"] == 3
+    next_cursor = resp.json()["next_cursor"]
+    assert next_cursor
+
+    resp = client.get(f"{prefix}", params={**params, "cursor": next_cursor})
+    assert resp.status_code == 200
+    assert len(resp.json()["data"]) == 1
+    assert resp.json()["next_cursor"] is None
+
+
+def test_products_with_cursor_sort_mismatch(client: TestClient, create_product):
+    create_product()
+    create_product()
+
+    resp = client.get(f"{prefix}", params={"cursor": "", "page_size": 1})
+    next_cursor = resp.json()["next_cursor"]
+
+    resp = client.get(
+        f"{prefix}", params={"cursor": next_cursor, "sort_by": "Price a_z"}
+    )
+    assert resp.status_code == 400
+    assert resp.json() == {"message": "Cursor does not match sort_by"}
+
+
+def test_products_with_invalid_cursor(client: TestClient, create_product):
+    create_product()
+
+    resp = client.get(f"{prefix}", params={"cursor": "not-a-cursor"})
+    assert resp.status_code == 400
+    assert resp.json() == {"message": "Invalid cursor"}
+
+
+def test_products_with_approximate_total(
+    client: TestClient, db: Session, create_product
+):
+    for _ in range(10):
+        create_product()
+    # the estimate comes from the planner statistics of product_cards
+    db.execute("ANALYZE product_cards")
+    db.commit()
+
+    resp = client.get(f"{prefix}", params={"total": "approximate"})
+    assert resp.status_code == 200
+    assert 5 <= resp.json()["pagination"]["total_item"] <= 20
+
+    resp = client.get(f"{prefix}", params={"total": "exact"})
+    assert resp.status_code == 200
+    assert resp.json()["pagination"]["total_item"] == 10
+
+
 def test_get_empty_product(client: TestClient):
     resp = client.get(f"{prefix}/df2ecf60-6132-4084-b5c2-9ac686452322")
     assert resp.status_code == 404
@@ -131,6 +260,62 @@ def test_get_product(client: TestClient, create_product):
     assert data == str(product.id)
 
 
+def test_get_product_not_modified(client: TestClient, create_product):
+    product = create_product()
+
+    resp = client.get(f"{prefix}/{product.id}")
+    etag = resp.headers["ETag"]
+    assert resp.headers["Last-Modified"]
+
+    resp = client.get(f"{prefix}/{product.id}", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+    assert resp.headers["ETag"] == etag
+
+
+def test_get_products_modified(client: TestClient, create_product):
+    create_product()
+
+    resp = client.get(f"{prefix}")
+    etag = resp.headers["ETag"]
+
+    # query parameters are part of the validator
+    resp = client.get(
+        f"{prefix}", params={"page_size": 1}, headers={"If-None-Match": etag}
+    )
+    assert resp.status_code == 200
+
+    create_product()
+    resp = client.get(f"{prefix}", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def test_get_products_validators_follow_table_versions(
+    client: TestClient, db: Session, create_product
+):
+    product = create_product()
+
+    resp = client.get(f"{prefix}")
+    etag = resp.headers["ETag"]
+
+    # tables the listing does not read leave the validator alone
+    db.execute("INSERT INTO sizes (size) VALUES ('XL')")
+    db.commit()
+    resp = client.get(f"{prefix}", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+    db.execute("UPDATE products SET price = 20000 WHERE id = :id", {"id": product.id})
+    db.commit()
+    resp = client.get(f"{prefix}", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    version = db.execute(
+        "SELECT version FROM table_versions WHERE table_name = 'product_cards'"
+    ).scalar()
+    assert version >= 2
+
+
 def test_create_product_invalid_size(client: TestClient, create_admin, create_category):
     admin = create_admin()
     category = create_category()
@@ -154,7 +339,12 @@ def test_create_product_invalid_size(client: TestClient, create_admin, create_ca
 
 
 def test_create_product(
-    client: TestClient, create_category, create_admin, create_size, get_base64_image
+    client: TestClient,
+    create_category,
+    create_admin,
+    create_size,
+    get_base64_image,
+    db: Session,
 ):
 
     category = create_category()
@@ -177,10 +367,27 @@ def test_create_product(
             "stock": [{"size": size.size, "quantity": 100}],
         },
     )
-    file_name = f"products/{category.title}/hehe-1.jpeg"
     assert resp.json()["message"] == "Product added"
     assert resp.status_code == 201
-    delete_image(file_name)
+    images = db.execute(
+        """
+        SELECT images.image_url, images.thumb_url, images.card_url, images.detail_url
+        FROM images
+        JOIN product_images ON product_images.image_id = images.id
+        JOIN products ON products.id = product_images.product_id
+        WHERE products.title = 'hehe'
+        """
+    ).fetchall()
+    assert len(images) == 1
+    assert images[0].image_url.startswith(f"products/{category.title}/hehe-")
+    assert images[0].thumb_url.endswith(".thumb.webp")
+    card = db.execute(
+        "SELECT images, thumbnails FROM product_cards WHERE title = 'hehe'"
+    ).fetchone()
+    assert card.images == [images[0].card_url]
+    assert card.thumbnails == [images[0].thumb_url]
+    for url in images[0]:
+        delete_image(url)
 
 
 def test_create_product_wrong_image(
@@ -2,8 +2,13 @@ from sqlalchemy.orm.session import Session
 from starlette.testclient import TestClient
 
 from app.core.config import settings
-from app.deps.google_cloud import delete_image
+from app.core.metrics import metrics
+from app.deps.cache import cache
 from app.deps.image_base64 import base64_to_image
+from app.deps.shower_thoughts import STUB_TWEETS
+from app.deps.similarity import store_embeddings
+from app.deps.storage import delete_image
+from app.image_classification.pipeline.main import ImageClassifier
 from tests.utils import get_jwt_header
 
 prefix = f"{settings.API_PATH}"
@@ -47,32 +52,9 @@ def test_search_text(
     client: TestClient,
     create_user,
     create_product,
-    db: Session,
 ):
     user = create_user()
     product = create_product()
-    db.execute(
-        """
-        CREATE EXTENSION IF NOT EXISTS "pg_trgm";
-
-        CREATE OR REPLACE FUNCTION search_products(term TEXT)
-        returns table(
-        id UUID,
-        title TEXT
-        )
-        as
-        $$
-
-        SELECT p.id, p.title
-        FROM products p
-        JOIN categories c ON p.category_id = c.id
-        WHERE term <% (p.title || ' ' || p.brand || ' ' || SPLIT_PART(c.title, '-', 1) || ' ' || SPLIT_PART(c.title, '-', 2))
-        ORDER BY term <<-> (p.title || ' ' || p.brand || ' ' || SPLIT_PART(c.title, '-', 1) || ' ' || SPLIT_PART(c.title, '-', 2)) LIMIT 10;
-        $$ language SQL;
-
-    """
-    )
-    db.commit()
     resp = client.get(
         f"{prefix}/search",
         headers=get_jwt_header(user),
@@ -87,6 +69,115 @@ def test_search_text(
     ]
 
 
+def test_search_text_category_renamed(
+    client: TestClient,
+    create_user,
+    create_product,
+    db: Session,
+):
+    user = create_user()
+    product = create_product()
+    db.execute(
+        "UPDATE categories SET title = 'Parka-Winter' WHERE id = :id",
+        {"id": product.category_id},
+    )
+    db.commit()
+    resp = client.get(
+        f"{prefix}/search",
+        headers=get_jwt_header(user),
+        params={"text": "parka"},
+    )
+    assert resp.status_code == 200
+    assert resp.json() == [{"id": str(product.id), "title": product.title}]
+
+
+def test_search_products(
+    client: TestClient,
+    create_user,
+    create_product,
+    db: Session,
+):
+    user = create_user()
+    product = create_product()
+    other = create_product()
+    category_titles = dict(
+        db.execute("SELECT id::text, title FROM categories").fetchall()
+    )
+    resp = client.get(
+        f"{prefix}/search/products",
+        headers=get_jwt_header(user),
+        params={"text": "product_title", "category": str(product.category_id)},
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [item["id"] for item in body["data"]] == [str(product.id)]
+    # the category facet ignores the category filter, other categories stay listed
+    assert {
+        facet["id"]: (facet["title"], facet["count"])
+        for facet in body["facets"]["categories"]
+    } == {
+        str(p.category_id): (category_titles[str(p.category_id)], 1)
+        for p in [product, other]
+    }
+    assert body["facets"]["conditions"] == [{"value": product.condition, "count": 1}]
+    assert body["facets"]["brands"] == [{"value": product.brand, "count": 1}]
+    assert body["facets"]["prices"] == [
+        {"min_price": 0, "max_price": 100000, "count": 1}
+    ]
+    assert body["pagination"]["total_item"] == 1
+
+    # filtered out by price, the price facet still counts both
+    resp = client.get(
+        f"{prefix}/search/products",
+        headers=get_jwt_header(user),
+        params={"text": "product_title", "price": 20000},
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["data"] == []
+    assert body["facets"]["categories"] == []
+    assert body["facets"]["prices"] == [
+        {"min_price": 0, "max_price": 100000, "count": 2}
+    ]
+    assert body["pagination"]["total_item"] == 0
+
+    resp = client.get(
+        f"{prefix}/search/products",
+        headers=get_jwt_header(user),
+        params={"text": other.title},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["data"][0]["id"] == str(other.id)
+
+
+def test_search_suggest(
+    client: TestClient,
+    create_user,
+    create_product,
+):
+    user = create_user()
+    product = create_product()
+    # fixtures write straight to the database, bypassing cache invalidation
+    cache.invalidate("products")
+    resp = client.get(
+        f"{prefix}/search/suggest",
+        headers=get_jwt_header(user),
+        params={"text": product.title[:11]},
+    )
+    assert resp.status_code == 200
+    assert resp.json() == [
+        {"text": product.title, "type": "product", "id": str(product.id)}
+    ]
+
+    resp = client.get(
+        f"{prefix}/search/suggest",
+        headers=get_jwt_header(user),
+        params={"text": product.brand.lower()},
+    )
+    assert resp.status_code == 200
+    assert resp.json()[0] == {"text": product.brand, "type": "brand", "id": None}
+
+
 def test_search_image(
     client: TestClient,
     create_user,
@@ -117,6 +208,62 @@ def test_search_image(
     assert resp.json()["id"] == str(category.id)
 
 
+def test_search_image_cached(
+    client: TestClient,
+    create_user,
+    get_base64_image,
+    db: Session,
+):
+    user = create_user()
+    db.execute(
+        """
+        INSERT INTO categories (title, type)
+        VALUES (:title, :type)
+    """,
+        {"title": "bags", "type": "bag"},
+    )
+    db.commit()
+
+    responses = []
+    for _ in range(2):
+        hits = metrics.snapshot()["counters"].get("classifier.cache.exact", 0)
+        responses.append(
+            client.post(
+                f"{prefix}/search_image",
+                headers=get_jwt_header(user),
+                json={"base64_image": get_base64_image()},
+            )
+        )
+    assert responses[0].json() == responses[1].json()
+    # the second upload is answered from the result cache
+    assert metrics.snapshot()["counters"]["classifier.cache.exact"] == hits + 1
+
+
+def test_search_image_upload(
+    client: TestClient,
+    create_user,
+    db: Session,
+):
+    user = create_user()
+    db.execute(
+        """
+        INSERT INTO categories (title, type)
+        VALUES (:title, :type)
+    """,
+        {"title": "bags", "type": "bag"},
+    )
+    db.commit()
+
+    with open("tests/fixtures/test_image.jpeg", "rb") as image_file:
+        resp = client.post(
+            f"{prefix}/search_image/upload",
+            headers=get_jwt_header(user),
+            files={"image": ("test_image.jpeg", image_file, "image/jpeg")},
+        )
+    assert resp.status_code == 200
+    assert resp.json()["title"] == "bags"
+
+
 def test_wrong_search_image(
     client: TestClient,
     create_user,
@@ -131,6 +278,36 @@ def test_wrong_search_image(
     assert resp.json() == {"message": "Image is not base64"}
 
 
+def test_search_similar_products(
+    client: TestClient,
+    create_user,
+    create_product_image,
+    get_base64_image,
+    db: Session,
+):
+    user = create_user()
+    same = create_product_image()
+    other = create_product_image()
+    image, _ = base64_to_image(get_base64_image())
+    embedding = ImageClassifier().embed_batch([image])[0]
+    store_embeddings(db, [same.image_id, other.image_id], [embedding, -embedding])
+    db.commit()
+    cache.invalidate("embeddings")
+
+    resp = client.post(
+        f"{prefix}/search_image/similar",
+        headers=get_jwt_header(user),
+        params={"k": 2},
+        json={"base64_image": get_base64_image()},
+    )
+    assert resp.status_code == 200
+    assert [product["id"] for product in resp.json()] == [
+        str(same.product_id),
+        str(other.product_id),
+    ]
+    assert resp.json()[0]["score"] > 0.99
+
+
 def test_shower_thoughts(
     client: TestClient,
     create_user,
@@ -143,3 +320,5 @@ def test_shower_thoughts(
     )
     assert resp.status_code == 200
     assert resp.json()["data"].__len__() > 1
+    # conftest points the feed at the local stub
+    assert set(resp.json()["data"]) <= set(STUB_TWEETS)
@@ -1,3 +1,4 @@
+import os
 from typing import Generator
 
 import pytest
@@ -7,8 +8,14 @@ from sqlalchemy.engine import create_engine
 from sqlalchemy.orm.session import Session, sessionmaker
 from starlette.testclient import TestClient
 
+# the tests store images in memory unless a backend is chosen explicitly
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+# and read shower thoughts from the local stub instead of twitter
+os.environ.setdefault("SHOWER_THOUGHTS_UPSTREAM", "stub")
+
 from app.core.config import settings
 from app.db import Base
+from app.deps.cache import cache
 from app.deps.db import get_db
 from app.factory import create_app
 
@@ -70,6 +77,8 @@ def auto_rollback(db: Session):
     for table in reversed(Base.metadata.sorted_tables):
         db.execute(table.delete())
     db.commit()
+    # fixtures write straight to the database, bypassing cache invalidation
+    cache.clear()
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -78,3 +87,17 @@ def execute_default_sql(db: Session):
     sql_file = open("sql/extension/extension.sql", "r")
     sql = sql_file.read()
     db.execute(sql)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def execute_read_model_sql(db: Session, override_get_db):
+    # triggers are attached to the tables, so run after they are created
+    for path in [
+        "sql/product_card.sql",
+        "sql/search_document.sql",
+        "sql/table_version.sql",
+    ]:
+        sql_file = open(path, "r")
+        sql = sql_file.read()
+        db.execute(sql)
+    db.commit()
@@ -0,0 +1,109 @@
+import logging
+
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from starlette.testclient import TestClient
+
+from app.core import profiling
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.factory import setup_profiling_middleware
+
+# any engine is profiled, the listeners are on the Engine class
+engine = create_engine("sqlite://")
+
+
+def create_profiled_app() -> FastAPI:
+    app = FastAPI()
+    setup_profiling_middleware(app)
+
+    @app.get("/products")
+    def get_products(n: int = 1):
+        with engine.connect() as connection:
+            # one statement per product, the N+1 shape
+            for i in range(n):
+                connection.exec_driver_sql(f"SELECT {i}")
+        return {"count": n}
+
+    return app
+
+
+def profiling_listeners() -> bool:
+    return event.contains(
+        Engine, "before_cursor_execute", profiling.before_cursor_execute
+    )
+
+
+@pytest.fixture(scope="function")
+def sql_profiling(monkeypatch):
+    monkeypatch.setattr(settings, "SQL_PROFILING", True)
+    monkeypatch.setattr(settings, "SQL_REPEATED_STATEMENT_THRESHOLD", 5)
+    monkeypatch.setattr(profiling, "route_profiles", profiling.RouteProfiles())
+    metrics.reset()
+    yield
+    metrics.reset()
+    if profiling_listeners():
+        event.remove(Engine, "before_cursor_execute", profiling.before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", profiling.after_cursor_execute)
+
+
+def test_statement_shape():
+    assert profiling.statement_shape("SELECT * FROM products WHERE price > 100") == (
+        "SELECT * FROM products WHERE price > ?"
+    )
+    assert profiling.statement_shape(
+        "SELECT *\n  FROM products WHERE title = 'it''s'"
+    ) == ("SELECT * FROM products WHERE title = ?")
+
+
+def test_server_timing_header(sql_profiling):
+    with TestClient(create_profiled_app()) as client:
+        resp = client.get("/products", params={"n": 3})
+
+    assert resp.status_code == 200
+    db, app = resp.headers["Server-Timing"].split(", ")
+    assert db.startswith("db;dur=")
+    assert db.endswith(';desc="3 queries"')
+    assert app.startswith("app;dur=")
+
+
+def test_queries_per_request(sql_profiling):
+    with TestClient(create_profiled_app()) as client:
+        client.get("/products", params={"n": 2})
+        client.get("/products", params={"n": 3})
+
+    stats = profiling.route_profiles.snapshot()["GET /products"]
+    assert stats["requests"] == 2
+    assert stats["queries"] == 5
+    assert stats["slowest"][0]["statement"] == "SELECT ?"
+    assert metrics.snapshot()["counters"]["route.GET /products.queries"] == 5
+
+
+def test_repeated_statements(sql_profiling, caplog):
+    with TestClient(create_profiled_app()) as client, caplog.at_level(
+        logging.WARNING, logger="backend"
+    ):
+        client.get("/products", params={"n": 4})
+        assert "repeated_statements" not in caplog.text
+
+        client.get("/products", params={"n": 6})
+
+    counters = metrics.snapshot()["counters"]
+    assert counters["route.GET /products.repeated_statements"] == 1
+    assert '"repeated": {"SELECT ?": 6}' in caplog.text
+
+
+def test_profiling_off(monkeypatch):
+    monkeypatch.setattr(settings, "SQL_PROFILING", False)
+    metrics.reset()
+
+    with TestClient(create_profiled_app()) as client:
+        resp = client.get("/products", params={"n": 6})
+
+    assert resp.status_code == 200
+    assert "Server-Timing" not in resp.headers
+    # no listener runs on the statements
+    assert not profiling_listeners()
+    assert not metrics.snapshot()["counters"]
@@ -0,0 +1,198 @@
+import threading
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.deps.cache import MISSING, Cache, MemoryBackend, RedisBackend
+
+
+def make_cache(backend=None, lock_timeout: int = 1) -> Cache:
+    cache = Cache(
+        backend or MemoryBackend(max_entries=16, max_bytes=1024),
+        ttl=60,
+        lock_timeout=lock_timeout,
+    )
+    # invalidations are fanned out in process only
+    cache.bus.publish = lambda payload: None
+    return cache
+
+
+@pytest.fixture(scope="function")
+def redis_backend():
+    pytest.importorskip("redis")
+    if not settings.REDIS_URL:
+        pytest.skip("REDIS_URL is not set")
+    backend = RedisBackend(settings.REDIS_URL, prefix="test-cache")
+    try:
+        backend.client.ping()
+    except Exception as e:
+        pytest.skip(f"Redis is not reachable: {e}")
+    backend.clear()
+    yield backend
+    backend.clear()
+
+
+def test_memory_backend_expires_entries():
+    backend = MemoryBackend(max_entries=16, max_bytes=1024)
+    backend.set("products", "a", {"id": "a"}, ttl=60)
+    backend.set("products", "b", {"id": "b"}, ttl=-1)
+
+    assert backend.get("products", "a") == {"id": "a"}
+    assert backend.get("products", "b") is MISSING
+    assert backend.stats()["entries"] == 1
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2, max_bytes=1024)
+    backend.set("products", "a", 1, ttl=60)
+    backend.set("products", "b", 2, ttl=60)
+    backend.get("products", "a")
+    backend.set("products", "c", 3, ttl=60)
+
+    assert backend.get("products", "b") is MISSING
+    assert backend.get("products", "a") == 1
+    assert backend.stats()["evictions"] == 1
+
+    # bounded by the size of the values as well
+    backend = MemoryBackend(max_entries=16, max_bytes=10)
+    backend.set("products", "a", "x" * 6, ttl=60)
+    backend.set("products", "b", "x" * 6, ttl=60)
+    assert backend.get("products", "a") is MISSING
+    assert backend.stats()["size"] == 8
+
+
+def test_memory_backend_deletes_namespace_or_key():
+    backend = MemoryBackend(max_entries=16, max_bytes=1024)
+    backend.set("products", "a", 1, ttl=60)
+    backend.set("products", "b", 2, ttl=60)
+    backend.set("banners", None, 3, ttl=60)
+
+    backend.delete("products", "a")
+    assert backend.get("products", "a") is MISSING
+    assert backend.get("products", "b") == 2
+
+    backend.delete("products")
+    assert backend.get("products", "b") is MISSING
+    assert backend.get("banners", None) == 3
+
+
+def test_redis_backend(redis_backend: RedisBackend):
+    redis_backend.set("products", "a", {"id": "a"}, ttl=60)
+    redis_backend.set("products", "b", {"id": "b"}, ttl=60)
+    assert redis_backend.get("products", "a") == {"id": "a"}
+
+    redis_backend.delete("products", "a")
+    assert redis_backend.get("products", "a") is MISSING
+    redis_backend.delete("products")
+    assert redis_backend.get("products", "b") is MISSING
+
+
+def test_redis_backend_releases_only_its_lock(redis_backend: RedisBackend):
+    token = redis_backend.acquire("products", "a", timeout=10)
+    assert token
+    assert redis_backend.acquire("products", "a", timeout=10) is None
+
+    # e.g. the lock expired and was taken over by another worker
+    redis_backend.release("products", "a", "another-worker")
+    assert redis_backend.acquire("products", "a", timeout=10) is None
+
+    redis_backend.release("products", "a", token)
+    assert redis_backend.acquire("products", "a", timeout=10)
+
+
+def test_get_or_set_coalesces_concurrent_misses():
+    cache = make_cache()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        time.sleep(0.1)
+        return {"id": "a"}
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_set("products", "a", loader))
+        )
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert results == [{"id": "a"}] * 8
+    assert cache.coalesced == 7
+    assert cache.get_or_set("products", "a", loader) == {"id": "a"}
+    assert len(loads) == 1
+
+
+def test_get_or_set_does_not_release_a_lock_it_does_not_hold():
+    class LockedBackend(MemoryBackend):
+        """The lock is held by another worker that never stores a result."""
+
+        released = []
+
+        def acquire(self, namespace, key, timeout):
+            return None
+
+        def release(self, namespace, key, token):
+            self.released.append(token)
+
+    backend = LockedBackend(max_entries=16, max_bytes=1024)
+    cache = make_cache(backend, lock_timeout=0)
+
+    assert cache.get_or_set("products", "a", lambda: 1) == 1
+    assert backend.released == []
+
+
+def test_get_or_set_skips_storing_invalidated_loads():
+    cache = make_cache()
+
+    def loader():
+        cache.invalidate("products")
+        return 1
+
+    assert cache.get_or_set("products", "a", loader) == 1
+    assert cache.get("products", "a") is MISSING
+
+
+def test_invalidation_fan_out():
+    cache = make_cache()
+    notified = []
+    cache.subscribe(lambda namespace, key: notified.append((namespace, key)))
+    published = []
+    cache.bus.publish = published.append
+    cache.set("products", "a", 1)
+    cache.set("products", "b", 2)
+    cache.set("banners", None, 3)
+
+    cache.invalidate("products", key="a")
+    assert cache.get("products", "a") is MISSING
+    assert cache.get("products", "b") == 2
+    assert published == [{"namespaces": ("products",), "key": "a", "all": False}]
+
+    # from another worker over the bus
+    cache._on_remote_invalidation(
+        {"namespaces": ["products", "banners"], "key": None, "all": True}
+    )
+    assert cache.get("products", "b") is MISSING
+    assert cache.get("banners", None) is MISSING
+    assert notified == [("products", "a"), ("products", None), ("banners", None)]
+
+
+def test_remote_invalidation_of_a_shared_backend_is_local_only():
+    class SharedBackend(MemoryBackend):
+        shared = True
+
+    cache = make_cache(SharedBackend(max_entries=16, max_bytes=1024))
+    notified = []
+    cache.subscribe(lambda namespace, key: notified.append((namespace, key)))
+    cache.set("products", "a", 1)
+
+    # the publishing worker already deleted it from the shared backend
+    cache._on_remote_invalidation({"namespaces": ["products"], "key": "a"})
+    assert cache.get("products", "a") == 1
+    assert notified == [("products", "a")]
@@ -0,0 +1,181 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.metrics import metrics
+from app.deps.classifier import ClassifierService
+
+
+class StubClassifier:
+    """Labels an image by its content, b"bad" images fail on their own."""
+
+    def __init__(self, release: threading.Event = None):
+        self.batches = []
+        self.release = release
+
+    def predict_batch(self, images):
+        if self.release is not None:
+            self.release.wait(5)
+        self.batches.append(len(images))
+        return [
+            ValueError("Image is not valid") if image == b"bad" else image.decode()
+            for image in images
+        ]
+
+    def embed_batch(self, images):
+        return [[float(len(image))] for image in images]
+
+
+class StubService(ClassifierService):
+    def __init__(self, classifier=None, max_queue: int = 64, max_wait=0.05):
+        super().__init__(
+            runtime="eager",
+            workers=1,
+            max_batch_size=4,
+            max_wait=max_wait,
+            max_queue=max_queue,
+        )
+        self.stub = classifier or StubClassifier()
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        return self.stub
+
+
+@pytest.fixture(scope="function", autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def test_predictions_are_micro_batched():
+    service = StubService()
+
+    async def run():
+        await service.start()
+        try:
+            return await asyncio.gather(
+                *(service.predict(f"image-{i}".encode()) for i in range(6))
+            )
+        finally:
+            await service.stop()
+
+    assert asyncio.run(run()) == [f"image-{i}" for i in range(6)]
+    assert service.stub.batches == [4, 2]
+    assert service.loads == 1
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["classifier.batches"] == 2
+    assert snapshot["counters"]["classifier.images"] == 6
+    assert snapshot["timings"]["classifier.latency"]["count"] == 6
+    assert snapshot["timings"]["classifier.inference"]["count"] == 2
+    assert snapshot["timings"]["classifier.load"]["count"] == 1
+
+
+def test_failed_image_fails_alone():
+    service = StubService()
+
+    async def run():
+        await service.start()
+        try:
+            return await asyncio.gather(
+                service.predict(b"good"),
+                service.predict(b"bad"),
+                return_exceptions=True,
+            )
+        finally:
+            await service.stop()
+
+    good, bad = asyncio.run(run())
+    assert good == "good"
+    assert isinstance(bad, HTTPException)
+    assert bad.status_code == 500
+    assert bad.detail == "Image is not valid"
+    assert service.stub.batches == [2]
+
+
+def test_full_queue_is_refused():
+    release = threading.Event()
+    service = StubService(StubClassifier(release), max_queue=2, max_wait=0)
+
+    async def run():
+        await service.start()
+        try:
+            # taken by the worker, which blocks in the classifier
+            first = asyncio.ensure_future(service.predict(b"first"))
+            await asyncio.sleep(0.05)
+            queued = [
+                asyncio.ensure_future(service.predict(b"queued")) for _ in range(2)
+            ]
+            await asyncio.sleep(0)
+            with pytest.raises(HTTPException) as refused:
+                await service.predict(b"refused")
+            release.set()
+            return refused.value, await first, await asyncio.gather(*queued)
+        finally:
+            release.set()
+            await service.stop()
+
+    refused, first, queued = asyncio.run(run())
+    assert refused.status_code == 503
+    assert first == "first"
+    assert queued == ["queued", "queued"]
+    assert metrics.snapshot()["counters"]["classifier.rejected"] == 1
+
+
+def test_stop_fails_pending_requests():
+    release = threading.Event()
+    service = StubService(StubClassifier(release), max_wait=0)
+
+    async def run():
+        await service.start()
+        in_flight = asyncio.ensure_future(service.predict(b"in flight"))
+        await asyncio.sleep(0.05)
+        queued = asyncio.ensure_future(service.predict(b"queued"))
+        await asyncio.sleep(0)
+        await service.stop()
+        release.set()
+        return await asyncio.gather(in_flight, queued, return_exceptions=True)
+
+    for result in asyncio.run(run()):
+        assert isinstance(result, HTTPException)
+        assert result.detail == "Image classifier stopped"
+
+
+def test_failed_start_is_retried_on_demand():
+    class FailingOnce(StubService):
+        def load(self):
+            if not self.loads:
+                self.loads += 1
+                raise FileNotFoundError("model.pth")
+            return super().load()
+
+    service = FailingOnce()
+
+    async def run():
+        with pytest.raises(FileNotFoundError):
+            await service.start()
+        assert service.executor is None
+        try:
+            return await service.predict(b"retried")
+        finally:
+            await service.stop()
+
+    assert asyncio.run(run()) == "retried"
+    assert service.loads == 2
+
+
+def test_embed():
+    service = StubService()
+
+    async def run():
+        try:
+            return await service.embed([b"a", b"abc"])
+        finally:
+            await service.stop()
+
+    assert asyncio.run(run()) == [[1.0], [3.0]]
+    assert metrics.snapshot()["timings"]["classifier.embed"]["count"] == 1
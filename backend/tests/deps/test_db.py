@@ -0,0 +1,80 @@
+import uuid
+
+import pytest
+from sqlalchemy import text as sql_text
+from sqlalchemy.orm.session import Session
+from starlette.testclient import TestClient
+
+from app.core.config import settings
+from app.db import pool_status
+from app.deps.db import get_async_session
+from tests.utils import get_jwt_header
+
+
+def size_exists(db: Session, size: str) -> bool:
+    db.rollback()
+    return bool(
+        db.execute("SELECT 1 FROM sizes WHERE size = :size", {"size": size}).fetchone()
+    )
+
+
+def test_get_async_session_commits(client: TestClient, db: Session):
+    async def endpoint():
+        sessions = get_async_session()
+        session = await sessions.__anext__()
+        await session.execute(sql_text("INSERT INTO sizes (size) VALUES ('async')"))
+        await session.commit()
+        with pytest.raises(StopAsyncIteration):
+            await sessions.__anext__()
+
+    # on the loop of the app, the pooled asyncpg connections belong to it
+    client.portal.call(endpoint)
+
+    assert size_exists(db, "async")
+    assert pool_status()["async"]["checked_out"] == 0
+
+
+def test_get_async_session_rolls_back_on_error(client: TestClient, db: Session):
+    async def endpoint():
+        sessions = get_async_session()
+        session = await sessions.__anext__()
+        await session.execute(sql_text("INSERT INTO sizes (size) VALUES ('async')"))
+        # the endpoint raised before committing
+        with pytest.raises(RuntimeError):
+            await sessions.athrow(RuntimeError("endpoint failed"))
+
+    client.portal.call(endpoint)
+
+    assert not size_exists(db, "async")
+    assert pool_status()["async"]["checked_out"] == 0
+
+
+def test_async_endpoints_return_their_connections(client: TestClient, create_user):
+    user = create_user()
+
+    resp = client.get(f"{settings.API_PATH}/search", params={"text": "shirt"})
+    assert resp.status_code == 200
+    resp = client.get(
+        f"{settings.API_PATH}/image",
+        headers=get_jwt_header(user),
+        params={"image_name": "missing"},
+    )
+    assert resp.status_code == 404
+
+    assert pool_status()["async"]["checked_out"] == 0
+
+
+def test_auth_dependencies_return_their_connections(client: TestClient, create_user):
+    user = create_user()
+
+    resp = client.get(
+        f"{settings.API_PATH}/orders/{uuid.uuid4()}", headers=get_jwt_header(user)
+    )
+    assert resp.status_code == 404
+    resp = client.get(
+        f"{settings.API_PATH}/orders/{uuid.uuid4()}",
+        headers={"Authorization": "Bearer invalid"},
+    )
+    assert resp.status_code == 401
+
+    assert pool_status()["sync"]["checked_out"] == 0
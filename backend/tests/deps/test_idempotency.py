@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.deps.idempotency import claim_idempotency_key
+
+
+class Result:
+    def __init__(self, row=None):
+        self.row = row
+
+    def fetchone(self):
+        return self.row
+
+
+class PurgingSession:
+    """The conflicting key is purged as expired before it is read, `purges` times."""
+
+    def __init__(self, purges: int):
+        self.purges = purges
+        self.inserts = 0
+        self.rolled_back = False
+
+    def execute(self, query, params=None):
+        query = query.strip()
+        if query.startswith("INSERT"):
+            self.inserts += 1
+            # claimed once the conflicting row is gone
+            return Result(SimpleNamespace(id=1) if self.inserts > self.purges else None)
+        return Result()
+
+    def rollback(self):
+        self.rolled_back = True
+
+
+def test_claim_after_the_conflicting_key_was_purged():
+    session = PurgingSession(purges=1)
+
+    assert claim_idempotency_key(session, "user", "checkout-1", "fingerprint") is None
+    assert session.inserts == 2
+    assert not session.rolled_back
+
+
+def test_claim_gives_up_after_repeated_purges():
+    session = PurgingSession(purges=10)
+
+    with pytest.raises(HTTPException) as conflict:
+        claim_idempotency_key(session, "user", "checkout-1", "fingerprint")
+    assert conflict.value.status_code == 409
+    assert session.rolled_back
@@ -0,0 +1,217 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from starlette.testclient import TestClient
+
+from app.api import searches
+from app.core.metrics import metrics
+from app.deps import shower_thoughts
+from app.deps.shower_thoughts import (
+    CircuitBreaker,
+    ShowerThoughtsFeed,
+    get_shower_thoughts,
+)
+
+
+class Upstream:
+    """Serves the queued pages of tweets in order, a None page fails."""
+
+    def __init__(self, *pages):
+        self.pages = list(pages)
+        self.calls = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        page = self.pages.pop(0)
+        if page is None:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"data": [{"text": t} for t in page]})
+
+
+def make_feed(upstream: Upstream, pool_size: int = 200, threshold: int = 2):
+    return ShowerThoughtsFeed(
+        # the refresher only runs when the tests call refresh
+        refresh_seconds=3600,
+        pool_size=pool_size,
+        timeout=1,
+        breaker=CircuitBreaker(failure_threshold=threshold, open_seconds=60),
+        transport=httpx.MockTransport(upstream.handler),
+    )
+
+
+async def started(feed: ShowerThoughtsFeed) -> ShowerThoughtsFeed:
+    await feed.start()
+    # drop the initial refresh, the tests drive them one by one
+    feed._refresher.cancel()
+    return feed
+
+
+def create_feed_app(feed: ShowerThoughtsFeed) -> FastAPI:
+    app = FastAPI()
+    app.include_router(searches.router)
+    app.dependency_overrides[get_shower_thoughts] = lambda: feed
+
+    @app.on_event("startup")
+    async def start_feed():
+        await started(feed)
+
+    @app.on_event("shutdown")
+    async def stop_feed():
+        await feed.stop()
+
+    return app
+
+
+@pytest.fixture(scope="function", autouse=True)
+def reset_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.fixture(scope="function")
+def clock(monkeypatch):
+    now = [1000.0]
+    # the breaker's clock only, the event loop keeps the real one
+    fake_time = SimpleNamespace(
+        monotonic=lambda: now[0], perf_counter=time.perf_counter
+    )
+    monkeypatch.setattr(shower_thoughts, "time", fake_time)
+    return now
+
+
+def test_circuit_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=60)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock[0] += 59
+    assert not breaker.allow()
+
+
+def test_circuit_breaker_half_open_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=3, open_seconds=60)
+    for _ in range(3):
+        breaker.record_failure()
+
+    clock[0] += 60
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+    # a failed trial opens the circuit again, without waiting for the threshold
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock[0] += 60
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_half_open_lets_one_refresh_through(clock):
+    upstream = Upstream(None, None, ["a"], ["b"])
+    feed = make_feed(upstream)
+
+    async def run():
+        await started(feed)
+        try:
+            await feed.refresh()
+            await feed.refresh()
+            assert feed.breaker.state == "open"
+            # not called while open
+            await feed.refresh()
+            assert upstream.calls == 2
+
+            clock[0] += 60
+            await asyncio.gather(feed.refresh(), feed.refresh())
+        finally:
+            await feed.stop()
+
+    asyncio.run(run())
+    # the trial closed the circuit before the second refresh went through
+    assert upstream.calls == 4
+    assert feed.breaker.state == "closed"
+    assert feed.pool == ["a", "b"]
+    assert metrics.snapshot()["counters"]["shower_thoughts.failures"] == 2
+
+
+def test_pool_is_capped_and_deduplicated():
+    upstream = Upstream(["a", "b", "c"], ["b", "c", "d", "x" * 100], ["e", "f"])
+    feed = make_feed(upstream, pool_size=4)
+
+    async def run():
+        await started(feed)
+        try:
+            for _ in range(3):
+                await feed.refresh()
+        finally:
+            await feed.stop()
+
+    asyncio.run(run())
+    # duplicates and tweets too long for the card are dropped, the newest kept
+    assert feed.pool == ["c", "d", "e", "f"]
+    assert sorted(feed.sample(k=8)) == ["c", "d", "e", "f"]
+    assert len(feed.sample(k=2)) == 2
+
+
+def test_refresh_if_empty_fetches_once():
+    upstream = Upstream(["a", "b"], ["c"])
+    feed = make_feed(upstream)
+
+    async def run():
+        await started(feed)
+        try:
+            # concurrent cold start requests, the first one fills the pool
+            await asyncio.gather(*(feed.refresh(if_empty=True) for _ in range(3)))
+        finally:
+            await feed.stop()
+
+    asyncio.run(run())
+    assert upstream.calls == 1
+    assert feed.pool == ["a", "b"]
+
+
+def test_endpoint_serves_pool_while_circuit_is_open():
+    upstream = Upstream(["a", "b", "c"], None, None)
+    feed = make_feed(upstream)
+
+    with TestClient(create_feed_app(feed)) as client:
+        # cold start, filled inline
+        resp = client.get("/shower-thoughts")
+        assert sorted(resp.json()["data"]) == ["a", "b", "c"]
+
+        client.portal.call(feed.refresh)
+        client.portal.call(feed.refresh)
+        assert feed.breaker.state == "open"
+
+        resp = client.get("/shower-thoughts")
+
+    assert resp.status_code == 200
+    assert sorted(resp.json()["data"]) == ["a", "b", "c"]
+    assert upstream.calls == 3
+
+
+def test_endpoint_without_tweets():
+    upstream = Upstream(None, None)
+    feed = make_feed(upstream, threshold=1)
+
+    with TestClient(create_feed_app(feed)) as client:
+        first = client.get("/shower-thoughts")
+        # the circuit is open, no call until it half opens
+        second = client.get("/shower-thoughts")
+
+    assert first.json()["data"] == ["No shower thoughts found"]
+    assert second.json()["data"] == ["No shower thoughts found"]
+    assert upstream.calls == 1
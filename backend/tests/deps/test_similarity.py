@@ -0,0 +1,94 @@
+import threading
+import uuid
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.deps import similarity
+from app.deps.similarity import DIMENSIONS, SimilarityIndex, encode_embedding
+
+
+class Result(list):
+    def fetchall(self):
+        return list(self)
+
+
+class EmbeddingsSession:
+    """Answers the queries of SimilarityIndex.sync from in memory rows."""
+
+    def __init__(self, embeddings):
+        # image id: (product id, vector)
+        self.embeddings = embeddings
+
+    def execute(self, query, params=None):
+        if params is None:
+            return Result(
+                SimpleNamespace(image_id=image_id, product_id=product_id)
+                for image_id, (product_id, _) in self.embeddings.items()
+            )
+        return Result(
+            SimpleNamespace(image_id=image_id, embedding=encode_embedding(vector))
+            for image_id, (_, vector) in self.embeddings.items()
+            if image_id in params["image_ids"]
+        )
+
+    def rollback(self):
+        pass
+
+
+def unit_vectors(count: int, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, DIMENSIONS))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_only_image_changes_mark_the_index_stale():
+    index = SimilarityIndex(partitions=0, probes=1)
+    index.stale = False
+
+    # the stock of a bought product, a category rename
+    index.on_invalidation("products", str(uuid.uuid4()))
+    index.on_invalidation("products", None)
+    assert not index.stale
+
+    index.on_invalidation("product_images", None)
+    assert index.stale
+    index.stale = False
+    index.on_invalidation("embeddings", None)
+    assert index.stale
+
+
+def test_searches_are_not_blocked_by_training(monkeypatch):
+    vectors = unit_vectors(8)
+    product_ids = [uuid.uuid4() for _ in vectors]
+    session = EmbeddingsSession(
+        {uuid.uuid4(): (product_id, v) for product_id, v in zip(product_ids, vectors)}
+    )
+    index = SimilarityIndex(partitions=2, probes=1)
+    index.sync(session)
+    assert index.search(vectors[0], 1)[0][0] == product_ids[0]
+
+    training, release = threading.Event(), threading.Event()
+    train = similarity.kmeans
+
+    def slow_kmeans(matrix, partitions):
+        training.set()
+        release.wait(5)
+        return train(matrix, partitions)
+
+    monkeypatch.setattr(similarity, "kmeans", slow_kmeans)
+    monkeypatch.setattr(similarity, "MIN_IMAGES_PER_PARTITION", 4)
+    more = unit_vectors(8, seed=1)
+    session.embeddings.update({uuid.uuid4(): (uuid.uuid4(), v) for v in more})
+    syncing = threading.Thread(target=index.sync, args=(session,))
+    syncing.start()
+    assert training.wait(5)
+
+    # the current vectors are searched while the new index is built
+    assert index.search(vectors[1], 1)[0][0] == product_ids[1]
+    assert len(index.image_ids) == 8
+
+    release.set()
+    syncing.join()
+    assert len(index.image_ids) == 16
+    assert index.centroids is not None
+    assert index.search(vectors[1], 1)[0][0] == product_ids[1]
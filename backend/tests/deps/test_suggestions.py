@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from app.deps.suggestions import SuggestionIndex
+
+
+class Result(list):
+    def fetchall(self):
+        return list(self)
+
+    def scalar(self):
+        return self[0]
+
+
+class CardsSession:
+    """Answers the queries of SuggestionIndex.sync from in memory rows."""
+
+    def __init__(self):
+        self.cards = {}
+        self.categories = []
+        self.queries = []
+        self.now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    def write(self, ref, title, brand):
+        self.now += timedelta(minutes=5)
+        self.cards[ref] = SimpleNamespace(
+            id=ref, title=title, brand=brand, updated_at=self.now
+        )
+
+    def execute(self, query, params=None):
+        self.queries.append(query)
+        if "COUNT(*)" in query:
+            return Result([len(self.cards)])
+        if query.startswith("SELECT id FROM product_cards"):
+            return Result(self.cards.values())
+        if "product_cards" in query:
+            since = (params or {}).get("since")
+            return Result(
+                card
+                for card in self.cards.values()
+                if since is None or card.updated_at > since
+            )
+        return Result(self.categories)
+
+    def rollback(self):
+        pass
+
+
+def texts(index: SuggestionIndex, prefix: str):
+    return [suggestion["text"] for suggestion in index.suggest(prefix, 10)]
+
+
+def test_single_product_invalidations_keep_the_index():
+    index = SuggestionIndex()
+    index.stale = False
+
+    index.on_invalidation("products", "a-product-id")
+    assert not index.stale
+    index.on_invalidation("products", None)
+    assert index.stale
+
+
+def test_sync_reads_changed_cards_only():
+    session = CardsSession()
+    session.write("a", "Air Max", "Nuke")
+    session.write("b", "Boost", "Adidos")
+    index = SuggestionIndex()
+    index.sync(session)
+    assert texts(index, "air") == ["Air Max"]
+
+    session.queries.clear()
+    session.write("a", "Air Force", "Nuke")
+    index.sync(session)
+    assert texts(index, "air") == ["Air Force"]
+    assert texts(index, "boost") == ["Boost"]
+    # no full read, the count shows nothing was removed
+    assert not any(query.startswith("SELECT id FROM") for query in session.queries)
+
+    del session.cards["b"]
+    index.sync(session)
+    assert texts(index, "boost") == []
+    assert texts(index, "adidos") == []
+    assert texts(index, "nuke") == ["Nuke"]
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from app.core.config import Settings
+from app.image_classification.pipeline import export
+from app.image_classification.pipeline.main import (
+    PRODUCT_CATEGORY,
+    RUNTIME_ARTIFACTS,
+    ImageClassifier,
+    load_net,
+)
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    """An untrained model.pth and its exports, like pipeline/export.py makes."""
+    directory = tmp_path_factory.mktemp("model")
+    torch.manual_seed(0)
+    model = load_net(None)
+    torch.save(model.state_dict(), directory / "model.pth")
+    example = torch.zeros(1, 1, 128, 128)
+    artifacts = {
+        "torchscript": export.trace(model, example),
+        "dynamic": export.export_dynamic(model, example),
+        "int8": export.export_static(model, example, [torch.rand(8, 1, 128, 128)]),
+    }
+    for runtime, artifact in artifacts.items():
+        torch.jit.save(artifact, str(directory / RUNTIME_ARTIFACTS[runtime]))
+    return directory
+
+
+@pytest.fixture(scope="module")
+def image():
+    with open("tests/fixtures/test_image.jpeg", "rb") as image_file:
+        return image_file.read()
+
+
+@pytest.mark.parametrize("runtime", list(RUNTIME_ARTIFACTS))
+def test_runtime_loads_and_predicts(model_dir, image, runtime):
+    classifier = ImageClassifier(
+        model_path=str(model_dir / "model.pth"), runtime=runtime, model_dir=model_dir
+    )
+
+    good, bad = classifier.predict_batch([image, b"not an image"])
+    assert good in PRODUCT_CATEGORY.values()
+    assert isinstance(bad, Exception)
+
+    good, bad = classifier.embed_batch([image, b"not an image"])
+    assert good.shape == (256,)
+    assert good.dtype == np.float32
+    assert np.linalg.norm(good) == pytest.approx(1.0, abs=1e-4)
+    assert isinstance(bad, Exception)
+
+
+def test_int8_embeds_with_the_fp32_weights(model_dir, image):
+    eager = ImageClassifier(model_path=str(model_dir / "model.pth"))
+    int8 = ImageClassifier(
+        model_path=str(model_dir / "model.pth"), runtime="int8", model_dir=model_dir
+    )
+
+    assert not hasattr(int8.classifiers, "embed")
+    np.testing.assert_allclose(
+        int8.embed_batch([image])[0], eager.embed_batch([image])[0], atol=1e-5
+    )
+
+
+def test_unknown_runtime():
+    with pytest.raises(ValueError):
+        ImageClassifier(model_path=None, runtime="fp16")
+    with pytest.raises(ValueError):
+        Settings.check_classifier_runtime("fp16")
+    assert Settings.check_classifier_runtime("int8") == "int8"
@@ -0,0 +1,66 @@
+from sqlalchemy.orm.session import Session
+
+from app.deps.image_ingest import insert_product_images
+from app.models.product import Product
+from app.models.product_card import ProductCard
+
+
+def test_product_card_created_with_product(db: Session, create_product):
+    product = create_product()
+
+    card = db.query(ProductCard).filter(ProductCard.id == product.id).first()
+    assert card.title == product.title
+    assert card.images == ["image-not-available.webp"]
+
+
+def test_product_card_follows_product_update(db: Session, create_product):
+    product = create_product()
+
+    product.price = 20000
+    db.commit()
+
+    card = db.query(ProductCard).filter(ProductCard.id == product.id).first()
+    db.refresh(card)
+    assert card.price == 20000
+
+
+def test_product_card_follows_product_images(
+    db: Session, create_product, create_image, create_product_image
+):
+    product = create_product()
+    image = create_image()
+    create_product_image(product, image)
+
+    card = db.query(ProductCard).filter(ProductCard.id == product.id).first()
+    db.refresh(card)
+    assert card.images == [image.image_url]
+
+
+def test_product_card_removed_with_product(db: Session, create_product):
+    product = create_product()
+
+    db.query(Product).filter(Product.id == product.id).delete()
+    db.commit()
+
+    assert not db.query(ProductCard).filter(ProductCard.id == product.id).first()
+
+
+def test_product_card_cover_is_first_uploaded_image(db: Session, create_product):
+    product = create_product()
+    # inserted by one statement, with the same created_at
+    uploaded = [
+        {"image_url": f"products/{name}.jpeg", "card_url": f"products/{name}.card.webp"}
+        for name in ["cover-z", "second-a", "third-m"]
+    ]
+    insert_product_images(db, product.id, uploaded)
+    db.commit()
+    added = [{"image_url": "products/fourth-b.jpeg"}]
+    insert_product_images(db, product.id, added)
+    db.commit()
+
+    card = db.query(ProductCard).filter(ProductCard.id == product.id).first()
+    db.refresh(card)
+    assert card.images == [image["card_url"] for image in uploaded] + [
+        "products/fourth-b.jpeg"
+    ]
+    assert card.thumbnails[0] == "products/cover-z.jpeg"
@@ -0,0 +1,145 @@
+from typing import Callable
+
+import pytest
+from sqlalchemy.orm.session import Session
+
+from app.deps.storage import storage
+from app.util import image_gc
+
+BLOB_SIZE = 1024
+
+
+@pytest.fixture(scope="function")
+def archive_tables(db: Session):
+    # the z_archive_* tables of sql/soft_delete.sql, without its triggers
+    for table in ["products", "product_images"]:
+        db.execute(
+            f"""CREATE TABLE z_archive_{table}
+            (CHECK (deleted_at IS NOT NULL)) INHERITS ({table})"""
+        )
+    db.commit()
+    yield
+    db.rollback()
+    db.execute("DROP TABLE z_archive_product_images, z_archive_products")
+    db.commit()
+
+
+@pytest.fixture(scope="function")
+def stored_image(db: Session, create_image: Callable):
+    storage.objects.clear()
+
+    def inner(age_hours: int = 48):
+        image = create_image()
+        storage.put(image.image_url, b"0" * BLOB_SIZE, "image/jpeg")
+        db.execute(
+            "UPDATE images SET created_at = now() - make_interval(hours => :age) "
+            "WHERE id = :id",
+            {"age": age_hours, "id": image.id},
+        )
+        db.commit()
+        return image
+
+    yield inner
+    storage.objects.clear()
+
+
+def image_ids(db: Session):
+    db.rollback()
+    return {str(row.id) for row in db.execute("SELECT id FROM only images")}
+
+
+def archive_product(db: Session, product_id):
+    db.execute(
+        """
+        UPDATE only product_images SET deleted_at = now() WHERE product_id = :id;
+        INSERT INTO z_archive_product_images
+        SELECT * FROM only product_images WHERE product_id = :id;
+        UPDATE only products SET deleted_at = now() WHERE id = :id;
+        INSERT INTO z_archive_products SELECT * FROM only products WHERE id = :id;
+        DELETE FROM only products WHERE id = :id;
+        """,
+        {"id": product_id},
+    )
+    db.commit()
+
+
+def test_collect_garbage(
+    db: Session,
+    archive_tables,
+    stored_image: Callable,
+    create_product_image: Callable,
+    create_banner: Callable,
+):
+    # the row is gone once collected, keep what is checked afterwards
+    orphan_url = stored_image().image_url
+    used = create_product_image(image=stored_image()).image_id
+    banner = create_banner()
+    db.execute(
+        "UPDATE images SET created_at = now() - interval '2 days' WHERE id = :id",
+        {"id": banner.image_id},
+    )
+    db.commit()
+
+    assert image_gc.collect_garbage(rate=1000) == (1, BLOB_SIZE)
+    assert image_ids(db) == {str(used), str(banner.image_id)}
+    assert not storage.exists(orphan_url)
+    assert len(storage.list()) == 1
+
+
+def test_collect_garbage_dry_run(db: Session, archive_tables, stored_image: Callable):
+    stored_image()
+    stored_image()
+    before = image_ids(db)
+
+    assert image_gc.collect_garbage(dry_run=True) == (2, 2 * BLOB_SIZE)
+    assert image_ids(db) == before
+    assert len(storage.list()) == 2
+
+
+def test_collect_garbage_keeps_archived_product_images(
+    db: Session,
+    archive_tables,
+    stored_image: Callable,
+    create_product_image: Callable,
+):
+    archived = create_product_image(image=stored_image())
+    archived_image_id = archived.image_id
+    archive_product(db, archived.product_id)
+    # dropped from a live product by update_product
+    dropped = create_product_image(image=stored_image())
+    db.execute("DELETE FROM only product_images WHERE id = :id", {"id": dropped.id})
+    db.commit()
+
+    assert image_gc.collect_garbage(rate=1000) == (1, BLOB_SIZE)
+    assert image_ids(db) == {str(archived_image_id)}
+
+
+def test_collect_garbage_keeps_recent_images(
+    db: Session, archive_tables, stored_image: Callable
+):
+    recent = stored_image(age_hours=1)
+    stored_image(age_hours=48)
+
+    assert image_gc.collect_garbage(rate=1000, min_age=24) == (1, BLOB_SIZE)
+    assert image_ids(db) == {str(recent.id)}
+    assert storage.exists(recent.image_url)
+
+
+def test_collect_garbage_batches(
+    db: Session, archive_tables, stored_image: Callable, monkeypatch
+):
+    for _ in range(5):
+        stored_image()
+    batches = []
+    map_blobs = image_gc.transfer_pool.map
+
+    def recording_map(fn, blobs):
+        batches.append(len(blobs))
+        return map_blobs(fn, blobs)
+
+    monkeypatch.setattr(image_gc.transfer_pool, "map", recording_map)
+
+    assert image_gc.collect_garbage(batch_size=2, rate=1000) == (5, 5 * BLOB_SIZE)
+    assert batches == [2, 2, 1]
+    assert image_ids(db) == set()
+    assert storage.list() == []